@@ -1,6 +1,22 @@
 from .main_executable import (Enterprise, Connection, RepositoryConnection, Designer, convert_cf_to_xml,
                               convert_cfe_to_xml, xml_conf_version_file_exists)
 from .rac_executable import Rac, RacConnection, SqlServerType, SqlServerConnection
+from .repo_report import RepoVersion, RepoHistory, iter_repo_report
+from .repo_sync import RepoSync, git_commit
+from .client_pool import TestClientPool, PooledClient
+from .test_runner import ShardedEpfRunner, EpfRunResult, split_to_shards, copy_file_infobase
+from .result_channel import ResultChannel
+from .process_index import ProcessIndex, ConnectionKey, CommandLine1C, parse_1c_cmdline, split_cmdline, \
+    operation_name
+from .snapshot import SnapshotStore
+from .template_cache import TemplateCache, build_base
+from .artifact_store import ArtifactStore
+from .dump_normalizer import DumpNormalizer, NormalizeReport
+from .repo_commit import changed_objects, write_objects_list, write_files_list, commit_changes
+from .repo_extract import RepoVersionExtractor
+from .repo_version_cache import RepoVersionCache
+from .metadata_index import MetadataIndex, MetadataObject, MetadataReference, ModuleUsage
+from .compare_report import ChangeType, CompareEntry, CompareIndex, CompareCache, iter_compare_report
 
 __all__ = [
     'Enterprise',
@@ -14,4 +30,43 @@ __all__ = [
     'RacConnection',
     'SqlServerType',
     'SqlServerConnection',
+    'RepoVersion',
+    'RepoHistory',
+    'iter_repo_report',
+    'RepoSync',
+    'git_commit',
+    'ChangeType',
+    'CompareEntry',
+    'CompareIndex',
+    'CompareCache',
+    'iter_compare_report',
+    'TestClientPool',
+    'PooledClient',
+    'ShardedEpfRunner',
+    'EpfRunResult',
+    'split_to_shards',
+    'copy_file_infobase',
+    'ResultChannel',
+    'ProcessIndex',
+    'ConnectionKey',
+    'CommandLine1C',
+    'parse_1c_cmdline',
+    'split_cmdline',
+    'operation_name',
+    'SnapshotStore',
+    'TemplateCache',
+    'build_base',
+    'ArtifactStore',
+    'DumpNormalizer',
+    'NormalizeReport',
+    'MetadataIndex',
+    'MetadataObject',
+    'MetadataReference',
+    'ModuleUsage',
+    'changed_objects',
+    'write_objects_list',
+    'write_files_list',
+    'commit_changes',
+    'RepoVersionExtractor',
+    'RepoVersionCache',
 ]
@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import contextlib
+from typing import Optional, List, Iterator
+from designer_cmd.utils import FileLock, chunk_boundaries, write_json
+from designer_cmd.utils.chunking import AVG_CHUNK_SIZE
+from .main_executable import Designer
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_DIR = 'chunks'
+ARTIFACTS_DIR = 'artifacts'
+
+
+class ArtifactStore:
+    """
+    Хранилище файлов cf/cfe/dt с дедупликацией: файл делится на блоки с границами по содержимому,
+    блоки хранятся один раз по sha256, для файла хранится список блоков.
+
+    Соседние версии конфигурации совпадают большей частью блоков, поэтому в хранилище
+    добавляются только измененные блоки. Файл собирается из блоков при выгрузке.
+    """
+
+    def __init__(self, store_dir: str, workers: Optional[int] = None, avg_chunk_size: int = AVG_CHUNK_SIZE):
+        """
+        :param store_dir: Каталог хранилища
+        :param workers: Количество процессов поиска границ блоков, по умолчанию - количество процессоров.
+        :param avg_chunk_size: Средний размер блока (степень двойки), минимальный - в 4 раза меньше,
+            максимальный - в 4 раза больше.
+        """
+        self.store_dir = os.path.abspath(store_dir)
+        self.workers = workers
+        self.avg_chunk_size = avg_chunk_size
+        os.makedirs(os.path.join(self.store_dir, CHUNKS_DIR), exist_ok=True)
+        os.makedirs(os.path.join(self.store_dir, ARTIFACTS_DIR), exist_ok=True)
+
+    def put(self, file_path: str, name: Optional[str] = None, overwrite: bool = False) -> dict:
+        """
+        Добавляет файл в хранилище.
+
+        :param file_path: Путь к файлу
+        :param name: Имя файла в хранилище, по умолчанию - имя файла.
+        :param overwrite: Заменить существующий файл
+        :return: Описание файла, new_bytes - объем добавленных блоков.
+        """
+        file_path = os.path.abspath(file_path)
+        if name is None:
+            name = os.path.basename(file_path)
+        manifest_file = self._manifest_file(name)
+
+        if os.path.exists(manifest_file) and not overwrite:
+            raise FileExistsError(f'Файл {name} уже есть в хранилище')
+
+        start = time.monotonic()
+        # Блоки делятся и записываются без блокировки хранилища, параллельно с другими процессами
+        sha256 = hashlib.sha256()
+        chunks = []
+        offsets = []
+        new_bytes = 0
+        with open(file_path, 'rb') as f:
+            boundaries = chunk_boundaries(file_path, self.avg_chunk_size // 4, self.avg_chunk_size,
+                                          self.avg_chunk_size * 4, self.workers)
+            for offset, length in boundaries:
+                data = f.read(length)
+                sha256.update(data)
+                chunk_hash = hashlib.sha256(data).hexdigest()
+                if self._write_chunk(chunk_hash, data):
+                    new_bytes += length
+                chunks.append([chunk_hash, length])
+                offsets.append(offset)
+
+        info = {
+            'name': name,
+            'source': file_path,
+            'size': sum(length for _, length in chunks),
+            'sha256': sha256.hexdigest(),
+            'created': time.time(),
+            'new_bytes': new_bytes,
+            'chunks': chunks,
+        }
+        # Сборка мусора могла удалить записанные блоки, пока на них не ссылалось описание:
+        # под блокировкой недостающие блоки записываются повторно, затем записывается описание
+        with self._lock():
+            if os.path.exists(manifest_file) and not overwrite:
+                raise FileExistsError(f'Файл {name} уже есть в хранилище')
+            with open(file_path, 'rb') as f:
+                for (chunk_hash, length), offset in zip(chunks, offsets):
+                    if not os.path.exists(self._chunk_path(chunk_hash)):
+                        f.seek(offset)
+                        self._write_chunk(chunk_hash, f.read(length))
+            write_json(manifest_file, info)
+
+        logger.debug(f'Файл {file_path} добавлен в хранилище как {name} за {time.monotonic() - start:.1f} с.: '
+                     f'{len(chunks)} блоков, новых {new_bytes} из {info["size"]} байт')
+        return info
+
+    def get(self, name: str, file_path: str) -> str:
+        """
+        Собирает файл из блоков хранилища.
+
+        :param name: Имя файла в хранилище
+        :param file_path: Путь к собираемому файлу
+        :return: Путь к файлу
+        """
+        info = self.info(name)
+        file_path = os.path.abspath(file_path)
+        tmp_file = f'{file_path}.tmp'
+        sha256 = hashlib.sha256()
+        try:
+            with open(tmp_file, 'wb') as f:
+                for chunk_hash, length in info['chunks']:
+                    with open(self._chunk_path(chunk_hash), 'rb') as chunk_f:
+                        data = chunk_f.read()
+                    if len(data) != length:
+                        raise SyntaxError(f'Блок {chunk_hash} файла {name} поврежден')
+                    sha256.update(data)
+                    f.write(data)
+            if sha256.hexdigest() != info['sha256']:
+                raise SyntaxError(f'sha256 собранного файла {name} не совпадает')
+            os.replace(tmp_file, file_path)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        return file_path
+
+    @contextlib.contextmanager
+    def checkout(self, name: str, temp_dir: Optional[str] = None) -> Iterator[str]:
+        """
+        Собирает файл во временный файл с расширением исходного файла, который удаляется при выходе.
+
+        :param name: Имя файла в хранилище
+        :param temp_dir: Каталог временного файла, по умолчанию - системный временный каталог.
+        :return: Путь к временному файлу
+        """
+        fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(name)[1], dir=temp_dir)
+        os.close(fd)
+        try:
+            yield self.get(name, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, designer: Designer, name: str, extension_name: Optional[str] = None):
+        """
+        Загружает файл хранилища в базу по расширению: dt - load_db_from_file, cfe - load_extension_from_file,
+        иначе - load_config_from_file.
+
+        :param designer: Конфигуратор базы
+        :param name: Имя файла в хранилище
+        :param extension_name: Имя расширения для cfe
+        """
+        ext = os.path.splitext(name)[1].lower()
+        with self.checkout(name) as file_path:
+            if ext == '.dt':
+                designer.load_db_from_file(file_path)
+            elif ext == '.cfe':
+                if extension_name is None:
+                    raise ValueError(f'Не задано имя расширения для загрузки {name}')
+                designer.load_extension_from_file(file_path, extension_name)
+            else:
+                designer.load_config_from_file(file_path)
+
+    def info(self, name: str) -> dict:
+        """
+        Возвращает описание файла хранилища.
+
+        :param name: Имя файла в хранилище
+        :return:
+        """
+        manifest_file = self._manifest_file(name)
+        if not os.path.exists(manifest_file):
+            raise FileNotFoundError(f'Файл {name} не найден в хранилище')
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self._manifest_file(name))
+
+    def names(self) -> List[str]:
+        return sorted(
+            name[:-len('.json')] for name in os.listdir(os.path.join(self.store_dir, ARTIFACTS_DIR))
+            if name.endswith('.json')
+        )
+
+    def delete(self, name: str, collect: bool = True):
+        """
+        Удаляет файл из хранилища.
+
+        :param name: Имя файла в хранилище
+        :param collect: Удалить блоки, на которые больше не ссылаются файлы
+        """
+        with self._lock():
+            manifest_file = self._manifest_file(name)
+            if os.path.exists(manifest_file):
+                os.remove(manifest_file)
+        if collect:
+            self.collect_garbage()
+
+    def collect_garbage(self) -> int:
+        """
+        Удаляет блоки, на которые не ссылаются файлы хранилища.
+
+        :return: Объем удаленных блоков в байтах
+        """
+        removed = 0
+        with self._lock():
+            used = {chunk_hash for name in self.names() for chunk_hash, _ in self.info(name)['chunks']}
+            for chunk_hash, chunk_path in self._iter_chunks():
+                if chunk_hash not in used:
+                    removed += os.path.getsize(chunk_path)
+                    os.remove(chunk_path)
+        logger.debug(f'Из хранилища {self.store_dir} удалено {removed} байт неиспользуемых блоков')
+        return removed
+
+    def stats(self) -> dict:
+        """
+        Возвращает статистику хранилища: logical_size - общий размер файлов, stored_size - размер блоков,
+        ratio - отношение logical_size к stored_size.
+
+        :return:
+        """
+        logical_size = sum(self.info(name)['size'] for name in self.names())
+        chunks = 0
+        stored_size = 0
+        for _, chunk_path in self._iter_chunks():
+            chunks += 1
+            stored_size += os.path.getsize(chunk_path)
+        return {
+            'artifacts': len(self.names()),
+            'chunks': chunks,
+            'logical_size': logical_size,
+            'stored_size': stored_size,
+            'ratio': logical_size / stored_size if stored_size else 1.0,
+        }
+
+    def _write_chunk(self, chunk_hash: str, data: bytes) -> bool:
+        chunk_path = self._chunk_path(chunk_hash)
+        if os.path.exists(chunk_path):
+            return False
+        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+        # Один блок могут одновременно записывать несколько процессов
+        fd, tmp_file = tempfile.mkstemp(prefix=f'{chunk_hash}.', suffix='.tmp', dir=os.path.dirname(chunk_path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_file, chunk_path)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        return True
+
+    def _iter_chunks(self) -> Iterator[tuple]:
+        chunks_dir = os.path.join(self.store_dir, CHUNKS_DIR)
+        for prefix in os.listdir(chunks_dir):
+            for chunk_hash in os.listdir(os.path.join(chunks_dir, prefix)):
+                if not chunk_hash.endswith('.tmp'):
+                    yield chunk_hash, os.path.join(chunks_dir, prefix, chunk_hash)
+
+    def _chunk_path(self, chunk_hash: str) -> str:
+        return os.path.join(self.store_dir, CHUNKS_DIR, chunk_hash[:2], chunk_hash)
+
+    def _manifest_file(self, name: str) -> str:
+        if not name or os.sep in name or (os.altsep and os.altsep in name) or name.startswith('.'):
+            raise ValueError(f'Не допустимое имя файла {name}')
+        return os.path.join(self.store_dir, ARTIFACTS_DIR, f'{name}.json')
+
+    def _lock(self) -> FileLock:
+        return FileLock(os.path.join(self.store_dir, '.store.lock'))
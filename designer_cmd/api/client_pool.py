@@ -0,0 +1,222 @@
+import time
+import queue
+import logging
+import threading
+import contextlib
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Set, Iterator, TYPE_CHECKING
+from designer_cmd.utils import port_in_use, pid_exists, kill_processes
+
+if TYPE_CHECKING:
+    from .main_executable import Enterprise
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(eq=False)
+class PooledClient:
+    """
+    Запущенный тест клиент пула
+    """
+    port: int
+    pid: int
+    uses: int = 0
+    started: float = dataclasses.field(default_factory=time.monotonic)
+
+    def alive(self) -> bool:
+        return pid_exists(self.pid)
+
+    def ready(self) -> bool:
+        return self.alive() and port_in_use(self.port)
+
+
+class TestClientPool:
+    """
+    Пул заранее запущенных тест клиентов одной базы.
+
+    Клиенты запускаются заранее, выдаются задачам в аренду (lease), после max_uses использований
+    или ошибки в задаче клиент перезапускается в фоне, чтобы задачи не ждали холодного старта.
+    """
+
+    def __init__(self,
+                 enterprise: 'Enterprise',
+                 size: int,
+                 max_uses: int = 10,
+                 start_timeout: float = 120,
+                 poll_interval: float = 0.5,
+                 start_attempts: int = 3,
+                 kill_timeout: float = 10):
+        """
+        :param enterprise: Предприятие базы, для которой запускаются клиенты.
+            Для запуска нескольких клиентов необходим enterprise.port_allocator.
+        :param size: Количество клиентов в пуле
+        :param max_uses: Количество использований клиента до перезапуска
+        :param start_timeout: Время ожидания готовности клиента (открытия порта) в секундах
+        :param poll_interval: Интервал проверки готовности клиента
+        :param start_attempts: Количество попыток запуска клиента, после неудачных попыток пул уменьшается.
+            Если не удалось запустить ни одного клиента, ожидающие аренды завершаются ошибкой.
+        :param kill_timeout: Время ожидания штатного завершения клиента, затем клиент завершается принудительно.
+        """
+        if size < 1:
+            raise ValueError('Размер пула должен быть больше 0')
+        if size > 1 and enterprise.port_allocator is None:
+            raise ValueError('Для пула из нескольких клиентов необходимо установить port_allocator')
+
+        self.enterprise = enterprise
+        self.size = size
+        self.max_uses = max_uses
+        self.start_timeout = start_timeout
+        self.poll_interval = poll_interval
+        self.start_attempts = max(start_attempts, 1)
+        self.kill_timeout = kill_timeout
+
+        self._idle: 'queue.Queue[PooledClient]' = queue.Queue()
+        self._clients: Set[PooledClient] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=size)
+        self._closed = False
+        # Клиенты, которые не удалось запустить за start_attempts попыток
+        self._lost = 0
+
+    def start(self, wait: bool = True):
+        """
+        Запускает клиенты пула.
+
+        :param wait: Ожидать готовности всех клиентов. Если клиент не удалось запустить,
+            пул останавливается (уже запущенные клиенты завершаются) и исключение передается дальше.
+        """
+        futures = [self._spawn() for _ in range(self.size)]
+        if wait:
+            try:
+                for future in futures:
+                    if future is not None:
+                        future.result()
+            except BaseException:
+                self.shutdown()
+                raise
+
+    @contextlib.contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[PooledClient]:
+        """
+        Выдает готовый клиент в аренду на время выполнения блока with.
+        Если в блоке возникло исключение, клиент перезапускается.
+
+        :param timeout: Время ожидания свободного клиента в секундах
+        :return:
+        """
+        client = self._acquire(timeout)
+        failed = False
+        try:
+            yield client
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._release(client, failed)
+
+    def shutdown(self):
+        """
+        Завершает все клиенты пула.
+        """
+        self._closed = True
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            clients = list(self._clients)
+            self._clients.clear()
+        for client in clients:
+            self._kill(client)
+        logger.debug(f'Пул тест клиентов базы {self.enterprise.connection} остановлен')
+
+    def __enter__(self) -> 'TestClientPool':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def _acquire(self, timeout: Optional[float]) -> PooledClient:
+        if self._closed:
+            raise RuntimeError('Пул тест клиентов остановлен')
+
+        start = time.monotonic()
+        while True:
+            wait_time = None if timeout is None else max(timeout - (time.monotonic() - start), 0)
+            try:
+                client = self._idle.get(timeout=wait_time)
+            except queue.Empty:
+                raise TimeoutError(f'Нет свободных тест клиентов за {timeout} с.')
+            if client is None:
+                # Признак потери всех клиентов возвращается в очередь для остальных ожидающих
+                self._idle.put(None)
+                raise RuntimeError(f'Не удалось запустить тест клиенты базы {self.enterprise.connection}')
+            if client.ready():
+                return client
+            logger.debug(f'Тест клиент на порту {client.port} не отвечает, перезапускаю')
+            self._recycle(client)
+
+    def _release(self, client: PooledClient, failed: bool):
+        client.uses += 1
+        if failed or client.uses >= self.max_uses:
+            self._recycle(client)
+        else:
+            self._idle.put(client)
+
+    def _recycle(self, client: PooledClient):
+        self._discard(client)
+        if not self._closed:
+            self._spawn()
+
+    def _spawn(self) -> Optional[Future]:
+        try:
+            future = self._executor.submit(self._start_client_with_retries)
+        except RuntimeError:
+            # Пул остановлен
+            return None
+        future.add_done_callback(self._started)
+        return future
+
+    def _started(self, future: Future):
+        if future.cancelled() or future.exception() is None:
+            return
+        with self._lock:
+            self._lost += 1
+            lost_all = self._lost >= self.size
+        logger.error(f'Тест клиент не запущен за {self.start_attempts} попыток, '
+                     f'клиентов в пуле: {self.size - self._lost}: {future.exception()}')
+        if lost_all:
+            self._idle.put(None)
+
+    def _start_client_with_retries(self):
+        for attempt in range(1, self.start_attempts + 1):
+            try:
+                return self._start_client()
+            except Exception as e:
+                if attempt == self.start_attempts or self._closed:
+                    raise
+                logger.warning(f'Не удалось запустить тест клиент (попытка {attempt}): {e}')
+
+    def _discard(self, client: PooledClient):
+        with self._lock:
+            self._clients.discard(client)
+        self._kill(client)
+
+    def _start_client(self):
+        port, pid = self.enterprise.start_test_client()
+        client = PooledClient(port=port, pid=pid)
+        with self._lock:
+            self._clients.add(client)
+
+        while not client.ready():
+            if not client.alive() or time.monotonic() - client.started > self.start_timeout:
+                self._discard(client)
+                logger.error(f'Тест клиент на порту {port} не запустился за {self.start_timeout} с.')
+                raise TimeoutError(f'Тест клиент на порту {port} не запустился за {self.start_timeout} с.')
+            time.sleep(self.poll_interval)
+
+        logger.debug(f'Тест клиент на порту {port} запущен за {time.monotonic() - client.started:.1f} с.')
+        self._idle.put(client)
+
+    def _kill(self, client: PooledClient):
+        if client.alive() and kill_processes([client.pid], self.kill_timeout):
+            logger.warning(f'Не удалось завершить тест клиент {client.pid} на порту {client.port}')
@@ -0,0 +1,237 @@
+import os
+import re
+import enum
+import shutil
+import logging
+import dataclasses
+from typing import Optional, Iterator, List, Dict
+from designer_cmd.utils import LruCache
+from .repo_report import open_report
+
+logger = logging.getLogger(__name__)
+
+REPORT_EXT = '.txt'
+
+
+class ChangeType(enum.Enum):
+    CHANGED = '***'
+    ADDED = '-->'
+    DELETED = '<--'
+    NONE = ''
+
+
+_NODE_RE = re.compile(r'^(?P<indent>\s*)- (?P<mark>\*\*\*|-->|<--)?\s*(?P<name>.+?)\s*$')
+
+
+@dataclasses.dataclass
+class CompareEntry:
+    """
+    Описывает объект из отчета о сравнении конфигураций (/CompareCfg)
+    """
+    path: str
+    change: ChangeType
+    properties: List[str] = dataclasses.field(default_factory=list)
+    depth: int = 0
+
+
+def iter_compare_report(report_file: str) -> Iterator[CompareEntry]:
+    """
+    Построчно разбирает текстовый (txt, Full) отчет о сравнении конфигураций.
+
+    Вложенность объектов определяется отступом, путь объекта строится от ближайшего полного имени
+    (содержащего точку), например Справочник.Справочник1.Реквизиты.Реквизит1.
+    Объект возвращается после того, как разобраны все его вложенные строки.
+
+    :param report_file: Путь к файлу отчета
+    :return: Итератор объектов отчета
+    """
+    with open_report(report_file) as f:
+        yield from _parse_compare_lines(f)
+
+
+def _indent_width(indent: str) -> int:
+    return len(indent.expandtabs(4))
+
+
+def _parse_compare_lines(lines, header: Optional[Dict[str, str]] = None) -> Iterator[CompareEntry]:
+    stack: List[CompareEntry] = []
+    prop_indent = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.strip() == '':
+            continue
+        indent = _indent_width(line[:len(line) - len(line.lstrip())])
+
+        if prop_indent is not None:
+            if indent > prop_indent:
+                # Значения свойства
+                continue
+            prop_indent = None
+
+        while stack and stack[-1].depth >= indent:
+            yield stack.pop()
+
+        match = _NODE_RE.match(line)
+        if match is None:
+            if stack:
+                stack[-1].properties.append(line.strip())
+                prop_indent = indent
+            elif header is not None:
+                key, sep, value = line.partition(':')
+                if sep:
+                    header[key.strip()] = value.strip()
+            continue
+
+        name = match.group('name')
+        if '.' in name or not stack:
+            entry_path = name
+        else:
+            entry_path = f'{stack[-1].path}.{name}'
+
+        stack.append(CompareEntry(
+            path=entry_path,
+            change=ChangeType(match.group('mark') or ''),
+            depth=indent
+        ))
+
+    while stack:
+        yield stack.pop()
+
+
+class CompareIndex:
+    """
+    Индекс отчета о сравнении конфигураций: путь объекта -> вид изменения, измененные свойства.
+    """
+
+    def __init__(self, entries: Optional[List[CompareEntry]] = None, header: Optional[Dict[str, str]] = None):
+        self.header: Dict[str, str] = header or {}
+        self._entries: Dict[str, CompareEntry] = {}
+        for entry in entries or []:
+            self.add(entry)
+
+    @classmethod
+    def from_report(cls, report_file: str) -> 'CompareIndex':
+        index = cls()
+        with open_report(report_file) as f:
+            for entry in _parse_compare_lines(f, index.header):
+                index.add(entry)
+        return index
+
+    def add(self, entry: CompareEntry):
+        cur_entry = self._entries.get(entry.path)
+        if cur_entry is None:
+            self._entries[entry.path] = entry
+            return
+        if cur_entry.change == ChangeType.NONE:
+            cur_entry.change = entry.change
+        cur_entry.properties.extend(p for p in entry.properties if p not in cur_entry.properties)
+
+    def get(self, path: str) -> Optional[CompareEntry]:
+        return self._entries.get(path)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._entries
+
+    def __iter__(self) -> Iterator[CompareEntry]:
+        return iter(self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def objects(self, change: Optional[ChangeType] = None) -> List[CompareEntry]:
+        """
+        Возвращает объекты отчета с указанным видом изменения (все измененные, если не указан)
+        """
+        if change is None:
+            return [e for e in self if e.change != ChangeType.NONE]
+        return [e for e in self if e.change == change]
+
+    def changed(self) -> List[CompareEntry]:
+        return self.objects(ChangeType.CHANGED)
+
+    def added(self) -> List[CompareEntry]:
+        return self.objects(ChangeType.ADDED)
+
+    def deleted(self) -> List[CompareEntry]:
+        return self.objects(ChangeType.DELETED)
+
+    def under(self, path: str) -> List[CompareEntry]:
+        """
+        Возвращает объект и все вложенные в него объекты отчета
+        """
+        prefix = f'{path}.'
+        return [e for p, e in self._entries.items() if p == path or p.startswith(prefix)]
+
+    def of_type(self, type_name: str) -> List[CompareEntry]:
+        """
+        Возвращает объекты метаданных указанного вида, например Справочник
+        """
+        return [e for p, e in self._entries.items() if p.count('.') == 1 and p.startswith(f'{type_name}.')]
+
+    def has_changes(self, path: Optional[str] = None) -> bool:
+        entries = self if path is None else self.under(path)
+        return any(e.change != ChangeType.NONE or e.properties for e in entries)
+
+
+class CompareCache(LruCache):
+    """
+    Кэш отчетов о сравнении по ключу (хэш конфигурации, хэш файла cf).
+
+    При превышении квоты размера или количества отчетов удаляются давно не использованные отчеты.
+    """
+
+    def __init__(self, cache_dir: str, quota: Optional[int] = None, max_entries: Optional[int] = None):
+        """
+        :param cache_dir: Каталог кэша
+        :param quota: Максимальный размер кэша в байтах
+        :param max_entries: Максимальное количество отчетов
+        """
+        super(CompareCache, self).__init__(cache_dir, quota, max_entries)
+
+    @staticmethod
+    def key(config_hash: str, cf_hash: str) -> str:
+        return f'{config_hash}_{cf_hash}'
+
+    def report_path(self, config_hash: str, cf_hash: str) -> str:
+        return self._report_path(self.key(config_hash, cf_hash))
+
+    def get(self, config_hash: str, cf_hash: str) -> Optional[CompareIndex]:
+        key = self.key(config_hash, cf_hash)
+        with self.locked(key):
+            if not self._exists(key):
+                return None
+            report_path = self._report_path(key)
+            # Время изменения файла отчета - время последнего использования
+            os.utime(report_path)
+            logger.debug(f'Отчет о сравнении получен из кэша {report_path}')
+            return CompareIndex.from_report(report_path)
+
+    def put(self, config_hash: str, cf_hash: str, report_file: str):
+        key = self.key(config_hash, cf_hash)
+        with self.locked(key):
+            report_path = self._report_path(key)
+            tmp_path = f'{report_path}.{os.getpid()}.tmp'
+            shutil.copyfile(report_file, tmp_path)
+            os.replace(tmp_path, report_path)
+        self.evict(keep=key)
+
+    def entries(self) -> List[dict]:
+        result = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(REPORT_EXT):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            result.append({'key': name[:-len(REPORT_EXT)], 'size': stat.st_size, 'last_used': stat.st_mtime})
+        return result
+
+    def _exists(self, key: str) -> bool:
+        return os.path.exists(self._report_path(key))
+
+    def _remove(self, key: str):
+        os.remove(self._report_path(key))
+
+    def _report_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}{REPORT_EXT}')
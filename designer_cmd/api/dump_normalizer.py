@@ -0,0 +1,244 @@
+import os
+import re
+import time
+import logging
+from xml.parsers import expat
+from dataclasses import dataclass, field
+from xml.parsers.expat import ExpatError
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Iterable, Callable, List, Tuple, Dict, Set
+from designer_cmd.utils import MerkleIndex, FileChange
+
+logger = logging.getLogger(__name__)
+
+DUMP_INFO_FILE = 'ConfigDumpInfo.xml'
+TAG_RE = re.compile(r'<[^<>!?/][^<>]*>')
+# Тег целиком, символ > в значениях атрибутов допустим
+START_TAG_RE = re.compile(rb'<(?:[^"\'>]|"[^"]*"|\'[^\']*\')*>')
+BOM = b'\xef\xbb\xbf'
+
+
+@dataclass
+class NormalizeReport:
+    # Файлов в выгрузке
+    files_total: int
+    # Файлов, измененных с прошлой нормализации и обработанных
+    files_processed: int
+    # Файлов, перезаписанных после нормализации
+    files_rewritten: int
+    bytes_processed: int
+    duration: float
+    # Ошибки обработки файлов по относительным путям, файлы будут обработаны при следующей нормализации
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files_processed / self.duration if self.duration else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_processed / 1024 / 1024 / self.duration if self.duration else 0.0
+
+
+class DumpNormalizer:
+    """
+    Нормализация выгрузки конфигурации в xml для стабильного сравнения: удаление изменчивых атрибутов,
+    сортировка дочерних элементов, единые окончания строк.
+
+    Обрабатываются только файлы, измененные с прошлой нормализации (по индексу хэшей MerkleIndex),
+    в пуле процессов. Файл перезаписывается атомарно и только при изменении содержимого.
+    ConfigDumpInfo.xml не изменяется: он используется платформой для инкрементальной выгрузки.
+    """
+
+    def __init__(self,
+                 newline: Optional[str] = '\n',
+                 strip_attributes: Iterable[str] = (),
+                 sort_elements: Iterable[str] = (),
+                 extensions: Iterable[str] = ('.xml', '.bsl'),
+                 transform: Optional[Callable[[str, str], str]] = None,
+                 workers: Optional[int] = None):
+        """
+        :param newline: Окончание строк, None - не изменять.
+        :param strip_attributes: Удаляемые атрибуты элементов xml (с префиксом пространства имен, если он есть)
+        :param sort_elements: Элементы xml (с префиксом), дочерние элементы которых сортируются
+        :param extensions: Расширения обрабатываемых файлов
+        :param transform: Дополнительное преобразование текста файла (относительный путь, текст) -> текст,
+            функция уровня модуля для передачи в процессы пула.
+        :param workers: Количество процессов, по умолчанию - количество процессоров.
+        """
+        self.newline = newline
+        self.strip_attributes = tuple(strip_attributes)
+        self.sort_elements = tuple(sort_elements)
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.transform = transform
+        self.workers = workers or os.cpu_count() or 1
+        self._attr_re = None
+        if self.strip_attributes:
+            names = '|'.join(re.escape(a) for a in self.strip_attributes)
+            self._attr_re = re.compile(rf'\s+(?:{names})\s*=\s*(?:"[^"]*"|\'[^\']*\')')
+
+    def normalize(self, dump_dir: str, index_file: Optional[str] = None) -> NormalizeReport:
+        """
+        Нормализует файлы выгрузки, измененные с прошлой нормализации.
+
+        :param dump_dir: Каталог выгрузки конфигурации
+        :param index_file: Файл индекса хэшей выгрузки, по умолчанию - рядом с каталогом выгрузки.
+        :return: Отчет о нормализации
+        """
+        dump_dir = os.path.abspath(dump_dir)
+        start = time.monotonic()
+        index = MerkleIndex(dump_dir, index_file)
+        # Индекс сохраняется только после обработки: прерванная нормализация повторяется полностью
+        changes = index.update(commit=False)
+        rel_paths = [
+            rel_path for rel_path, change in changes.items()
+            if change != FileChange.DELETED and self.accepts(rel_path)
+        ]
+
+        results = self._run(dump_dir, rel_paths)
+        errors = {rel_path: error for rel_path, _, _, error in results if error is not None}
+        for rel_path, error in errors.items():
+            logger.warning(f'Не удалось нормализовать файл {rel_path}: {error}')
+
+        # Файлы, измененные после начала нормализации, и файлы с ошибками обрабатываются при следующей нормализации
+        late = [rel_path for rel_path in index.update() if rel_path not in changes and self.accepts(rel_path)]
+        index.forget(list(errors) + late)
+
+        report = NormalizeReport(
+            files_total=len(index.files()),
+            files_processed=len(results) - len(errors),
+            files_rewritten=sum(1 for _, _, changed, _ in results if changed),
+            bytes_processed=sum(size for _, size, _, _ in results),
+            duration=time.monotonic() - start,
+            errors=errors,
+        )
+        logger.debug(f'Нормализация выгрузки {dump_dir}: обработано {report.files_processed} '
+                     f'из {report.files_total} файлов, перезаписано {report.files_rewritten} '
+                     f'за {report.duration:.1f} с. ({report.files_per_second:.0f} файлов/с, '
+                     f'{report.mb_per_second:.1f} МБ/с), ошибок {len(report.errors)}')
+        return report
+
+    def accepts(self, rel_path: str) -> bool:
+        """
+        Проверяет, обрабатывается ли файл.
+
+        :param rel_path: Относительный путь файла (через /)
+        :return:
+        """
+        return rel_path != DUMP_INFO_FILE and os.path.splitext(rel_path)[1].lower() in self.extensions
+
+    def normalize_text(self, rel_path: str, text: str) -> str:
+        """
+        Нормализует текст файла.
+
+        :param rel_path: Относительный путь файла (через /)
+        :param text: Текст файла
+        :return:
+        """
+        is_xml = rel_path.lower().endswith('.xml')
+        if is_xml and self._attr_re is not None:
+            text = TAG_RE.sub(lambda m: self._attr_re.sub('', m.group(0)), text)
+        if is_xml and self.sort_elements:
+            text = self._sort_elements(text)
+        if self.transform is not None:
+            text = self.transform(rel_path, text)
+        if self.newline is not None:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+            if self.newline != '\n':
+                text = text.replace('\n', self.newline)
+        return text
+
+    def _sort_elements(self, text: str) -> str:
+        # Дочерние элементы переставляются по смещениям в исходном тексте: разметка, пробельные узлы между
+        # элементами и текст вне корневого элемента сохраняются без изменений
+        data = text.encode('utf-8')
+        root = _parse_elements(data, set(self.sort_elements))
+        if root is None or not root.has_sorted:
+            return text
+        return (data[:root.start] + _render_element(data, root) + data[root.end:]).decode('utf-8')
+
+    def _run(self, dump_dir: str, rel_paths: List[str]) -> List[Tuple[str, int, bool, Optional[str]]]:
+        if self.workers == 1 or len(rel_paths) < self.workers * 8:
+            return [_normalize_file(dump_dir, rel_path, self) for rel_path in rel_paths]
+        with ProcessPoolExecutor(self.workers) as pool:
+            return list(pool.map(_normalize_file, [dump_dir] * len(rel_paths), rel_paths, [self] * len(rel_paths),
+                                 chunksize=64))
+
+
+def _normalize_file(dump_dir: str, rel_path: str,
+                    normalizer: DumpNormalizer) -> Tuple[str, int, bool, Optional[str]]:
+    file_path = os.path.join(dump_dir, *rel_path.split('/'))
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        bom = data.startswith(BOM)
+        text = data[len(BOM) if bom else 0:].decode('utf-8')
+
+        normalized = (BOM if bom else b'') + normalizer.normalize_text(rel_path, text).encode('utf-8')
+        if normalized == data:
+            return rel_path, len(data), False, None
+
+        tmp_file = f'{file_path}.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(normalized)
+        os.replace(tmp_file, file_path)
+    except (OSError, ValueError, ExpatError) as e:
+        return rel_path, 0, False, str(e)
+    return rel_path, len(data), True, None
+
+
+class _Element:
+    __slots__ = ('name', 'start', 'end', 'children', 'sorted', 'has_sorted')
+
+    def __init__(self, name: str, start: int):
+        self.name = name
+        self.start = start
+        self.end = start
+        self.children: List['_Element'] = []
+        self.sorted = False
+        self.has_sorted = False
+
+
+def _parse_elements(data: bytes, sort_elements: Set[str]) -> Optional['_Element']:
+    # Возвращает корневой элемент со смещениями элементов в data. Дочерние элементы запоминаются
+    # только для поддеревьев, содержащих сортируемые элементы
+    parser = expat.ParserCreate()
+    stack: List[_Element] = []
+    result: List[_Element] = []
+
+    def start_element(name, attrs):
+        element = _Element(name, parser.CurrentByteIndex)
+        tag = START_TAG_RE.match(data, element.start)
+        if tag is not None and tag.group(0).endswith(b'/>'):
+            element.end = tag.end()
+        stack.append(element)
+
+    def end_element(name):
+        element = stack.pop()
+        if element.end == element.start:
+            element.end = data.index(b'>', parser.CurrentByteIndex) + 1
+        element.sorted = name in sort_elements
+        element.has_sorted = element.sorted or any(c.has_sorted for c in element.children)
+        if not element.has_sorted:
+            element.children = []
+        (stack[-1].children if stack else result).append(element)
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.Parse(data, True)
+    return result[0] if result else None
+
+
+def _render_element(data: bytes, element: _Element) -> bytes:
+    if not element.has_sorted or not element.children:
+        return data[element.start:element.end]
+    children = [_render_element(data, c) for c in element.children]
+    if element.sorted:
+        children.sort()
+    # Элементы ставятся по местам исходных дочерних элементов, текст между ними сохраняется
+    parts = [data[element.start:element.children[0].start]]
+    for i, child in enumerate(children):
+        parts.append(child)
+        next_start = element.children[i + 1].start if i + 1 < len(children) else element.end
+        parts.append(data[element.children[i].end:next_start])
+    return b''.join(parts)
@@ -1,10 +1,20 @@
 import os
+import time
 import tempfile
 import logging
 import enum
-from typing import Optional, Callable
+import threading
+from typing import Optional, Callable, Dict, List, Tuple, Iterator
 from designer_cmd.utils import PlatformVersion, get_1c_exe_path, execute_command, xml_conf_version_file_exists, \
-    clear_folder, port_in_use, get_1c_processes, kill_process
+    clear_folder, port_in_use, kill_processes, content_hash, PortAllocator, ProcessWatchdog, StalledProcessError, \
+    TimeoutPolicy, ConcurrencyGovernor, CommandResult, compress_file, decompressed, CompressedFile
+from .manifest import ExtensionManifest
+from .compare_report import CompareIndex, CompareCache
+from .result_channel import ResultChannel
+from .process_index import ProcessIndex, ConnectionKey, operation_name
+from .dump_normalizer import DumpNormalizer, NormalizeReport
+from . import repo_commit
+from .repo_version_cache import RepoVersionCache
 
 logger = logging.getLogger(__name__)
 
@@ -61,7 +71,13 @@ class Connection(WithCredential):
                  server_path: str = '',
                  server_base_ref: str = '',
                  ib_name: str = '',
-                 time_out: int = 3600):
+                 time_out: int = 3600,
+                 stall_timeout: Optional[int] = None):
+        """
+        :param time_out: Лимит времени на выполнение команды в секундах
+        :param stall_timeout: Допустимое время без активности процесса 1с (рост процессорного времени
+            или лога /Out) в секундах, после которого процесс считается зависшим. None - не контролировать.
+        """
 
         if file_path == '' and (server_path == '' or server_base_ref == '') and ib_name == '':
             raise AttributeError('Для соедеинения не определен путь к базе!')
@@ -75,6 +91,7 @@ class Connection(WithCredential):
         self.server_base_ref = server_base_ref
 
         self.__time_out = time_out
+        self.stall_timeout = stall_timeout
 
     @property
     def timeout(self):
@@ -145,12 +162,19 @@ class AbcExecutor:
         self.platform_version: PlatformVersion = PlatformVersion(platform_version)
         self.connection = connection
         self.executable_path = self.get_executable_path()
+        # Лимит времени операций по истории длительностей, если не установлен - используется connection.timeout
+        self.timeout_policy: Optional[TimeoutPolicy] = None
+        # Ограничение количества одновременно запущенных процессов 1с на сервере
+        self.governor: Optional[ConcurrencyGovernor] = None
+        # Результат последней команды и обработчик результатов всех команд (учет израсходованных ресурсов)
+        self.last_result: Optional[CommandResult] = None
+        self.on_result: Optional[Callable[[CommandResult], None]] = None
 
     def get_executable_path(self) -> str:
         return get_1c_exe_path(self.platform_version)
 
     def execute_command(self, mode: str, command_params: list,
-                        connection_params_required: bool = True, wait: bool = True):
+                        connection_params_required: bool = True, wait: bool = True) -> tuple:
         params = [mode]
         if connection_params_required:
             params += self.connection.get_connection_params()
@@ -158,14 +182,45 @@ class AbcExecutor:
         params += ['/DisableStartupDialogs /DisableStartupMessages']
         debug_file_name = self.add_debug_params(params)
 
-        str_command = ' '.join(params)
-        str_command = self.connection.replace_credentials(str_command)
-        if self.repo_connection is not None:
-            str_command = self.repo_connection.replace_credentials(str_command)
+        str_command = self.replace_credentials(' '.join(params))
 
         logger.debug(f'Выполняю команду {self.executable_path} {str_command}')
 
-        result = execute_command(self.executable_path, params, self.connection.timeout, wait)
+        watchdog = None
+        if wait and self.connection.stall_timeout:
+            watchdog = ProcessWatchdog(self.connection.stall_timeout, log_file=debug_file_name)
+
+        operation = operation_name(mode, command_params)
+        timeout = self.connection.timeout
+        if wait and self.timeout_policy is not None:
+            infobase = str(ConnectionKey.from_connection(self.connection))
+            size = self.infobase_size()
+            timeout = self.timeout_policy.timeout(operation, infobase, size, default=timeout)
+
+        lease = None
+        if wait and self.governor is not None:
+            lease = self.governor.acquire(operation)
+            if lease.wait_time >= 1:
+                logger.info(f'Операция {operation} ожидала в очереди запуска {lease.wait_time:.1f} с.')
+
+        start = time.monotonic()
+        try:
+            result = execute_command(self.executable_path, params, timeout, wait, watchdog)
+        except StalledProcessError as e:
+            # Окончание лога может содержать командную строку с паролями базы и хранилища
+            error = StalledProcessError(e.pid, e.idle_time, self.replace_credentials(e.log_tail))
+            logger.error(str(error))
+            os.remove(debug_file_name)
+            raise error from None
+        finally:
+            if lease is not None:
+                lease.release()
+
+        timed_out = getattr(result, 'timed_out', False)
+        if wait and self.timeout_policy is not None and (result[0] == 0 or timed_out):
+            self.timeout_policy.record(operation, infobase, time.monotonic() - start, size, timed_out, timeout)
+
+        result = self._register_result(result, operation, lease, debug_file_name)
 
         if result[0] != 0:
             try:
@@ -176,15 +231,52 @@ class AbcExecutor:
                 error_text = f.read()
             f.close()
 
-            ex_error = self.connection.replace_credentials(result[1])
-            if self.repo_connection is not None:
-                ex_error = self.repo_connection.replace_credentials(ex_error)
+            ex_error = self.replace_credentials(result[1])
 
             error_text = f'При выполнении команды произошла ошибка:\n {error_text}\n {ex_error}'
             logger.error(error_text)
             os.remove(debug_file_name)
             raise SyntaxError(f'Не удалось выполнить команду! подробно: {error_text}')
         os.remove(debug_file_name)
+        return result
+
+    def replace_credentials(self, text: str) -> str:
+        """
+        Скрывает пользователя и пароль базы и хранилища в тексте.
+
+        :param text: Текст (командная строка, сообщение об ошибке)
+        :return:
+        """
+        text = self.connection.replace_credentials(text)
+        if self.repo_connection is not None:
+            text = self.repo_connection.replace_credentials(text)
+        return text
+
+    def _register_result(self, result: tuple, operation: str, lease, debug_file_name: str) -> CommandResult:
+        if not isinstance(result, CommandResult):
+            result = CommandResult(*result)
+        result.operation = operation
+        result.infobase = str(ConnectionKey.from_connection(self.connection))
+        if lease is not None:
+            result.usage.queue_wait = lease.wait_time
+        if os.path.exists(debug_file_name):
+            result.usage.out_file_size = os.path.getsize(debug_file_name)
+
+        self.last_result = result
+        if self.on_result is not None:
+            self.on_result(result)
+        return result
+
+    def infobase_size(self) -> Optional[int]:
+        """
+        Размер файловой базы текущего соединения (1Cv8.1CD), для остальных баз - None.
+
+        :return:
+        """
+        if self.connection.file_path == '':
+            return None
+        db_file = os.path.join(self.connection.file_path, '1Cv8.1CD')
+        return os.path.getsize(db_file) if os.path.exists(db_file) else None
 
     def add_debug_params(self, params) -> str:
         debug_file_name = tempfile.mkstemp('.log')
@@ -201,17 +293,80 @@ class Enterprise(AbcExecutor):
         MANAGER = '/TestManager'
         CLIENT = '/TestClient'
 
+    def __init__(self, platform_version: str, connection: Connection, repo_connection: RepositoryConnection = None,
+                 port_allocator: Optional[PortAllocator] = None):
+        super(Enterprise, self).__init__(platform_version, connection, repo_connection)
+        self.port_allocator = port_allocator
+
     def run_app(self, mode: Optional['RunMode'] = None, ep_x_path: Optional[str] = None,
-                c_string: Optional[str] = None, port: Optional[int]=None, wait: bool = True):
+                c_string: Optional[str] = None, port: Optional[int]=None, wait: bool = True) -> Optional[int]:
         """
         Запускает экземпляр 1с предприятия
         :param mode: режим запуска (Обычный, ТестКлиент, ТестМенеджер)
         :param ep_x_path: Путь к файлу epf/epr, который необходимо запустить.
         :param c_string: Строка, которая будет переданна в /C.
-        :param port: Порт на котором будет запущет тест менеджер
+        :param port: Порт на котором будет запущет тест менеджер. Если установлен port_allocator,
+            тест клиенту без указания порта выдается свободный порт из диапазона распределителя.
         :param wait: Ожидать завершения.
-        :return:
+        :return: Порт, на котором запущен клиент
+        """
+        port, _ = self._run_app(mode, ep_x_path, c_string, port, wait)
+        return port
+
+    def run_app_with_results(self, ep_x_path: str, c_string: Optional[str] = None,
+                             poll_interval: float = 0.2) -> Iterator[dict]:
         """
+        Запускает обработку и возвращает json записи, которые обработка пишет в канал результатов,
+        по мере их появления.
+
+        Обработке в /C передается строка "<c_string>;ResultFile=<путь>", в файл ResultFile
+        обработка дописывает по одной json записи на строку.
+        Если чтение прекращено до завершения обработки, итератор при закрытии ожидает завершения процесса
+        и только затем удаляет файл канала.
+
+        :param ep_x_path: Путь к файлу epf/epr, который необходимо запустить.
+        :param c_string: Дополнительные параметры для /C.
+        :param poll_interval: Интервал ожидания новых записей
+        :return: Итератор записей
+        """
+        errors = []
+
+        def run():
+            try:
+                self.run_app(ep_x_path=ep_x_path, c_string=channel.c_string(c_string))
+            except Exception as e:
+                errors.append(e)
+
+        with ResultChannel() as channel:
+            thread = threading.Thread(target=run, daemon=True)
+            thread.start()
+            completed = False
+            try:
+                yield from channel.read(thread.is_alive, poll_interval)
+                completed = True
+            finally:
+                thread.join()
+                if errors and not completed:
+                    logger.error(f'Ошибка выполнения обработки {ep_x_path}: {errors[0]}')
+
+        if errors:
+            raise errors[0]
+
+    def start_test_client(self, port: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Запускает тест клиент без ожидания завершения.
+
+        :param port: Порт тест клиента, если не указан - выдается port_allocator (по умолчанию 1538)
+        :return: (порт, pid процесса клиента)
+        """
+        if port is None and self.port_allocator is None:
+            port = 1538
+        port, result = self._run_app(self.RunMode.CLIENT, port=port, wait=False)
+        return port, result[2]
+
+    def _run_app(self, mode: Optional['RunMode'] = None, ep_x_path: Optional[str] = None,
+                 c_string: Optional[str] = None, port: Optional[int] = None,
+                 wait: bool = True) -> Tuple[Optional[int], tuple]:
         params = []
         if ep_x_path:
             logger.debug(f'Запускаю обработку {ep_x_path} в базе: {self.connection}')
@@ -225,27 +380,69 @@ class Enterprise(AbcExecutor):
         if mode:
             params.append(mode.value)
 
+        lease = None
+        if self.port_allocator is not None and (port or mode == self.RunMode.CLIENT):
+            lease = self.port_allocator.acquire(port)
+            port = lease.port
+        elif port and port_in_use(port):
+            raise SyntaxError('Порт уже занят')
+
         if port:
-            if port_in_use(port):
-                raise SyntaxError('Порт уже занят')
             params.append(f'-Tport {port}')
 
-        self.execute_command('ENTERPRISE ', params, wait=wait)
+        try:
+            result = self.execute_command('ENTERPRISE ', params, wait=wait)
+        except Exception:
+            if lease is not None:
+                lease.release()
+            raise
 
-    def kill_all_clients(self):
+        if lease is not None:
+            if wait:
+                lease.release()
+            else:
+                lease.bind_process(result[2])
+
+        return port, result
+
+    def kill_all_clients(self, timeout: float = 10, index: Optional[ProcessIndex] = None) -> List[int]:
         """
-        Завершает все запущенные под текущим соединением версии 1с
-        :return:
+        Завершает все запущенные под текущим соединением версии 1с.
+        Процессам отправляется сигнал штатного завершения, не завершившиеся за timeout процессы
+        завершаются принудительно.
+
+        :param timeout: Время ожидания завершения процессов в секундах
+        :param index: Индекс процессов 1с, если не передан - строится по запущенным процессам.
+        :return: Идентификаторы завершенных процессов
         """
         logger.debug(f'Останавливаю все экземпляры 1с, запущенные, на этом сервере по соединению {self.connection}')
-        procs_1c = get_1c_processes()
-        con_s = ' '.join(self.connection.get_connection_params())
-        for proc in filter(lambda x: con_s in x.cmd and 'ENTERPRISE' in x.cmd, procs_1c):
-            proc.kill()
+        if index is None:
+            index = ProcessIndex.scan()
+        pids = [p.pid for p in index.find(self.connection, mode='ENTERPRISE')]
+        alive = kill_processes(pids, timeout)
+        if alive:
+            logger.error(f'Не удалось завершить процессы 1с: {alive}')
+        return [pid for pid in pids if pid not in alive]
 
 
 class Designer(AbcExecutor):
 
+    def __init__(self, platform_version: str, connection: Connection, repo_connection: RepositoryConnection = None):
+        super(Designer, self).__init__(platform_version, connection, repo_connection)
+        # Каталог манифестов расширений для не файловых баз, по умолчанию - во временном каталоге.
+        self.manifest_dir: Optional[str] = None
+        self._extension_manifest: Optional[ExtensionManifest] = None
+
+    @property
+    def extension_manifest(self) -> ExtensionManifest:
+        """
+        Манифест загруженных в базу текущего соединения расширений.
+        """
+        manifest = ExtensionManifest.for_connection(self.connection, self.manifest_dir)
+        if self._extension_manifest is None or self._extension_manifest.manifest_file != manifest.manifest_file:
+            self._extension_manifest = manifest
+        return self._extension_manifest
+
     def create_base(self):
         """
         Создает базу данных.
@@ -255,6 +452,7 @@ class Designer(AbcExecutor):
         logger.debug(f'Создаю базу по соединению: {self.connection}')
         params = [f'{self.connection.get_connection_string()}']
         self.execute_command('CREATEINFOBASE', params, False)
+        self.extension_manifest.remove()
 
     def manage_support(self):
 
@@ -286,25 +484,29 @@ class Designer(AbcExecutor):
         """
         Загрузка базы из файла dt (соответствует команде /RestoreIB)
 
-        :param file_path: str - Путь к файлу базы (dt.)
+        :param file_path: str - Путь к файлу базы (dt.), сжатый файл (gzip/zstd) распаковывается во временный.
         :return:
         """
         full_file_path = os.path.abspath(file_path)
-        logger.debug(f'Загружаю файл dt {full_file_path} в БД по соединению {self.connection}')
-        params = ['/RestoreIB', f'{full_file_path}']
-        self.execute_command(f'DESIGNER', params)
+        with decompressed(full_file_path) as dt_path:
+            logger.debug(f'Загружаю файл dt {dt_path} в БД по соединению {self.connection}')
+            params = ['/RestoreIB', f'{dt_path}']
+            self.execute_command(f'DESIGNER', params)
+        self.extension_manifest.remove()
 
-    def dump_db_to_file(self, file_path: str) -> None:
+    def dump_db_to_file(self, file_path: str, compression: Optional[str] = None) -> Optional[CompressedFile]:
         """
         Выгрузка базы в файл (соответствует команде /DumpIB)
 
         :param file_path: str - Путь к файлу для выгрзки базы (dt.)
-        :return:
+        :param compression: Алгоритм сжатия (Compression), выгруженный файл заменяется сжатым file_path.gz (.zst)
+        :return: Описание сжатого файла (с sha256 содержимого), если задано сжатие.
         """
         full_file_path = os.path.abspath(file_path)
         logger.debug(f'Выгружаю файл dt по пути {full_file_path} из БД по соединению {self.connection}')
         params = ['/DumpIB', f'{full_file_path}']
         self.execute_command(f'DESIGNER', params)
+        return self._compress_artifact(full_file_path, compression)
 
     def load_config_from_files(self, catalog_path: str, list_file: Optional[str] = None) -> None:
         """
@@ -324,13 +526,15 @@ class Designer(AbcExecutor):
 
         self.execute_command(f'DESIGNER', params)
 
-    def dump_config_to_files(self, catalog_path: str, update: bool = True) -> None:
+    def dump_config_to_files(self, catalog_path: str, update: bool = True,
+                             normalizer: Optional[DumpNormalizer] = None) -> Optional[NormalizeReport]:
         """
         Выгружает конфигурацию в файлы (соответствует команде /DumpConfigToFiles)
 
         :param update:
         :param catalog_path: Каталог в который будет выгружен файл
-        :return:
+        :param normalizer: Нормализация выгруженных файлов, измененных с прошлой выгрузки
+        :return: Отчет о нормализации, если она задана.
         """
         full_catalog_path = os.path.abspath(catalog_path)
         logger.debug(
@@ -346,30 +550,37 @@ class Designer(AbcExecutor):
 
         self.execute_command(f'DESIGNER', params)
 
+        if normalizer is not None:
+            return normalizer.normalize(full_catalog_path)
+        return None
+
     def load_config_from_file(self, file_path: str) -> None:
         """
         Загружает конфигурацию в базу из файла cf (соответствует команде /LoadCfg)
 
-        :param file_path:
+        :param file_path: Путь к файлу cf, сжатый файл (gzip/zstd) распаковывается во временный.
         :return:
         """
         full_file_path = os.path.abspath(file_path)
-        logger.debug(
-            f'Загружаю конфигурацию из файла {full_file_path} в конфигурацию БД по соединению {self.connection}')
-        params = [f'/LoadCfg', f'{full_file_path}']
-        self.execute_command(f'DESIGNER', params)
+        with decompressed(full_file_path) as cf_path:
+            logger.debug(
+                f'Загружаю конфигурацию из файла {cf_path} в конфигурацию БД по соединению {self.connection}')
+            params = [f'/LoadCfg', f'{cf_path}']
+            self.execute_command(f'DESIGNER', params)
 
-    def dump_config_to_file(self, file_path: str) -> None:
+    def dump_config_to_file(self, file_path: str, compression: Optional[str] = None) -> Optional[CompressedFile]:
         """
         Выполнить сохранение конфигурации в файл cf (соответствует команде /DumpCfg)
         :param file_path:
-        :return:
+        :param compression: Алгоритм сжатия (Compression), выгруженный файл заменяется сжатым file_path.gz (.zst)
+        :return: Описание сжатого файла (с sha256 содержимого), если задано сжатие.
         """
         full_file_path = os.path.abspath(file_path)
         logger.debug(
             f'Сохраняю конфигурацию в файл {full_file_path} из конфигурации БД по соединению {self.connection}')
         params = [f'/DumpCfg', f'{full_file_path}']
         self.execute_command(f'DESIGNER', params)
+        return self._compress_artifact(full_file_path, compression)
 
     def dump_extension_to_file(self, file_path: str, extension_name: str):
         full_file_path = os.path.abspath(file_path)
@@ -403,38 +614,146 @@ class Designer(AbcExecutor):
         ]
         self.execute_command(f'DESIGNER', params)
 
-    def load_extension_from_file(self, extension_file_path: str, name: str):
+    def load_extension_from_file(self, extension_file_path: str, name: str, force: bool = False) -> bool:
         """
-        Выполняет загрузку расширения из файла cfe в базу
+        Выполняет загрузку расширения из файла cfe в базу.
+        Загрузка не выполняется, если в базу уже загружен файл с тем же содержимым (по манифесту расширений).
         :param extension_file_path:
         :param name:
+        :param force: Выполнить загрузку без проверки изменений
+        :return: Была ли выполнена загрузка
         """
         full_file_path = os.path.abspath(extension_file_path)
-        logger.debug(
-            f'Загружаю расширения из файла {full_file_path} в конфигурацию БД по соединению {self.connection}')
-        params = [
-            f'/LoadCfg', f'{full_file_path}',
-            f'-Extension', f'{name}'
-        ]
-        self.execute_command(f'DESIGNER', params)
+        ext_hash = content_hash(full_file_path)
+        if not force and not self.extension_manifest.changed(name, ext_hash):
+            logger.debug(f'Расширение {name} из файла {full_file_path} не изменилось, загрузка пропущена')
+            return False
+
+        self._load_extension(full_file_path, name)
+        self.extension_manifest.update(name, ext_hash)
+        return True
 
-    def load_extension_from_files(self, extension_folder: str, name: str):
+    def load_extension_from_files(self, extension_folder: str, name: str, force: bool = False) -> bool:
         """
-        Выполняет загрузку расширения из каталога в базу
+        Выполняет загрузку расширения из каталога в базу.
+        Загрузка не выполняется, если в базу уже загружен каталог с тем же содержимым (по манифесту расширений).
         :param extension_folder:
         :param name:
+        :param force: Выполнить загрузку без проверки изменений
+        :return: Была ли выполнена загрузка
         """
         full_catalog_path = os.path.abspath(extension_folder)
+        ext_hash = content_hash(full_catalog_path)
+        if not force and not self.extension_manifest.changed(name, ext_hash):
+            logger.debug(f'Расширение {name} из каталога {full_catalog_path} не изменилось, загрузка пропущена')
+            return False
+
+        self._load_extension(full_catalog_path, name)
+        self.extension_manifest.update(name, ext_hash)
+        return True
+
+    def _load_extension(self, ext_path: str, name: str):
+        # Загрузка без изменения манифеста: манифест обновляет вызывающий метод после успешной загрузки
+        full_path = os.path.abspath(ext_path)
+        if os.path.isdir(full_path):
+            logger.debug(
+                f'Загружаю расширение c именем {name} из файлов {full_path} конфигурацию '
+                f'БД по соединению {self.connection}')
+            params = [
+                f'/LoadConfigFromFiles', f'{full_path}',
+                f'-Extension', f'{name}'
+            ]
+        else:
+            logger.debug(
+                f'Загружаю расширения из файла {full_path} в конфигурацию БД по соединению {self.connection}')
+            params = [
+                f'/LoadCfg', f'{full_path}',
+                f'-Extension', f'{name}'
+            ]
+        self.execute_command(f'DESIGNER', params)
+
+    def load_extensions_from_files(self, dir_path: str):
+        """
+        Выполняет загрузку всех расширений из каталога за один запуск
+        (соответствует команде /LoadConfigFromFiles -AllExtensions).
+        Каждое расширение должно находиться в подкаталоге с именем расширения.
+
+        :param dir_path: Каталог с выгрузками расширений
+        """
+        full_dir_path = os.path.abspath(dir_path)
         logger.debug(
-            f'Загружаю расширение c именем {name} из файлов {full_catalog_path} конфигурацию '
-            f'БД по соединению {self.connection}')
+            f'Загружаю все расширения из каталога {full_dir_path} в конфигурацию БД по соединению {self.connection}')
         params = [
-            f'/LoadConfigFromFiles', f'{full_catalog_path}',
-            f'-Extension', f'{name}'
+            f'/LoadConfigFromFiles', f'{full_dir_path}',
+            f'-AllExtensions'
         ]
-
         self.execute_command(f'DESIGNER', params)
 
+    def load_extensions(self, extensions: Dict[str, str], check: bool = True, force: bool = False) -> List[str]:
+        """
+        Выполняет загрузку набора расширений с пропуском не изменившихся (по манифесту расширений).
+
+        Если все измененные расширения выгружены в xml в подкаталоги одного каталога (и других подкаталогов в нем нет),
+        загрузка выполняется одним запуском, иначе расширения загружаются по одному.
+        Проверка применения выполняется одним запуском для всех расширений.
+
+        :param extensions: Имя расширения -> путь к файлу cfe или каталогу xml
+        :param check: Выполнить проверку применения расширений после загрузки
+        :param force: Загрузить все расширения, не проверяя изменения
+        :return: Список загруженных расширений
+        """
+        manifest = self.extension_manifest
+        hashes = {name: content_hash(ext_path) for name, ext_path in extensions.items()}
+        changed = [name for name in extensions if force or manifest.changed(name, hashes[name])]
+
+        skipped = set(extensions) - set(changed)
+        if skipped:
+            logger.debug(f'Пропускаю загрузку не изменившихся расширений {", ".join(sorted(skipped))}')
+
+        if not changed:
+            return []
+
+        common_dir = self._common_extensions_dir({name: extensions[name] for name in changed})
+        if common_dir is not None and len(changed) > 1:
+            self.load_extensions_from_files(common_dir)
+        else:
+            for name in changed:
+                self._load_extension(extensions[name], name)
+
+        if check:
+            self.check_apply_extension()
+
+        for name in changed:
+            manifest.update(name, hashes[name])
+
+        return changed
+
+    @staticmethod
+    def _common_extensions_dir(extensions: Dict[str, str]) -> Optional[str]:
+        parents = set()
+        for name, ext_path in extensions.items():
+            full_path = os.path.abspath(ext_path)
+            if not os.path.isdir(full_path) or os.path.basename(full_path) != name:
+                return None
+            parents.add(os.path.dirname(full_path))
+
+        if len(parents) != 1:
+            return None
+
+        common_dir = parents.pop()
+        sub_dirs = {e.name for e in os.scandir(common_dir) if e.is_dir()}
+        if sub_dirs != set(extensions):
+            return None
+        return common_dir
+
+    @staticmethod
+    def _compress_artifact(file_path: str, compression: Optional[str]) -> Optional[CompressedFile]:
+        if compression is None:
+            return None
+        if not os.path.exists(file_path):
+            raise SyntaxError(f'Не найден выгруженный файл {file_path}')
+        return compress_file(file_path, algorithm=compression, remove_source=True)
+
     def delete_extension(self, extension_name: Optional[str] = None):
         """
         Выполняет удаление расширения из базы (/DeleteCfg)
@@ -451,6 +770,8 @@ class Designer(AbcExecutor):
 
         self.execute_command(f'DESIGNER', params)
 
+        self.extension_manifest.remove(extension_name)
+
     def check_apply_extension(self, extension_name: Optional[str] = None):
         """
         Выполнить проверку применения расширения к конфигурации
@@ -576,10 +897,33 @@ class Designer(AbcExecutor):
         self.execute_command(f'DESIGNER', params)
 
     @have_repo_connection
-    def dump_config_to_file_from_repo(self, file_path, version: Optional[str] = None):
+    def commit_changes_to_repo(self, dump_dir: str, changes: Dict[str, str], comment: str = '') -> List[str]:
+        """
+        Помещает в хранилище только объекты, файлы которых изменились: список объектов формируется
+        по изменениям выгрузки, выполняются захват, частичная загрузка файлов и отправка по списку.
+
+        :param dump_dir: Каталог выгрузки с изменениями
+        :param changes: Изменения файлов выгрузки (MerkleIndex.update, MerkleIndex.diff)
+        :param comment: Комментарий версии хранилища
+        :return: Помещенные в хранилище объекты
+        """
+        return repo_commit.commit_changes(self, dump_dir, changes, comment)
+
+    @have_repo_connection
+    def dump_config_to_file_from_repo(self, file_path, version: Optional[str] = None,
+                                      cache: Optional[RepoVersionCache] = None):
         """
         Выполняет выгрузку конфигурации из хранилища /ConfigurationRepositoryDumpCfg
+
+        :param file_path: Путь к файлу cf
+        :param version: Номер версии хранилища, по умолчанию - последняя версия.
+        :param cache: Кэш версий хранилища: выгруженная ранее версия копируется из кэша без запуска конфигуратора.
+            Последняя версия не кэшируется.
         """
+        if cache is not None and cache.cacheable(version):
+            cache.dump(self, file_path, version)
+            return
+
         full_file_path = os.path.abspath(file_path)
 
         logger.debug(
@@ -618,7 +962,7 @@ class Designer(AbcExecutor):
         params.append(f'/ConfigurationRepositoryUpdateCfg')
 
         if force:
-            params.append(f'--force')
+            params.append(f'-force')
 
         cfg_version = -1
         if version is not None:
@@ -672,6 +1016,16 @@ class Designer(AbcExecutor):
                         v_end: Optional[int] = None,
                         group_by_obj: bool = False,
                         group_by_comment: bool = False):
+        """
+        Формирует отчет по истории хранилища /ConfigurationRepositoryReport
+
+        :param report_file: Путь к файлу отчета, для файла с расширением .txt формируется текстовый отчет,
+            который можно разобрать с помощью repo_report.iter_repo_report
+        :param v_begin: Номер версии, с которой начинается отчет
+        :param v_end: Номер версии, которой заканчивается отчет
+        :param group_by_obj: Группировать по объектам
+        :param group_by_comment: Группировать по комментарию
+        """
         full_report_file = os.path.abspath(report_file)
 
         logger.debug(
@@ -687,7 +1041,7 @@ class Designer(AbcExecutor):
                 '-NBegin', f'{v_begin}'
             ])
 
-        if v_begin is not None:
+        if v_end is not None:
             params.extend([
                 '-NEnd', f'{v_end}'
             ])
@@ -695,7 +1049,7 @@ class Designer(AbcExecutor):
         if group_by_obj:
             params.append('-GroupByObject')
 
-        if group_by_comment is not None:
+        if group_by_comment:
             params.append('-GroupByComment')
 
         self.execute_command(f'DESIGNER', params)
@@ -753,6 +1107,38 @@ class Designer(AbcExecutor):
         ]
         self.execute_command(f'DESIGNER', params)
 
+    def compare_config_with_file_index(self, cf_file_path: str,
+                                       cache: Optional[CompareCache] = None,
+                                       config_hash: Optional[str] = None) -> CompareIndex:
+        """
+        Выполняет сравнение конфигурации с файлом cf и возвращает индекс отчета о сравнении.
+
+        :param cf_file_path: Путь к файлу cf, который необходимо сравнить с конфигурацией.
+        :param cache: Кэш отчетов о сравнении, при повторном сравнении тех же конфигураций отчет берется из кэша.
+        :param config_hash: Хэш конфигурации базы (например, хэш загруженного cf), обязателен при указании кэша:
+            вычисление хэша по выгрузке конфигурации требует запуска конфигуратора при каждом сравнении.
+        :return: Индекс отчета о сравнении
+        """
+        if cache is not None and config_hash is None:
+            raise ValueError('Для сравнения с кэшем необходимо указать хэш конфигурации базы')
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            if cache is not None:
+                cf_hash = content_hash(os.path.abspath(cf_file_path))
+                index = cache.get(config_hash, cf_hash)
+                if index is not None:
+                    return index
+
+            report_path = os.path.join(temp_dir, 'report.txt')
+            self.compare_config_with_file(cf_file_path, report_path)
+            if cache is not None:
+                cache.put(config_hash, cf_hash, report_path)
+            return CompareIndex.from_report(report_path)
+        finally:
+            clear_folder(temp_dir)
+            os.rmdir(temp_dir)
+
 
 def convert_cf_to_xml(
         cf_file_path: str,
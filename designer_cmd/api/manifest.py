@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from typing import Optional, Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .main_executable import Connection
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = 'extensions_manifest.json'
+
+
+class ExtensionManifest:
+    """
+    Манифест загруженных в базу расширений: имя расширения -> хэш содержимого cfe файла или каталога xml.
+
+    Для файловой базы манифест хранится в каталоге базы (и копируется/удаляется вместе с ней),
+    для серверной базы и базы из списка - в каталоге manifest_dir.
+    """
+
+    def __init__(self, manifest_file: str):
+        self.manifest_file = os.path.abspath(manifest_file)
+        self._data: Optional[Dict[str, str]] = None
+
+    @classmethod
+    def for_connection(cls, connection: 'Connection', manifest_dir: Optional[str] = None) -> 'ExtensionManifest':
+        """
+        Возвращает манифест базы по описанию соединения.
+
+        :param connection: Соединение с базой
+        :param manifest_dir: Каталог манифестов для не файловых баз, по умолчанию - во временном каталоге.
+        :return:
+        """
+        if connection.file_path != '':
+            return cls(os.path.join(connection.file_path, MANIFEST_FILE_NAME))
+
+        if manifest_dir is None:
+            manifest_dir = os.path.join(tempfile.gettempdir(), 'designer_cmd', 'extensions')
+
+        if connection.ib_name != '':
+            base_key = f'IBName:{connection.ib_name}'
+        else:
+            base_key = f'Server:{connection.server_path}\\{connection.server_base_ref}'
+        file_name = f'{hashlib.sha1(base_key.lower().encode("utf-8")).hexdigest()}.json'
+        return cls(os.path.join(manifest_dir, file_name))
+
+    @property
+    def data(self) -> Dict[str, str]:
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def get(self, name: str) -> Optional[str]:
+        return self.data.get(name)
+
+    def changed(self, name: str, content_hash: str) -> bool:
+        return self.data.get(name) != content_hash
+
+    def update(self, name: str, content_hash: str):
+        self.data[name] = content_hash
+        self._save()
+
+    def remove(self, name: Optional[str] = None):
+        """
+        Удаляет расширение из манифеста
+
+        :param name: Имя расширения, если не указано - удаляются все расширения.
+        """
+        if name is None:
+            self.data.clear()
+        else:
+            self.data.pop(name, None)
+        self._save()
+
+    def _load(self) -> Dict[str, str]:
+        if not os.path.exists(self.manifest_file):
+            return {}
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            logger.warning(f'Не удалось прочитать манифест расширений {self.manifest_file}: {e}')
+            return {}
+
+    def _save(self):
+        manifest_dir = os.path.dirname(self.manifest_file)
+        if not os.path.exists(manifest_dir):
+            os.makedirs(manifest_dir)
+        tmp_file = f'{self.manifest_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp_file, self.manifest_file)
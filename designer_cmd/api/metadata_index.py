@@ -0,0 +1,328 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import contextlib
+import xml.etree.ElementTree as ElementTree
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict, Iterator
+from designer_cmd.utils import MerkleIndex, FileChange
+
+logger = logging.getLogger(__name__)
+
+CONFIGURATION = 'Configuration'
+# Вложенные каталоги объекта, файлы которых относятся к подчиненному объекту (форме, команде, макету)
+SUBORDINATE_DIRS = {'Forms': 'Form', 'Commands': 'Command', 'Templates': 'Template'}
+TYPE_RE = re.compile(r'^(?:cfg:)?([A-Za-z]+?)(?:Ref|Object|RecordSet|RecordKey|RecordManager|Manager|List)?\.([^.\s]+)')
+IDENT_RE = re.compile(r'(?<![\w.&])([^\W\d]\w*)\s*\.')
+CODE_NOISE_RE = re.compile(r'"[^"]*"|//[^\n]*')
+
+TABLES = ('objects', 'attributes', 'types', 'refs', 'idents')
+
+
+@dataclass
+class MetadataObject:
+    full_name: str
+    kind: str
+    uuid: Optional[str]
+    file: str
+
+
+@dataclass
+class MetadataReference:
+    # Объект, содержащий ссылку (Catalog.Номенклатура, Catalog.Номенклатура.Form.ФормаЭлемента)
+    source: str
+    # Путь реквизита в объекте (Товары.Номенклатура), пустой для свойств объекта
+    attribute: str
+    # Свойство, содержащее ссылку (Type, Owners, RegisterRecords, ...)
+    via: str
+    target: str
+    file: str
+
+
+@dataclass
+class ModuleUsage:
+    owner: str
+    module: str
+    file: str
+
+
+def kind_from_dir(dir_name: str) -> str:
+    """
+    Возвращает вид объекта по каталогу выгрузки: Catalogs -> Catalog, ChartsOfAccounts -> ChartOfAccounts.
+
+    :param dir_name: Каталог первого уровня выгрузки
+    :return:
+    """
+    if dir_name.startswith('ChartsOf'):
+        return 'ChartOf' + dir_name[len('ChartsOf'):]
+    if dir_name.endswith('sses'):
+        return dir_name[:-2]
+    if dir_name.endswith('s'):
+        return dir_name[:-1]
+    return dir_name
+
+
+def owner_from_path(rel_path: str) -> str:
+    """
+    Возвращает полное имя объекта, к которому относится файл выгрузки:
+    Catalogs/Номенклатура/Forms/ФормаЭлемента/Ext/Form.xml -> Catalog.Номенклатура.Form.ФормаЭлемента
+
+    :param rel_path: Относительный путь файла (через /)
+    :return:
+    """
+    parts = rel_path.split('/')
+    if len(parts) < 2 or parts[0] == 'Ext':
+        return CONFIGURATION
+    owner = f'{kind_from_dir(parts[0])}.{os.path.splitext(parts[1])[0] if len(parts) == 2 else parts[1]}'
+    if len(parts) >= 4 and parts[2] in SUBORDINATE_DIRS:
+        owner += f'.{SUBORDINATE_DIRS[parts[2]]}.{os.path.splitext(parts[3])[0]}'
+    return owner
+
+
+def type_target(type_name: str) -> Optional[str]:
+    """
+    Возвращает объект, на который ссылается тип или ссылка на объект метаданных:
+    cfg:CatalogRef.Номенклатура -> Catalog.Номенклатура, AccumulationRegister.Остатки -> AccumulationRegister.Остатки
+
+    :param type_name: Тип (v8:Type) или ссылка (xr:Item)
+    :return: None для примитивных типов
+    """
+    match = TYPE_RE.match(type_name.strip())
+    if match is None:
+        return None
+    return f'{match.group(1)}.{match.group(2)}'
+
+
+def _local(tag: str) -> str:
+    return tag.rpartition('}')[2]
+
+
+def _parse_xml(file_path: str, rel_path: str) -> Dict[str, list]:
+    owner = owner_from_path(rel_path)
+    rows = {table: [] for table in TABLES}
+    stack: List[str] = []
+    # Именованные элементы: [глубина, вид, имя]; первый - сам объект для файлов MetaDataObject
+    items: List[list] = []
+    is_form = False
+
+    for event, elem in ElementTree.iterparse(file_path, events=('start', 'end')):
+        tag = _local(elem.tag)
+        if event == 'start':
+            stack.append(tag)
+            depth = len(stack)
+            if depth == 1:
+                is_form = tag == 'Form'
+            elif depth == 2 and stack[0] == 'MetaDataObject':
+                items.append([depth, tag, None])
+                rows['objects'].append((owner, tag, elem.get('uuid'), rel_path))
+            elif items and depth > 2 and stack[-2] == 'ChildObjects':
+                items.append([depth, tag, None])
+            elif is_form and elem.get('name'):
+                items.append([depth, tag, elem.get('name')])
+            continue
+
+        depth = len(stack)
+        attribute = '.'.join(item[2] or '' for item in items if item[0] > 2 or is_form)
+        text = (elem.text or '').strip()
+        if tag == 'Name' and depth > 2 and stack[-2] == 'Properties' and items and items[-1][0] == depth - 2:
+            items[-1][2] = text
+        elif tag in ('Type', 'TypeSet') and depth > 1 and stack[-2] == 'Type' and text:
+            rows['types'].append((owner, attribute, text, rel_path))
+            target = type_target(text)
+            if target is not None:
+                rows['refs'].append((owner, attribute, 'Type', target, rel_path))
+        elif tag == 'Item' and depth > 1 and text and type_target(text) is not None:
+            rows['refs'].append((owner, attribute, stack[-2], type_target(text), rel_path))
+
+        if items and items[-1][0] == depth:
+            item_depth, kind, name = items.pop()
+            if item_depth > 2 and not is_form and items and items[0][1] != CONFIGURATION:
+                # Формы и макеты перечислены в ChildObjects только именем
+                rows['attributes'].append((owner, attribute if name else text, kind, rel_path))
+        stack.pop()
+        elem.clear()
+    return rows
+
+
+def _parse_module(file_path: str, rel_path: str) -> Dict[str, list]:
+    rows = {table: [] for table in TABLES}
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        code = CODE_NOISE_RE.sub(' ', f.read())
+    owner = owner_from_path(rel_path)
+    module = os.path.splitext(rel_path.rpartition('/')[2])[0]
+    idents = {match.group(1).casefold() for match in IDENT_RE.finditer(code)}
+    rows['idents'] = [(owner, module, ident, rel_path) for ident in sorted(idents)]
+    return rows
+
+
+def _indexed(rel_path: str) -> bool:
+    return os.path.splitext(rel_path)[1].lower() in ('.xml', '.bsl')
+
+
+def _parse_file(dump_dir: str, rel_path: str) -> Dict[str, list]:
+    file_path = os.path.join(dump_dir, *rel_path.split('/'))
+    try:
+        if rel_path.lower().endswith('.bsl'):
+            return _parse_module(file_path, rel_path)
+        return _parse_xml(file_path, rel_path)
+    except (ElementTree.ParseError, UnicodeDecodeError) as e:
+        logger.warning(f'Не удалось разобрать файл выгрузки {rel_path}: {e}')
+        return {table: [] for table in TABLES}
+
+
+class MetadataIndex:
+    """
+    Индекс метаданных выгрузки конфигурации в xml в базе SQLite: объекты, реквизиты, типы реквизитов,
+    ссылки на объекты метаданных и идентификаторы, используемые в модулях (для поиска вызовов общих модулей).
+
+    Файлы xml читаются потоково (iterparse). Индекс обновляется только по файлам, измененным
+    с прошлого обновления (по MerkleIndex), разбор файлов выполняется в пуле процессов.
+    """
+
+    def __init__(self, dump_dir: str, db_file: str, workers: Optional[int] = None):
+        """
+        :param dump_dir: Каталог выгрузки конфигурации
+        :param db_file: Файл базы индекса
+        :param workers: Количество процессов разбора, по умолчанию - количество процессоров.
+        """
+        self.dump_dir = os.path.abspath(dump_dir)
+        self.db_file = os.path.abspath(db_file)
+        self.workers = workers or os.cpu_count() or 1
+        self.files_index = MerkleIndex(self.dump_dir, f'{os.path.splitext(self.db_file)[0]}.merkle.sqlite')
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS objects (full_name TEXT, kind TEXT, uuid TEXT, file TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS attributes (object TEXT, path TEXT, kind TEXT, file TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS types (object TEXT, attribute TEXT, type TEXT, file TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS refs '
+                         '(source TEXT, attribute TEXT, via TEXT, target TEXT, file TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS idents (owner TEXT, module TEXT, ident TEXT, file TEXT)')
+            for table in TABLES:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_file ON {table} (file)')
+            conn.execute('CREATE INDEX IF NOT EXISTS objects_name ON objects (full_name)')
+            conn.execute('CREATE INDEX IF NOT EXISTS attributes_object ON attributes (object)')
+            conn.execute('CREATE INDEX IF NOT EXISTS types_type ON types (type)')
+            conn.execute('CREATE INDEX IF NOT EXISTS refs_target ON refs (target)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idents_ident ON idents (ident)')
+
+    def update(self) -> Dict[str, str]:
+        """
+        Обновляет индекс по файлам, измененным с прошлого обновления.
+
+        :return: Изменения файлов (FileChange) по относительным путям
+        """
+        start = time.monotonic()
+        # Индекс файлов сохраняется после индекса метаданных: иначе прерванное обновление не повторяется
+        changes = {
+            rel_path: change for rel_path, change in self.files_index.update(commit=False).items()
+            if _indexed(rel_path)
+        }
+        to_parse = [rel_path for rel_path, change in changes.items() if change != FileChange.DELETED]
+        if self.workers == 1 or len(to_parse) < self.workers * 8:
+            parsed = [_parse_file(self.dump_dir, rel_path) for rel_path in to_parse]
+        else:
+            with ProcessPoolExecutor(self.workers) as pool:
+                parsed = list(pool.map(_parse_file, [self.dump_dir] * len(to_parse), to_parse, chunksize=64))
+
+        with self._connect() as conn:
+            for table in TABLES:
+                conn.executemany(f'DELETE FROM {table} WHERE file = ?', ((rel_path,) for rel_path in changes))
+            for rows in parsed:
+                for table, table_rows in rows.items():
+                    if table_rows:
+                        placeholders = ', '.join('?' * len(table_rows[0]))
+                        conn.executemany(f'INSERT INTO {table} VALUES ({placeholders})', table_rows)
+
+        # Файлы, измененные после начала обновления, будут разобраны при следующем обновлении
+        late = [rel_path for rel_path in self.files_index.update() if rel_path not in changes and _indexed(rel_path)]
+        self.files_index.forget(late)
+
+        logger.debug(f'Индекс метаданных {self.dump_dir} обновлен за {time.monotonic() - start:.1f} с.: '
+                     f'разобрано файлов {len(to_parse)}, удалено {len(changes) - len(to_parse)}')
+        return changes
+
+    def objects(self, kind: Optional[str] = None) -> List[MetadataObject]:
+        """
+        Возвращает объекты метаданных.
+
+        :param kind: Вид объекта (Catalog, Document, CommonModule, ...), None - все.
+        :return:
+        """
+        query = 'SELECT full_name, kind, uuid, file FROM objects'
+        args = []
+        if kind is not None:
+            query += ' WHERE kind = ?'
+            args.append(kind)
+        return [MetadataObject(*row) for row in self.query(query + ' ORDER BY full_name', args)]
+
+    def attributes(self, full_name: str) -> List[tuple]:
+        """
+        Возвращает реквизиты, табличные части и другие подчиненные объекты объекта.
+
+        :param full_name: Полное имя объекта (Catalog.Номенклатура)
+        :return: (путь, вид)
+        """
+        return self.query('SELECT path, kind FROM attributes WHERE object = ? ORDER BY rowid', [full_name])
+
+    def attribute_types(self, full_name: str) -> Dict[str, List[str]]:
+        """
+        Возвращает типы реквизитов объекта.
+
+        :param full_name: Полное имя объекта
+        :return: Типы по пути реквизита
+        """
+        result: Dict[str, List[str]] = {}
+        for attribute, type_name in self.query('SELECT attribute, type FROM types WHERE object = ? ORDER BY rowid',
+                                               [full_name]):
+            result.setdefault(attribute, []).append(type_name)
+        return result
+
+    def references_to(self, target: str, kind: Optional[str] = None) -> List[MetadataReference]:
+        """
+        Возвращает ссылки на объект метаданных (типы реквизитов, владельцы, движения, ввод на основании ...).
+
+        :param target: Полное имя объекта (Catalog.Номенклатура)
+        :param kind: Вид объекта, содержащего ссылку (Document), None - все.
+        :return:
+        """
+        query = 'SELECT source, attribute, via, target, file FROM refs WHERE target = ?'
+        args = [target]
+        if kind is not None:
+            query += ' AND substr(source, 1, ?) = ?'
+            args += [len(kind) + 1, f'{kind}.']
+        return [MetadataReference(*row) for row in self.query(query + ' ORDER BY source, attribute', args)]
+
+    def common_module_usages(self, module_name: str, forms_only: bool = False) -> List[ModuleUsage]:
+        """
+        Возвращает модули, в которых используется общий модуль (обращение ИмяМодуля.Метод).
+
+        :param module_name: Имя общего модуля
+        :param forms_only: Только модули форм
+        :return:
+        """
+        query = 'SELECT owner, module, file FROM idents WHERE ident = ?'
+        if forms_only:
+            query += " AND (owner LIKE '%.Form.%' OR owner LIKE 'CommonForm.%')"
+        return [ModuleUsage(*row) for row in self.query(query + ' ORDER BY owner, module', [module_name.casefold()])]
+
+    def query(self, sql: str, args: Optional[list] = None) -> List[tuple]:
+        """
+        Выполняет запрос к базе индекса.
+
+        :param sql: Текст запроса
+        :param args: Параметры запроса
+        :return:
+        """
+        with self._connect() as conn:
+            return conn.execute(sql, args or []).fetchall()
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
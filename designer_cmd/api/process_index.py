@@ -0,0 +1,244 @@
+import os
+import logging
+import dataclasses
+from collections import defaultdict
+from typing import Optional, List, Dict, Tuple, Iterable
+from designer_cmd.utils import Process, get_1c_processes, ONE_C_PROCESS_NAMES
+
+logger = logging.getLogger(__name__)
+
+# Режимы запуска 1cv8
+ONE_C_MODES = ('ENTERPRISE', 'DESIGNER', 'CREATEINFOBASE')
+
+# Параметры, значение которых передается следующим аргументом
+VALUE_PARAMS = {
+    '/f', '/s', '/ibname', '/n', '/p', '/execute', '/c', '/out', '/dumpresult', '/uc', '-tport',
+    '/configurationrepositoryf', '/configurationrepositoryn', '/configurationrepositoryp',
+}
+CONNECTION_PARAMS = {'/f': 'F', '/s': 'S', '/ibname': 'IBName'}
+REPOSITORY_PARAMS = {'/configurationrepositoryf', '/configurationrepositoryn', '/configurationrepositoryp'}
+RUN_MODE_PARAMS = ('/testclient', '/testmanager')
+
+
+@dataclasses.dataclass(frozen=True)
+class ConnectionKey:
+    """
+    Нормализованный ключ базы: вид подключения (F, S, IBName) и путь к базе.
+    """
+    kind: str
+    value: str
+
+    def __str__(self):
+        return f'{self.kind}={self.value}'
+
+    @classmethod
+    def from_param(cls, kind: str, value: str) -> 'ConnectionKey':
+        if kind == 'F':
+            value = os.path.normcase(os.path.normpath(value))
+        else:
+            value = value.replace('/', '\\').lower()
+        return cls(kind, value)
+
+    @classmethod
+    def from_connection(cls, connection) -> 'ConnectionKey':
+        """
+        Возвращает ключ базы соединения.
+
+        :param connection: Соединение с базой (Connection)
+        :return:
+        """
+        if connection.file_path != '':
+            return cls.from_param('F', connection.file_path)
+        if connection.ib_name != '':
+            return cls.from_param('IBName', connection.ib_name)
+        return cls.from_param('S', f'{connection.server_path}\\{connection.server_base_ref}')
+
+
+@dataclasses.dataclass(frozen=True)
+class CommandLine1C:
+    """
+    Разобранная командная строка процесса 1cv8
+    """
+    mode: str
+    connection: Optional[ConnectionKey]
+    port: Optional[int] = None
+    run_mode: str = ''
+
+
+def split_cmdline(cmd: str) -> List[str]:
+    """
+    Разбивает командную строку на аргументы по правилам windows (CommandLineToArgvW).
+
+    :param cmd: Командная строка
+    :return:
+    """
+    args = []
+    current = []
+    in_quotes = False
+    has_arg = False
+    i = 0
+    while i < len(cmd):
+        char = cmd[i]
+        if char == '\\':
+            end = i
+            while end < len(cmd) and cmd[end] == '\\':
+                end += 1
+            count = end - i
+            if end < len(cmd) and cmd[end] == '"':
+                current.append('\\' * (count // 2))
+                if count % 2:
+                    current.append('"')
+                    end += 1
+            else:
+                current.append('\\' * count)
+            has_arg = True
+            i = end
+            continue
+
+        if char == '"':
+            in_quotes = not in_quotes
+            has_arg = True
+        elif char in ' \t' and not in_quotes:
+            if has_arg:
+                args.append(''.join(current))
+                current = []
+                has_arg = False
+        else:
+            current.append(char)
+            has_arg = True
+        i += 1
+
+    if has_arg:
+        args.append(''.join(current))
+    return args
+
+
+def parse_1c_cmdline(cmd: str) -> Optional[CommandLine1C]:
+    """
+    Разбирает командную строку процесса 1cv8.
+
+    :param cmd: Командная строка процесса
+    :return: Разобранная командная строка, None - если в строке нет режима запуска 1с
+    """
+    mode = None
+    values: Dict[str, str] = {}
+    flags = set()
+    pending = None
+    for arg in split_cmdline(cmd):
+        if pending is not None:
+            values[pending] = arg
+            pending = None
+            continue
+
+        # Параметры вида "-TPort 1538" и "/DisableStartupDialogs /DisableStartupMessages" передаются одним аргументом
+        words = arg.split() if arg[:1] in '/-' else [arg.strip()]
+        for word in words:
+            if pending is not None:
+                values[pending] = word
+                pending = None
+                continue
+            key = word.lower()
+            if key in VALUE_PARAMS:
+                pending = key
+            elif key.startswith('-tport') and key[6:].isdigit():
+                values['-tport'] = key[6:]
+            elif key[:1] in '/-':
+                flags.add(key)
+            elif mode is None and word.upper() in ONE_C_MODES:
+                mode = word.upper()
+
+    if mode is None:
+        return None
+
+    connection = None
+    for param, kind in CONNECTION_PARAMS.items():
+        if values.get(param):
+            connection = ConnectionKey.from_param(kind, values[param])
+            break
+
+    port = values.get('-tport', '')
+    run_mode = next((p for p in RUN_MODE_PARAMS if p in flags), '')
+    return CommandLine1C(mode, connection, int(port) if port.isdigit() else None, run_mode)
+
+
+def operation_name(mode: str, command_params: list) -> str:
+    """
+    Возвращает имя операции 1cv8 по режиму запуска и параметрам команды (первый параметр команды,
+    для запуска обработки - с именем файла обработки).
+
+    :param mode: Режим запуска
+    :param command_params: Параметры команды без параметров соединения с базой
+    :return:
+    """
+    mode = mode.strip()
+    params = iter(command_params)
+    for param in params:
+        key = str(param).lower()
+        if key in REPOSITORY_PARAMS:
+            next(params, None)
+        elif key == '/execute':
+            return f'{mode} {param} {os.path.basename(str(next(params, "")))}'
+        elif key.startswith('/'):
+            return f'{mode} {param}'
+    return mode
+
+
+class ProcessIndex:
+    """
+    Индекс запущенных процессов 1с по базе и порту тест клиента.
+    """
+
+    def __init__(self, processes: Iterable[Process]):
+        """
+        :param processes: Процессы 1с
+        """
+        self._by_connection: Dict[ConnectionKey, List[Tuple[CommandLine1C, Process]]] = defaultdict(list)
+        self._by_port: Dict[int, List[Process]] = defaultdict(list)
+        self._count = 0
+        for process in processes:
+            command = parse_1c_cmdline(process.cmd)
+            if command is None:
+                continue
+            self._count += 1
+            if command.connection is not None:
+                self._by_connection[command.connection].append((command, process))
+            if command.port is not None:
+                self._by_port[command.port].append(process)
+
+    @classmethod
+    def scan(cls, names: Iterable[str] = ONE_C_PROCESS_NAMES) -> 'ProcessIndex':
+        """
+        Строит индекс по запущенным процессам 1с.
+
+        :param names: Имена исполняемых файлов 1с без расширения
+        :return:
+        """
+        return cls(get_1c_processes(names))
+
+    def find(self, connection, mode: Optional[str] = None, run_mode: Optional[str] = None) -> List[Process]:
+        """
+        Возвращает процессы, запущенные по базе.
+
+        :param connection: Соединение с базой (Connection) или ключ базы (ConnectionKey)
+        :param mode: Режим запуска (ENTERPRISE, DESIGNER), None - любой.
+        :param run_mode: Режим тестирования (/TestClient, /TestManager), None - любой.
+        :return:
+        """
+        key = connection if isinstance(connection, ConnectionKey) else ConnectionKey.from_connection(connection)
+        return [
+            process for command, process in self._by_connection.get(key, [])
+            if (mode is None or command.mode == mode.strip().upper())
+            and (run_mode is None or command.run_mode == run_mode.lower())
+        ]
+
+    def by_port(self, port: int) -> List[Process]:
+        """
+        Возвращает процессы тест клиентов, запущенные на порту.
+
+        :param port: Порт тест клиента
+        :return:
+        """
+        return list(self._by_port.get(port, []))
+
+    def __len__(self):
+        return self._count
@@ -1,6 +1,8 @@
+import time
 import logging
-from designer_cmd.utils import PlatformVersion, get_rac_path, execute_command
-from typing import List, Dict, Optional
+from designer_cmd.utils import PlatformVersion, get_rac_path, execute_command, TimeoutPolicy, ConcurrencyGovernor, \
+    CommandResult
+from typing import List, Dict, Optional, Callable
 from abc import ABC
 from enum import Enum
 from dataclasses import dataclass, field
@@ -129,6 +131,11 @@ def required_base_id(func):
 
 class Rac:
 
+    # Минимальные лимиты времени операций (режим и команда rac) в секундах
+    MIN_OPERATION_TIMEOUTS = {
+        'infobase create': 100,
+    }
+
     def __init__(self, platform_version: str, connection: RacConnection):
         self.platform_version: PlatformVersion = PlatformVersion(platform_version)
         self.connection = connection
@@ -142,6 +149,13 @@ class Rac:
         self.sessions = SessionMod(self)
 
         self.command_timeout = self.connection.timeout
+        # Лимит времени операций по истории длительностей
+        self.timeout_policy: Optional[TimeoutPolicy] = None
+        # Ограничение количества одновременно запущенных процессов rac на сервере
+        self.governor: Optional[ConcurrencyGovernor] = None
+        # Результат последней команды и обработчик результатов всех команд (учет израсходованных ресурсов)
+        self.last_result: Optional[CommandResult] = None
+        self.on_result: Optional[Callable[[CommandResult], None]] = None
 
     def add_cluster_id(self, params: list, cluster_id: Optional[str] = None):
         if not cluster_id:
@@ -186,14 +200,48 @@ class Rac:
 
         logger.debug(f'Выполняю команду {self.executable_path} {str_command}')
 
-        result = execute_command(self.executable_path, params, self.command_timeout)
-
+        operation = f'{mode} {command_params[0]}' if command_params else mode
+        timeout = self.operation_timeout(operation)
+        lease = self.governor.acquire(f'RAC {operation}') if self.governor is not None else None
+        start = time.monotonic()
+        try:
+            result = execute_command(self.executable_path, params, timeout)
+        finally:
+            if lease is not None:
+                lease.release()
+
+        if not isinstance(result, CommandResult):
+            result = CommandResult(*result)
+        result.operation = operation
+        result.infobase = self.connection.get_connection_string()
+        if lease is not None:
+            result.usage.queue_wait = lease.wait_time
+        self.last_result = result
+        if self.on_result is not None:
+            self.on_result(result)
+
+        if self.timeout_policy is not None and (result[0] == 0 or result.timed_out):
+            self.timeout_policy.record(operation, self.connection.get_connection_string(), time.monotonic() - start,
+                                       timed_out=result.timed_out, timeout=timeout)
         if result[0] == 0:
             result_data = parse_result(result[1])
         else:
             raise SyntaxError(f'Не удалось выполнить команду! подробно: {result[1]}')
         return result_data
 
+    def operation_timeout(self, operation: str) -> float:
+        """
+        Возвращает лимит времени операции: по истории длительностей (если установлен timeout_policy),
+        иначе - command_timeout, но не меньше минимального лимита операции.
+
+        :param operation: Режим и команда rac (infobase create)
+        :return:
+        """
+        timeout = self.command_timeout
+        if self.timeout_policy is not None:
+            timeout = self.timeout_policy.timeout(operation, self.connection.get_connection_string(), default=timeout)
+        return max(timeout, self.MIN_OPERATION_TIMEOUTS.get(operation, 0))
+
     def disconnect_users(self, base_ref: str):
         base_data = self.infobase.get_base_by_ref(base_ref)
         base_id = base_data.get('infobase')
@@ -298,12 +346,6 @@ class InfobaseMod(ABCRacMod):
         logger.debug(f'Создаю базу {database_name} '
                      f'по соединению {self.executor.connection}')
 
-        change_timeout = False
-        curr_timeout = self.executor.command_timeout
-        if curr_timeout < 100:
-            change_timeout = True
-            self.executor.command_timeout = 100
-
         _sql_base = sql_base_name if sql_base_name else database_name
 
         params = [
@@ -325,9 +367,6 @@ class InfobaseMod(ABCRacMod):
             raise SyntaxError(f'Не удалось создать базыу {database_name}')
         self.executor.base_id = new_base[0].get('infobase', None)
 
-        if change_timeout:
-            self.executor.command_timeout = curr_timeout
-
         return self.executor.base_id
 
 
@@ -0,0 +1,110 @@
+import os
+import logging
+import tempfile
+from typing import Dict, List, Iterable, Optional, TYPE_CHECKING
+from xml.sax.saxutils import quoteattr
+from designer_cmd.utils import FileChange
+from .metadata_index import owner_from_path, CONFIGURATION
+from .dump_normalizer import DUMP_INFO_FILE
+
+if TYPE_CHECKING:
+    from .main_executable import Designer
+
+logger = logging.getLogger(__name__)
+
+
+def changed_objects(changes: Dict[str, str]) -> List[str]:
+    """
+    Возвращает объекты метаданных верхнего уровня, файлы которых изменились.
+
+    :param changes: Изменения файлов выгрузки (FileChange) по относительным путям (MerkleIndex.update, diff)
+    :return: Полные имена объектов (Catalog.Номенклатура, Configuration)
+    """
+    objects = set()
+    for rel_path in changes:
+        if rel_path == DUMP_INFO_FILE:
+            continue
+        objects.add('.'.join(owner_from_path(rel_path).split('.')[:2]))
+    return sorted(objects, key=lambda name: (name != CONFIGURATION, name))
+
+
+def write_objects_list(objects: Iterable[str], file_path: str, include_child_objects: bool = True) -> str:
+    """
+    Записывает файл списка объектов для захвата, отправки и освобождения объектов хранилища (-Objects).
+
+    :param objects: Полные имена объектов, Configuration - корень конфигурации.
+    :param file_path: Путь к файлу списка
+    :param include_child_objects: Включать подчиненные объекты (формы, макеты, команды)
+    :return: Путь к файлу списка
+    """
+    child_objects = 'true' if include_child_objects else 'false'
+    lines = ['<Objects xmlns="http://v8.1c.ru/8.3/config/objects" version="1.0">']
+    for name in objects:
+        if name == CONFIGURATION:
+            # Для корня конфигурации подчиненные объекты - вся конфигурация
+            lines.append('    <Configuration includeChildObjects="false"/>')
+        else:
+            lines.append(f'    <Object fullName={quoteattr(name)} includeChildObjects="{child_objects}"/>')
+    lines.append('</Objects>')
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return os.path.abspath(file_path)
+
+
+def write_files_list(dump_dir: str, rel_paths: Iterable[str], file_path: str) -> str:
+    """
+    Записывает файл списка файлов для частичной загрузки конфигурации из файлов (-listFile).
+
+    :param dump_dir: Каталог выгрузки
+    :param rel_paths: Относительные пути файлов (через /)
+    :param file_path: Путь к файлу списка
+    :return: Путь к файлу списка
+    """
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for rel_path in rel_paths:
+            f.write(os.path.join(os.path.abspath(dump_dir), *rel_path.split('/')) + '\n')
+    return os.path.abspath(file_path)
+
+
+def commit_changes(designer: 'Designer', dump_dir: str, changes: Dict[str, str], comment: str = '',
+                   work_dir: Optional[str] = None) -> List[str]:
+    """
+    Помещает в хранилище только измененные объекты: захват объектов по списку, частичная загрузка
+    измененных файлов, отправка объектов по тому же списку. При ошибке загрузки или отправки объекты освобождаются.
+
+    Удаление файлов частичной загрузкой не выполняется, поэтому при удаленных файлах загружается
+    вся конфигурация, захватываются и отправляются по-прежнему только измененные объекты.
+
+    :param designer: Конфигуратор базы, привязанной к хранилищу, с заполненным repo_connection
+    :param dump_dir: Каталог выгрузки с изменениями
+    :param changes: Изменения файлов выгрузки (FileChange) по относительным путям
+    :param comment: Комментарий версии хранилища
+    :param work_dir: Каталог файлов списков, по умолчанию - временный каталог.
+    :return: Помещенные в хранилище объекты
+    """
+    objects = changed_objects(changes)
+    if not objects:
+        logger.debug(f'В выгрузке {dump_dir} нет изменений для помещения в хранилище')
+        return []
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        objects_file = write_objects_list(objects, os.path.join(tmp_dir, 'objects.xml'))
+        files = [
+            rel_path for rel_path, change in changes.items()
+            if change != FileChange.DELETED and rel_path != DUMP_INFO_FILE
+        ]
+        list_file = None
+        if len(files) == len([rel_path for rel_path in changes if rel_path != DUMP_INFO_FILE]):
+            list_file = write_files_list(dump_dir, files, os.path.join(tmp_dir, 'files.txt'))
+        else:
+            logger.debug(f'В выгрузке {dump_dir} есть удаленные файлы, конфигурация загружается полностью')
+
+        logger.debug(f'Помещаю в хранилище объекты: {", ".join(objects)}')
+        designer.lock_objects_in_repository(objects_file)
+        try:
+            designer.load_config_from_files(dump_dir, list_file)
+            designer.commit_config_to_repo(comment, objects_file)
+        except Exception:
+            designer.unlock_objects_in_repository(objects_file)
+            raise
+    return objects
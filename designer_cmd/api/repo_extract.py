@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, List, Iterable, TYPE_CHECKING
+from .process_index import ConnectionKey
+from .repo_version_cache import RepoVersionCache
+
+if TYPE_CHECKING:
+    from .main_executable import Designer
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = '.extract_state.json'
+
+
+class RepoVersionExtractor:
+    """
+    Параллельная выгрузка версий хранилища конфигурации в файлы cf (/ConfigurationRepositoryDumpCfg).
+
+    Версии выгружаются через пул рабочих баз: каждая база одновременно выполняет одну выгрузку.
+    Выгруженные файлы хранятся в каталоге по номеру версии, уже выгруженные версии пропускаются,
+    поэтому прерванная выгрузка продолжается повторным вызовом.
+    """
+
+    def __init__(self,
+                 designers: List['Designer'],
+                 output_dir: str,
+                 concurrency: Optional[int] = None,
+                 cache: Optional[RepoVersionCache] = None,
+                 on_version: Optional[Callable[[int, str], None]] = None):
+        """
+        :param designers: Конфигураторы рабочих баз с заполненным repo_connection. Если базы привязываются
+            к хранилищу (prepare), для каждой базы нужен отдельный пользователь хранилища.
+        :param output_dir: Каталог выгруженных файлов cf
+        :param concurrency: Максимальное количество одновременных выгрузок, по умолчанию - количество баз.
+        :param cache: Кэш версий хранилища, общий для нескольких каталогов выгрузки и процессов:
+            версии из кэша копируются без запуска конфигуратора.
+        :param on_version: Функция, вызываемая после выгрузки версии (версия, путь к файлу cf)
+        """
+        if not designers:
+            raise ValueError('Не переданы рабочие базы для выгрузки версий')
+        self.designers = designers
+        self.output_dir = os.path.abspath(output_dir)
+        self.concurrency = min(concurrency or len(designers), len(designers))
+        self.cache = cache
+        self.on_version = on_version
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def path(self, version: int) -> str:
+        """
+        Возвращает путь к файлу cf версии.
+
+        :param version: Номер версии хранилища
+        :return:
+        """
+        return os.path.join(self.output_dir, f'{int(version)}.cf')
+
+    def extracted(self) -> List[int]:
+        """
+        Возвращает уже выгруженные версии.
+
+        :return:
+        """
+        return sorted(
+            int(name[:-len('.cf')]) for name in os.listdir(self.output_dir)
+            if name.endswith('.cf') and name[:-len('.cf')].isdigit()
+        )
+
+    def prepare(self):
+        """
+        Создает (для файловых баз) и привязывает рабочие базы к хранилищу, если это еще не сделано.
+        """
+        state = self._load_state()
+        for designer in self.designers:
+            key = str(ConnectionKey.from_connection(designer.connection))
+            if key in state.get('bound', []):
+                continue
+            file_path = designer.connection.file_path
+            if file_path and not os.path.exists(os.path.join(file_path, '1Cv8.1CD')):
+                designer.create_base()
+            designer.bind_cfg_to_repo()
+            state.setdefault('bound', []).append(key)
+            self._save_state(state)
+
+    def extract(self, versions: Iterable[int]) -> Dict[int, str]:
+        """
+        Выгружает версии хранилища, которые еще не выгружены.
+
+        :param versions: Номера версий
+        :return: Пути к файлам cf всех переданных версий
+        """
+        versions = sorted(set(int(v) for v in versions))
+        pending = [v for v in versions if not os.path.exists(self.path(v))]
+        logger.debug(f'Выгрузка версий хранилища: всего {len(versions)}, выгружено ранее '
+                     f'{len(versions) - len(pending)}, одновременно {self.concurrency}')
+
+        free = queue.Queue()
+        for designer in self.designers[:self.concurrency]:
+            free.put(designer)
+
+        failed = {}
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            futures = {v: pool.submit(self._extract_version, free, v) for v in pending}
+            for version, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    failed[version] = e
+
+        if failed:
+            raise SyntaxError(f'Не удалось выгрузить версии хранилища {sorted(failed)}: '
+                              f'{failed[min(failed)]}') from failed[min(failed)]
+        return {v: self.path(v) for v in versions}
+
+    def _extract_version(self, free: queue.Queue, version: int):
+        designer = free.get()
+        try:
+            start = time.monotonic()
+            file_path = self.path(version)
+            tmp_file = f'{file_path}.tmp'
+            try:
+                designer.dump_config_to_file_from_repo(tmp_file, str(version), self.cache)
+                os.replace(tmp_file, file_path)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+            logger.debug(f'Версия {version} выгружена через базу '
+                         f'{ConnectionKey.from_connection(designer.connection)} '
+                         f'за {time.monotonic() - start:.1f} с.')
+        finally:
+            free.put(designer)
+
+        if self.on_version is not None:
+            self.on_version(version, file_path)
+
+    def _load_state(self) -> dict:
+        state_file = os.path.join(self.output_dir, STATE_FILE)
+        if not os.path.exists(state_file):
+            return {}
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_state(self, state: dict):
+        state_file = os.path.join(self.output_dir, STATE_FILE)
+        tmp_file = f'{state_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_file, state_file)
@@ -0,0 +1,287 @@
+import os
+import json
+import codecs
+import logging
+import tempfile
+import dataclasses
+from datetime import datetime
+from typing import Optional, Iterator, List, Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .main_executable import Designer
+
+logger = logging.getLogger(__name__)
+
+
+REPORT_VERSION_KEY = 'Версия'
+REPORT_USER_KEY = 'Пользователь'
+REPORT_DATE_KEY = 'Дата создания'
+REPORT_TIME_KEY = 'Время создания'
+REPORT_COMMENT_KEY = 'Комментарий'
+
+REPORT_OBJECT_KEYS = {
+    'Добавлены': 'added',
+    'Изменены': 'changed',
+    'Удалены': 'deleted',
+}
+
+
+@dataclasses.dataclass
+class RepoVersion:
+    """
+    Описывает версию хранилища из отчета /ConfigurationRepositoryReport
+    """
+    version: int
+    user: str = ''
+    date: Optional[datetime] = None
+    comment: str = ''
+    added: List[str] = dataclasses.field(default_factory=list)
+    changed: List[str] = dataclasses.field(default_factory=list)
+    deleted: List[str] = dataclasses.field(default_factory=list)
+    properties: Dict[str, str] = dataclasses.field(default_factory=dict)
+
+    @property
+    def objects(self) -> List[str]:
+        return self.added + self.changed + self.deleted
+
+    def to_dict(self) -> dict:
+        data = dataclasses.asdict(self)
+        data['date'] = self.date.strftime('%Y-%m-%dT%H:%M:%S') if self.date else None
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RepoVersion':
+        data = dict(data)
+        if data.get('date'):
+            data['date'] = datetime.strptime(data['date'], '%Y-%m-%dT%H:%M:%S')
+        return cls(**data)
+
+
+def report_encoding(report_file: str, read_size: int = 1024 * 1024) -> str:
+    """
+    Определяет кодировку текстового отчета: по BOM, при его отсутствии - проверкой всего файла на utf-8.
+
+    :param report_file: Путь к файлу отчета
+    :param read_size: Размер блока чтения
+    :return:
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(report_file, 'rb') as f:
+        data = f.read(read_size)
+        if data.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        try:
+            while data:
+                decoder.decode(data, final=False)
+                data = f.read(read_size)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return 'cp1251'
+    return 'utf-8-sig'
+
+
+def open_report(report_file: str):
+    """
+    Открывает текстовый отчет в определенной кодировке, не декодируемые символы заменяются.
+
+    :param report_file: Путь к файлу отчета
+    :return:
+    """
+    return open(report_file, 'r', encoding=report_encoding(report_file), errors='replace')
+
+
+def iter_repo_report(report_file: str,
+                     v_begin: Optional[int] = None,
+                     v_end: Optional[int] = None) -> Iterator[RepoVersion]:
+    """
+    Построчно разбирает текстовый отчет по версиям хранилища (файл .txt, сформированный
+    /ConfigurationRepositoryReport без группировки), не загружая файл в память целиком.
+
+    :param report_file: Путь к файлу отчета
+    :param v_begin: Номер версии, с которой необходимо вернуть данные
+    :param v_end: Номер версии, по которую необходимо вернуть данные
+    :return: Итератор версий хранилища в порядке следования в отчете
+    """
+    with open_report(report_file) as f:
+        for version in _parse_report_lines(f):
+            if v_begin is not None and version.version < v_begin:
+                continue
+            if v_end is not None and version.version > v_end:
+                continue
+            yield version
+
+
+def _parse_report_lines(lines) -> Iterator[RepoVersion]:
+    fields: Dict[str, List[str]] = {}
+    cur_key = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.strip() == '':
+            cur_key = None
+            continue
+
+        if line[0] in ' \t':
+            if cur_key is not None:
+                fields[cur_key].append(line.strip())
+            continue
+
+        key, sep, value = line.partition(':')
+        if not sep:
+            # Объекты в отчете могут быть указаны без двоеточия после заголовка группы
+            key, _, value = line.partition('\t')
+        key = key.strip()
+        value = value.strip()
+
+        if key == REPORT_VERSION_KEY:
+            if fields:
+                yield _version_from_fields(fields)
+            fields = {}
+
+        if key != REPORT_VERSION_KEY and not fields:
+            # Шапка отчета, до первой версии
+            cur_key = None
+            continue
+
+        cur_key = key
+        fields.setdefault(key, [])
+        if value:
+            fields[key].append(value)
+
+    if fields:
+        yield _version_from_fields(fields)
+
+
+def _version_from_fields(fields: Dict[str, List[str]]) -> RepoVersion:
+    version = RepoVersion(version=int(fields[REPORT_VERSION_KEY][0]))
+    version.user = ' '.join(fields.get(REPORT_USER_KEY, []))
+    version.comment = '\n'.join(fields.get(REPORT_COMMENT_KEY, []))
+    version.date = _parse_date(
+        ' '.join(fields.get(REPORT_DATE_KEY, [])),
+        ' '.join(fields.get(REPORT_TIME_KEY, []))
+    )
+    for key, attr in REPORT_OBJECT_KEYS.items():
+        setattr(version, attr, list(fields.get(key, [])))
+
+    skip_keys = {REPORT_VERSION_KEY, REPORT_USER_KEY, REPORT_COMMENT_KEY, REPORT_DATE_KEY, REPORT_TIME_KEY}
+    skip_keys.update(REPORT_OBJECT_KEYS.keys())
+    version.properties = {k: '\n'.join(v) for k, v in fields.items() if k not in skip_keys}
+    return version
+
+
+def _parse_date(date_str: str, time_str: str) -> Optional[datetime]:
+    if not date_str:
+        return None
+    try:
+        return datetime.strptime(f'{date_str} {time_str or "00:00:00"}', '%d.%m.%Y %H:%M:%S')
+    except ValueError:
+        logger.warning(f'Не удалось разобрать дату версии хранилища: {date_str} {time_str}')
+        return None
+
+
+class RepoHistory:
+    """
+    Локальный кэш истории хранилища.
+
+    Разобранные версии хранятся в файле (json lines), при обращении к диапазону версий
+    из хранилища запрашиваются только версии, отсутствующие в кэше.
+    """
+
+    def __init__(self, designer: 'Designer', cache_file: str):
+        self.designer = designer
+        self.cache_file = os.path.abspath(cache_file)
+        self._last_version: Optional[int] = None
+
+    @property
+    def last_version(self) -> int:
+        """
+        Номер последней версии в кэше (0 - кэш пуст)
+        """
+        if self._last_version is None:
+            last_version = 0
+            for version in self._iter_cache():
+                last_version = max(last_version, version.version)
+            self._last_version = last_version
+        return self._last_version
+
+    def fetch(self, v_end: Optional[int] = None) -> int:
+        """
+        Получает из хранилища версии, отсутствующие в кэше.
+
+        :param v_end: Номер версии, до которой необходимо получить историю, по умолчанию - до последней.
+        :return: Количество добавленных в кэш версий
+        """
+        v_begin = self.last_version + 1
+        if v_end is not None and v_end < v_begin:
+            return 0
+
+        logger.debug(f'Получаю историю хранилища {self.designer.repo_connection} с версии {v_begin} по {v_end}')
+
+        handle, report_file = tempfile.mkstemp('.txt')
+        os.close(handle)
+        added = 0
+        try:
+            self.designer.get_repo_report(report_file, v_begin, v_end)
+            self._truncate_partial_line()
+            with open(self.cache_file, 'a', encoding='utf-8') as f:
+                for version in iter_repo_report(report_file, v_begin, v_end):
+                    f.write(json.dumps(version.to_dict(), ensure_ascii=False))
+                    f.write('\n')
+                    self._last_version = max(self._last_version, version.version)
+                    added += 1
+        finally:
+            os.remove(report_file)
+        return added
+
+    def versions(self, v_begin: Optional[int] = None, v_end: Optional[int] = None,
+                 fetch: bool = True) -> Iterator[RepoVersion]:
+        """
+        Возвращает версии хранилища из диапазона, при необходимости дополняя кэш.
+
+        :param v_begin: Номер начальной версии
+        :param v_end: Номер конечной версии, по умолчанию - последняя версия хранилища.
+        :param fetch: Получать недостающие версии из хранилища.
+        :return:
+        """
+        if fetch:
+            self.fetch(v_end)
+        for version in self._iter_cache():
+            if v_begin is not None and version.version < v_begin:
+                continue
+            if v_end is not None and version.version > v_end:
+                continue
+            yield version
+
+    def _iter_cache(self) -> Iterator[RepoVersion]:
+        if not os.path.exists(self.cache_file):
+            return
+        with open(self.cache_file, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    # Строка, не дописанная при прерывании fetch
+                    logger.warning(f'Пропущена не разобранная строка кэша истории {self.cache_file}: {line.strip()}')
+                    continue
+                yield RepoVersion.from_dict(data)
+
+    def _truncate_partial_line(self):
+        # Удаляет не дописанную при прерывании fetch последнюю строку, чтобы новые версии начинались с новой строки
+        if not os.path.exists(self.cache_file):
+            return
+        with open(self.cache_file, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                block = min(pos, 64 * 1024)
+                f.seek(pos - block)
+                data = f.read(block)
+                index = data.rfind(b'\n')
+                if index >= 0:
+                    pos = pos - block + index + 1
+                    break
+                pos -= block
+            if pos < end:
+                logger.warning(f'Удалена не дописанная строка кэша истории {self.cache_file}')
+                f.truncate(pos)
@@ -0,0 +1,146 @@
+import os
+import json
+import logging
+from typing import Optional, Callable, Dict, List, TYPE_CHECKING
+from designer_cmd.utils import execute_command
+from .repo_report import RepoHistory, RepoVersion
+
+if TYPE_CHECKING:
+    from .main_executable import Designer
+
+logger = logging.getLogger(__name__)
+
+
+class RepoSync:
+    """
+    Инкрементальная синхронизация хранилища конфигурации с каталогом выгрузки xml.
+
+    Используется постоянная рабочая база, привязанная к хранилищу: для каждой новой версии
+    выполняется обновление из хранилища (/ConfigurationRepositoryUpdateCfg) и инкрементальная
+    выгрузка в файлы (/DumpConfigToFiles -update). Номер последней синхронизированной версии
+    сохраняется в файле состояния, повторный запуск продолжает с нее.
+    """
+
+    def __init__(self,
+                 designer: 'Designer',
+                 dump_path: str,
+                 state_file: str,
+                 history: Optional[RepoHistory] = None,
+                 on_version: Optional[Callable[[RepoVersion, str], None]] = None):
+        """
+        :param designer: Конфигуратор рабочей базы с заполненным repo_connection
+        :param dump_path: Каталог выгрузки конфигурации
+        :param state_file: Файл состояния синхронизации
+        :param history: Кэш истории хранилища, по умолчанию хранится рядом с файлом состояния.
+        :param on_version: Функция, вызываемая после выгрузки каждой версии (версия, каталог выгрузки),
+            например git_commit(dump_path)
+        """
+        self.designer = designer
+        self.dump_path = os.path.abspath(dump_path)
+        self.state_file = os.path.abspath(state_file)
+        if history is None:
+            history = RepoHistory(designer, f'{os.path.splitext(self.state_file)[0]}_history.jsonl')
+        self.history = history
+        self.on_version = on_version
+        self._state = self._load_state()
+
+    @property
+    def last_version(self) -> int:
+        """
+        Номер последней синхронизированной версии (0 - синхронизация не выполнялась)
+        """
+        return self._state.get('version', 0)
+
+    def init_work_base(self):
+        """
+        Создает (для файловой базы) и привязывает рабочую базу к хранилищу, если это еще не сделано.
+        """
+        if self._state.get('bound'):
+            return
+
+        file_path = self.designer.connection.file_path
+        if file_path and not os.path.exists(os.path.join(file_path, '1Cv8.1CD')):
+            self.designer.create_base()
+
+        self.designer.bind_cfg_to_repo()
+        self._state['bound'] = True
+        self._save_state()
+
+    def sync(self, v_end: Optional[int] = None, limit: Optional[int] = None) -> List[int]:
+        """
+        Выгружает версии хранилища, появившиеся после последней синхронизированной.
+
+        :param v_end: Номер версии, до которой необходимо выполнить синхронизацию, по умолчанию - последняя.
+        :param limit: Максимальное количество версий, обрабатываемых за вызов.
+        :return: Список синхронизированных версий
+        """
+        self.init_work_base()
+
+        if not os.path.exists(self.dump_path):
+            os.makedirs(self.dump_path)
+
+        synced = []
+        for version in self.history.versions(v_begin=self.last_version + 1, v_end=v_end):
+            if limit is not None and len(synced) >= limit:
+                break
+
+            logger.debug(f'Синхронизирую версию {version.version} хранилища {self.designer.repo_connection}')
+
+            self.designer.update_conf_from_repo(version.version, force=True)
+            self.designer.dump_config_to_files(self.dump_path, update=True)
+
+            if self.on_version is not None:
+                self.on_version(version, self.dump_path)
+
+            self._state['version'] = version.version
+            self._save_state()
+            synced.append(version.version)
+
+        return synced
+
+    def _load_state(self) -> dict:
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_state(self):
+        tmp_file = f'{self.state_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f)
+        os.replace(tmp_file, self.state_file)
+
+
+def git_commit(repo_dir: str,
+               authors: Optional[Dict[str, str]] = None,
+               email_domain: str = 'localhost') -> Callable[[RepoVersion, str], None]:
+    """
+    Возвращает функцию для RepoSync.on_version, выполняющую коммит выгрузки в git
+    от имени автора версии хранилища.
+
+    :param repo_dir: Каталог git репозитория
+    :param authors: Соответствие пользователей хранилища авторам git ("Имя <email>")
+    :param email_domain: Домен для email авторов, отсутствующих в authors
+    :return:
+    """
+    git_dir = os.path.abspath(repo_dir)
+    authors = authors or {}
+
+    def commit(version: RepoVersion, dump_path: str):
+        user = version.user or 'unknown'
+        author = authors.get(user, f'{user} <{user}@{email_domain}>')
+        message = version.comment or f'Версия хранилища {version.version}'
+
+        _execute_git(git_dir, ['add', '-A'])
+        params = ['commit', '--allow-empty', f'--author={author}', '-m', message]
+        if version.date is not None:
+            params.append(f'--date={version.date.strftime("%Y-%m-%dT%H:%M:%S")}')
+        _execute_git(git_dir, params)
+
+    return commit
+
+
+def _execute_git(git_dir: str, params: list):
+    result = execute_command('git', ['-C', git_dir] + params)
+    if result[0] != 0:
+        raise SyntaxError(f'Не удалось выполнить команду git! подробно: {result[1]}')
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Optional, List, Union, TYPE_CHECKING
+from designer_cmd.utils import copy_file, LruCache, write_json
+
+if TYPE_CHECKING:
+    from .main_executable import Designer
+
+logger = logging.getLogger(__name__)
+
+CF_EXT = '.cf'
+INFO_EXT = '.json'
+REMOTE_SCHEMES = ('tcp://', 'http://', 'https://')
+
+
+def repository_key(repository_path: str) -> str:
+    """
+    Возвращает нормализованный путь к хранилищу: для сетевого хранилища к нижнему регистру приводятся
+    только схема и сервер, для каталога - регистр (в windows) и разделители пути.
+
+    :param repository_path: Путь к хранилищу (каталог, tcp://, http://)
+    :return:
+    """
+    if repository_path.lower().startswith(REMOTE_SCHEMES):
+        scheme, _, rest = repository_path.partition('://')
+        host, sep, path = rest.partition('/')
+        return f'{scheme.lower()}://{host.lower()}{sep}{path.rstrip("/")}'
+    return os.path.normcase(os.path.normpath(os.path.abspath(repository_path)))
+
+
+class RepoVersionCache(LruCache):
+    """
+    Кэш файлов cf, выгруженных из хранилища, по ключу (путь к хранилищу, номер версии).
+
+    Версия хранилища не изменяется, поэтому выгрузка версии выполняется один раз для всех процессов,
+    использующих каталог кэша. Файл помещается в кэш атомарно под блокировкой ключа, одновременные
+    выгрузки той же версии ожидают первую. При превышении квоты удаляются давно не использованные файлы.
+    Последняя версия (без номера или -1) не кэшируется.
+    """
+
+    def __init__(self, cache_dir: str, quota: Optional[int] = None, max_entries: Optional[int] = None):
+        """
+        :param cache_dir: Каталог кэша
+        :param quota: Максимальный размер кэша в байтах
+        :param max_entries: Максимальное количество файлов
+        """
+        super(RepoVersionCache, self).__init__(cache_dir, quota, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def cacheable(version: Union[str, int, None]) -> bool:
+        """
+        Проверяет, может ли версия быть закэширована (задан номер версии).
+
+        :param version: Номер версии хранилища
+        :return:
+        """
+        return version is not None and str(version).strip() not in ('', '-1')
+
+    @staticmethod
+    def key(repository_path: str, version: Union[str, int]) -> str:
+        """
+        Возвращает ключ файла версии.
+
+        :param repository_path: Путь к хранилищу
+        :param version: Номер версии хранилища
+        :return:
+        """
+        source = f'{repository_key(repository_path)}:{int(version)}'
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()[:32]
+
+    def path(self, repository_path: str, version: Union[str, int]) -> Optional[str]:
+        """
+        Возвращает путь к файлу версии в кэше, если версия закэширована.
+
+        :param repository_path: Путь к хранилищу
+        :param version: Номер версии хранилища
+        :return:
+        """
+        key = self.key(repository_path, version)
+        return self._cf_path(key) if self._exists(key) else None
+
+    def get(self, repository_path: str, version: Union[str, int], file_path: str) -> bool:
+        """
+        Копирует файл версии из кэша.
+
+        :param repository_path: Путь к хранилищу
+        :param version: Номер версии хранилища
+        :param file_path: Путь к файлу cf
+        :return: Версия найдена в кэше
+        """
+        key = self.key(repository_path, version)
+        with self.locked(key):
+            found = self._exists(key)
+            if found:
+                self._copy_out(key, file_path)
+        self._count(hit=found)
+        return found
+
+    def put(self, repository_path: str, version: Union[str, int], file_path: str) -> str:
+        """
+        Помещает выгруженный файл версии в кэш.
+
+        :param repository_path: Путь к хранилищу
+        :param version: Номер версии хранилища
+        :param file_path: Путь к файлу cf
+        :return: Ключ файла
+        """
+        key = self.key(repository_path, version)
+        with self.locked(key):
+            self._store(key, repository_path, version, lambda tmp_file: copy_file(file_path, tmp_file))
+        self.evict(keep=key)
+        return key
+
+    def dump(self, designer: 'Designer', file_path: str, version: Union[str, int]) -> bool:
+        """
+        Выгружает версию хранилища в файл cf: из кэша, при отсутствии - конфигуратором с помещением в кэш.
+
+        :param designer: Конфигуратор с заполненным repo_connection
+        :param file_path: Путь к файлу cf
+        :param version: Номер версии хранилища
+        :return: Версия найдена в кэше (конфигуратор не запускался)
+        """
+        if not self.cacheable(version):
+            raise ValueError(f'Не указан номер версии хранилища для кэширования: {version}')
+        repository_path = designer.repo_connection.repository_path
+        key = self.key(repository_path, version)
+
+        with self.locked(key):
+            found = self._exists(key)
+            if found:
+                logger.debug(f'Версия {version} хранилища {repository_path} взята из кэша {key}')
+            else:
+                self._store(key, repository_path, version,
+                            lambda tmp_file: designer.dump_config_to_file_from_repo(tmp_file, str(version)))
+            self._copy_out(key, file_path)
+
+        self._count(hit=found)
+        if not found:
+            self.evict(keep=key)
+        return found
+
+    def entries(self) -> List[dict]:
+        """
+        Возвращает описания файлов кэша в порядке последнего использования (давно не использованные - первыми).
+
+        :return:
+        """
+        result = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(INFO_EXT):
+                continue
+            info = self._read_info(name[:-len(INFO_EXT)])
+            if info is not None:
+                result.append(info)
+        return sorted(result, key=lambda i: i['last_used'])
+
+    def stats(self) -> dict:
+        """
+        Возвращает статистику кэша: файлы и размер в каталоге, попадания, промахи и удаления этого экземпляра.
+
+        :return:
+        """
+        entries = self.entries()
+        requests = self.hits + self.misses
+        return {
+            'entries': len(entries),
+            'size': sum(i['size'] for i in entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / requests if requests else 0.0,
+            'evictions': self.evictions,
+        }
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        removed = super(RepoVersionCache, self).evict(keep)
+        with self._stats_lock:
+            self.evictions += len(removed)
+        return removed
+
+    def _store(self, key: str, repository_path: str, version: Union[str, int], fill):
+        start = time.monotonic()
+        fd, tmp_file = tempfile.mkstemp(prefix=f'{key}.', suffix='.tmp', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            fill(tmp_file)
+            now = time.time()
+            info = {
+                'key': key,
+                'repository': repository_path,
+                'version': int(version),
+                'size': os.path.getsize(tmp_file),
+                'created': now,
+                'last_used': now,
+                'dump_time': time.monotonic() - start,
+            }
+            os.replace(tmp_file, self._cf_path(key))
+            self._write_info(info)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        logger.debug(f'Версия {version} хранилища {repository_path} помещена в кэш {key} '
+                     f'за {time.monotonic() - start:.1f} с.')
+
+    def _exists(self, key: str) -> bool:
+        # Описание записывается после файла, поэтому файл с описанием выгружен полностью
+        return os.path.exists(self._info_path(key))
+
+    def _copy_out(self, key: str, file_path: str):
+        file_path = os.path.abspath(file_path)
+        tmp_file = f'{file_path}.tmp'
+        try:
+            copy_file(self._cf_path(key), tmp_file)
+            os.replace(tmp_file, file_path)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        info = self._read_info(key)
+        if info is not None:
+            info['last_used'] = time.time()
+            self._write_info(info)
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _write_info(self, info: dict):
+        write_json(self._info_path(info['key']), info)
+
+    def _read_info(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._info_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _cf_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}{CF_EXT}')
+
+    def _info_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}{INFO_EXT}')
+
+    def _remove(self, key: str):
+        # Сначала удаляется описание: файл без описания не считается закэшированным
+        os.remove(self._info_path(key))
+        os.remove(self._cf_path(key))
@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import codecs
+import logging
+import tempfile
+from typing import Optional, Iterator, Callable
+
+logger = logging.getLogger(__name__)
+
+RESULT_FILE_PARAM = 'ResultFile'
+
+
+class ResultChannel:
+    """
+    Канал структурированных результатов запуска обработки (/Execute).
+
+    Обработка получает путь к файлу канала через /C (параметр ResultFile=<путь>) и дописывает в него
+    по одной json записи на строку, записи читаются по мере появления в файле.
+    """
+
+    def __init__(self, file_path: Optional[str] = None, read_size: int = 64 * 1024):
+        """
+        :param file_path: Путь к файлу канала, по умолчанию создается временный файл.
+        :param read_size: Размер блока чтения
+        """
+        if file_path is None:
+            handle, file_path = tempfile.mkstemp('.jsonl')
+            os.close(handle)
+        else:
+            open(file_path, 'wb').close()
+        self.file_path = os.path.abspath(file_path)
+        self.read_size = read_size
+
+    def c_string(self, c_string: Optional[str] = None) -> str:
+        """
+        Формирует строку /C с путем к файлу канала.
+
+        :param c_string: Дополнительные параметры, будут переданы перед параметром ResultFile через ';'
+        :return:
+        """
+        param = f'{RESULT_FILE_PARAM}={self.file_path}'
+        if c_string:
+            return f'{c_string};{param}'
+        return param
+
+    def read(self, running: Callable[[], bool], poll_interval: float = 0.2) -> Iterator[dict]:
+        """
+        Читает записи из канала, пока выполняется обработка, и оставшиеся записи после ее завершения.
+
+        :param running: Функция, возвращающая признак выполнения обработки
+        :param poll_interval: Интервал ожидания новых данных
+        :return: Итератор записей
+        """
+        decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        buffer = ''
+        with open(self.file_path, 'rb') as f:
+            while True:
+                is_running = running()
+                data = f.read(self.read_size)
+                if data:
+                    buffer += decoder.decode(data)
+                    *lines, buffer = buffer.split('\n')
+                    for line in lines:
+                        record = self._parse_line(line)
+                        if record is not None:
+                            yield record
+                    continue
+
+                if not is_running:
+                    break
+                time.sleep(poll_interval)
+
+        buffer += decoder.decode(b'', final=True)
+        record = self._parse_line(buffer)
+        if record is not None:
+            yield record
+
+    def close(self):
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    def __enter__(self) -> 'ResultChannel':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _parse_line(line: str) -> Optional[dict]:
+        line = line.strip().lstrip('\ufeff')
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            logger.warning(f'Не удалось разобрать запись канала результатов: {line}')
+            return None
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import shutil
+import logging
+from collections import Counter
+from typing import List, Union
+from designer_cmd.utils import file_hash, copy_tree, FileLock
+from .main_executable import Connection
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = 'snapshot.json'
+DATA_DIR = 'data'
+
+
+def _base_path(base: Union[Connection, str]) -> str:
+    if isinstance(base, Connection):
+        if base.file_path == '':
+            raise ValueError(f'Снимок возможен только для файловой базы: {base}')
+        return base.file_path
+    return os.path.abspath(base)
+
+
+class SnapshotStore:
+    """
+    Хранилище снимков файловых баз (каталог базы: 1Cv8.1CD и сопутствующие файлы).
+
+    Снимок создается один раз, восстановление выполняется копированием файлов снимка в каталог базы
+    (клонированием блоков, где файловая система это поддерживает), что заменяет загрузку dt.
+    Для каждого файла снимка хранятся размер и sha256 для проверки целостности.
+    """
+
+    def __init__(self, store_dir: str):
+        """
+        :param store_dir: Каталог хранилища снимков
+        """
+        self.store_dir = os.path.abspath(store_dir)
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    def create(self, base: Union[Connection, str], name: str, overwrite: bool = False) -> dict:
+        """
+        Создает снимок файловой базы. База не должна быть открыта.
+
+        :param base: Соединение с файловой базой или путь к каталогу базы
+        :param name: Имя снимка
+        :param overwrite: Заменить существующий снимок
+        :return: Описание снимка
+        """
+        base_path = _base_path(base)
+        if not os.path.isdir(base_path):
+            raise FileNotFoundError(f'Не найден каталог базы {base_path}')
+
+        with self._lock(name):
+            snapshot_dir = self._snapshot_dir(name)
+            if os.path.exists(snapshot_dir):
+                if not overwrite:
+                    raise FileExistsError(f'Снимок {name} уже существует')
+
+            tmp_dir = f'{snapshot_dir}.tmp'
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir)
+
+            start = time.monotonic()
+            data_dir = os.path.join(tmp_dir, DATA_DIR)
+            methods = copy_tree(base_path, data_dir)
+            files = {
+                rel_path.replace(os.sep, '/'): {
+                    'size': os.path.getsize(os.path.join(data_dir, rel_path)),
+                    'sha256': file_hash(os.path.join(data_dir, rel_path)),
+                }
+                for rel_path in methods
+            }
+            info = {'name': name, 'source': base_path, 'created': time.time(), 'files': files}
+            with open(os.path.join(tmp_dir, SNAPSHOT_FILE), 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False, indent=2)
+
+            if os.path.exists(snapshot_dir):
+                shutil.rmtree(snapshot_dir)
+            os.replace(tmp_dir, snapshot_dir)
+
+        logger.debug(f'Создан снимок {name} базы {base_path} за {time.monotonic() - start:.1f} с. '
+                     f'({dict(Counter(methods.values()))})')
+        return info
+
+    def restore(self, name: str, base: Union[Connection, str], verify: bool = False) -> Connection:
+        """
+        Восстанавливает базу из снимка. Файлы базы, которых нет в снимке, удаляются.
+
+        :param name: Имя снимка
+        :param base: Соединение с файловой базой или путь к каталогу базы
+        :param verify: Проверить хэши восстановленных файлов
+        :return: Соединение с восстановленной базой
+        """
+        base_path = _base_path(base)
+        info = self.info(name)
+        data_dir = os.path.join(self._snapshot_dir(name), DATA_DIR)
+
+        start = time.monotonic()
+        with self._lock(name):
+            if os.path.exists(base_path):
+                shutil.rmtree(base_path)
+            methods = copy_tree(data_dir, base_path)
+
+        for rel_path, file_info in info['files'].items():
+            restored = os.path.join(base_path, rel_path)
+            if not os.path.exists(restored) or os.path.getsize(restored) != file_info['size']:
+                raise SyntaxError(f'Файл {rel_path} снимка {name} восстановлен не полностью')
+            if verify and file_hash(restored) != file_info['sha256']:
+                raise SyntaxError(f'Хэш файла {rel_path} снимка {name} не совпадает')
+
+        logger.debug(f'База {base_path} восстановлена из снимка {name} за {time.monotonic() - start:.1f} с. '
+                     f'({dict(Counter(methods.values()))})')
+
+        if isinstance(base, Connection):
+            return base
+        return Connection(file_path=base_path)
+
+    def verify(self, name: str) -> List[str]:
+        """
+        Проверяет целостность файлов снимка.
+
+        :param name: Имя снимка
+        :return: Список поврежденных или отсутствующих файлов
+        """
+        info = self.info(name)
+        data_dir = os.path.join(self._snapshot_dir(name), DATA_DIR)
+        damaged = []
+        for rel_path, file_info in info['files'].items():
+            path = os.path.join(data_dir, rel_path)
+            if not os.path.exists(path) or os.path.getsize(path) != file_info['size'] \
+                    or file_hash(path) != file_info['sha256']:
+                damaged.append(rel_path)
+        return damaged
+
+    def info(self, name: str) -> dict:
+        """
+        Возвращает описание снимка.
+
+        :param name: Имя снимка
+        :return:
+        """
+        snapshot_file = os.path.join(self._snapshot_dir(name), SNAPSHOT_FILE)
+        if not os.path.exists(snapshot_file):
+            raise FileNotFoundError(f'Снимок {name} не найден')
+        with open(snapshot_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self._snapshot_dir(name), SNAPSHOT_FILE))
+
+    def names(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.store_dir)
+            if not name.endswith('.tmp') and os.path.exists(os.path.join(self.store_dir, name, SNAPSHOT_FILE))
+        )
+
+    def delete(self, name: str):
+        with self._lock(name):
+            snapshot_dir = self._snapshot_dir(name)
+            if os.path.exists(snapshot_dir):
+                shutil.rmtree(snapshot_dir)
+
+    def _snapshot_dir(self, name: str) -> str:
+        if not name or os.sep in name or (os.altsep and os.altsep in name) or name.startswith('.'):
+            raise ValueError(f'Не допустимое имя снимка {name}')
+        return os.path.join(self.store_dir, name)
+
+    def _lock(self, name: str) -> FileLock:
+        self._snapshot_dir(name)
+        return FileLock(os.path.join(self.store_dir, f'.{name}.lock'))
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from typing import Optional, Callable, List
+from designer_cmd.utils import content_hash, copy_tree, LruCache, write_json
+from .main_executable import Connection, Designer
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FILE = 'template.json'
+DATA_DIR = 'data'
+
+
+def build_base(platform_version: str, artifact_path: str, connection: Connection):
+    """
+    Создает базу из файла: dt загружается в базу, cf - загружается как конфигурация с обновлением конфигурации БД.
+
+    :param platform_version: Версия платформы
+    :param artifact_path: Путь к файлу dt или cf
+    :param connection: Соединение с создаваемой файловой базой
+    """
+    designer = Designer(platform_version, connection)
+    designer.create_base()
+    if artifact_path.lower().endswith('.dt'):
+        designer.load_db_from_file(artifact_path)
+    else:
+        designer.load_config_from_file(artifact_path)
+        designer.update_db_config()
+
+
+class TemplateCache(LruCache):
+    """
+    Кэш шаблонов файловых баз, собранных из dt/cf, по ключу (версия платформы, хэш файла).
+
+    Новая база создается копированием шаблона, шаблон собирается один раз для всех процессов,
+    использующих каталог кэша. При превышении квоты удаляются давно не использованные шаблоны.
+    """
+
+    def __init__(self, cache_dir: str, quota: Optional[int] = None, max_templates: Optional[int] = None):
+        """
+        :param cache_dir: Каталог кэша
+        :param quota: Максимальный размер кэша в байтах
+        :param max_templates: Максимальное количество шаблонов
+        """
+        super(TemplateCache, self).__init__(cache_dir, quota, max_templates)
+
+    @staticmethod
+    def key(platform_version: str, artifact_path: str) -> str:
+        """
+        Возвращает ключ шаблона.
+
+        :param platform_version: Версия платформы
+        :param artifact_path: Путь к файлу dt/cf или каталогу xml, из которого собирается база
+        :return:
+        """
+        artifact_hash = content_hash(artifact_path)
+        return hashlib.sha256(f'{platform_version}:{artifact_hash}'.encode('utf-8')).hexdigest()[:32]
+
+    def materialize(self,
+                    platform_version: str,
+                    artifact_path: str,
+                    base: Connection,
+                    build: Optional[Callable[[str, str, Connection], None]] = None) -> Connection:
+        """
+        Создает файловую базу из шаблона, при отсутствии шаблона собирает его.
+
+        :param platform_version: Версия платформы
+        :param artifact_path: Путь к файлу dt/cf
+        :param base: Соединение с создаваемой файловой базой, существующий каталог базы будет заменен.
+        :param build: Функция сборки базы (версия платформы, путь к файлу, соединение), по умолчанию - build_base.
+        :return: Соединение с базой
+        """
+        if base.file_path == '':
+            raise ValueError(f'Шаблон может быть развернут только в файловую базу: {base}')
+        artifact_path = os.path.abspath(artifact_path)
+        key = self.key(platform_version, artifact_path)
+
+        with self.locked(key):
+            template_dir = os.path.join(self.cache_dir, key)
+            if os.path.exists(os.path.join(template_dir, TEMPLATE_FILE)):
+                logger.debug(f'Использую шаблон {key} для базы {base.file_path}')
+            else:
+                self._build(key, platform_version, artifact_path, build or build_base)
+
+            if os.path.exists(base.file_path):
+                shutil.rmtree(base.file_path)
+            copy_tree(os.path.join(template_dir, DATA_DIR), base.file_path)
+            self._touch(key)
+
+        self.evict(keep=key)
+        return base
+
+    def templates(self) -> List[dict]:
+        """
+        Возвращает описания шаблонов в порядке последнего использования (давно не использованные - первыми).
+
+        :return:
+        """
+        result = []
+        for key in os.listdir(self.cache_dir):
+            info = self._read_info(key)
+            # Временные каталоги сборки содержат описание шаблона до переименования
+            if info is not None and info.get('key') == key:
+                result.append(info)
+        return sorted(result, key=lambda i: i['last_used'])
+
+    def entries(self) -> List[dict]:
+        return self.templates()
+
+    def _build(self, key: str, platform_version: str, artifact_path: str,
+               build: Callable[[str, str, Connection], None]):
+        logger.debug(f'Собираю шаблон {key} из {artifact_path} (версия платформы {platform_version})')
+        start = time.monotonic()
+        template_dir = os.path.join(self.cache_dir, key)
+        tmp_dir = tempfile.mkdtemp(prefix=f'{key}.', suffix='.tmp', dir=self.cache_dir)
+        try:
+            data_dir = os.path.join(tmp_dir, DATA_DIR)
+            build(platform_version, artifact_path, Connection(file_path=data_dir))
+
+            size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(data_dir) for f in files)
+            now = time.time()
+            info = {
+                'key': key,
+                'platform_version': platform_version,
+                'artifact': artifact_path,
+                'size': size,
+                'created': now,
+                'last_used': now,
+                'build_time': time.monotonic() - start,
+            }
+            write_json(os.path.join(tmp_dir, TEMPLATE_FILE), info)
+
+            if os.path.exists(template_dir):
+                shutil.rmtree(template_dir)
+            os.replace(tmp_dir, template_dir)
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir)
+
+    def _touch(self, key: str):
+        info = self._read_info(key)
+        info['last_used'] = time.time()
+        write_json(os.path.join(self.cache_dir, key, TEMPLATE_FILE), info)
+
+    def _read_info(self, key: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.cache_dir, key, TEMPLATE_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, NotADirectoryError, ValueError):
+            return None
+
+    def _exists(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.cache_dir, key, TEMPLATE_FILE))
+
+    def _remove(self, key: str):
+        shutil.rmtree(os.path.join(self.cache_dir, key))
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import shutil
+import logging
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Callable
+from designer_cmd.utils import copy_tree
+from .main_executable import Connection, Enterprise
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEST_DURATION = 60.0
+
+
+@dataclasses.dataclass
+class EpfRunResult:
+    """
+    Результат запуска тестовой обработки
+    """
+    test_file: str
+    shard: int
+    success: bool
+    duration: float
+    error: str = ''
+
+
+def split_to_shards(test_files: List[str], durations: Dict[str, float], shards_count: int) -> List[List[str]]:
+    """
+    Распределяет тестовые файлы по группам с выравниванием суммарной длительности
+    (самые долгие тесты распределяются первыми в наименее загруженную группу).
+
+    :param test_files: Список тестовых файлов
+    :param durations: Длительность тестов по прошлым запускам, для новых тестов используется средняя длительность.
+    :param shards_count: Количество групп
+    :return: Список групп тестов
+    """
+    known = [durations[f] for f in test_files if f in durations]
+    default_duration = sum(known) / len(known) if known else DEFAULT_TEST_DURATION
+
+    shards: List[List[str]] = [[] for _ in range(shards_count)]
+    loads = [0.0] * shards_count
+    for test_file in sorted(test_files, key=lambda f: durations.get(f, default_duration), reverse=True):
+        shard = loads.index(min(loads))
+        shards[shard].append(test_file)
+        loads[shard] += durations.get(test_file, default_duration)
+    return shards
+
+
+def copy_file_infobase(template_path: str, copies_dir: str, count: int) -> List[Connection]:
+    """
+    Создает копии файловой базы для параллельного запуска тестов.
+
+    :param template_path: Каталог исходной файловой базы
+    :param copies_dir: Каталог, в котором будут созданы копии
+    :param count: Количество копий
+    :return: Соединения с копиями баз
+    """
+    connections = []
+    for i in range(count):
+        copy_path = os.path.join(copies_dir, f'shard_{i}')
+        if os.path.exists(copy_path):
+            shutil.rmtree(copy_path)
+        copy_tree(template_path, copy_path)
+        connections.append(Connection(file_path=copy_path))
+    return connections
+
+
+class ShardedEpfRunner:
+    """
+    Параллельный запуск тестовых обработок (/Execute) на нескольких базах.
+
+    Тесты распределяются по группам по длительности прошлых запусков (history_file),
+    каждая группа последовательно выполняется в своей базе, группы выполняются параллельно.
+    """
+
+    def __init__(self,
+                 platform_version: str,
+                 connections: List[Connection],
+                 history_file: Optional[str] = None,
+                 c_string: Optional[Callable[[str], Optional[str]]] = None):
+        """
+        :param platform_version: Версия платформы
+        :param connections: Соединения с базами (копиями файловой базы или серверными базами), по одной на группу.
+        :param history_file: Файл с длительностями прошлых успешных запусков
+        :param c_string: Функция, возвращающая строку /C для тестового файла
+        """
+        if not connections:
+            raise ValueError('Не переданы соединения с базами для запуска тестов')
+        self.platform_version = platform_version
+        self.connections = connections
+        self.history_file = os.path.abspath(history_file) if history_file else None
+        self.c_string = c_string
+
+    def run(self, test_files: List[str]) -> List[EpfRunResult]:
+        """
+        Выполняет тестовые обработки.
+
+        :param test_files: Список путей к тестовым обработкам
+        :return: Результаты в порядке переданных файлов
+        """
+        test_files = [os.path.abspath(f) for f in test_files]
+        durations = self.load_history()
+        shards = split_to_shards(test_files, durations, len(self.connections))
+
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [executor.submit(self._run_shard, i, shard) for i, shard in enumerate(shards) if shard]
+            results = {}
+            for future in futures:
+                for result in future.result():
+                    results[result.test_file] = result
+
+        merged = [results[f] for f in test_files]
+        # Длительность упавших тестов не отражает время выполнения, для них сохраняется прошлое значение
+        durations.update({r.test_file: r.duration for r in merged if r.success})
+        self.save_history(durations)
+        return merged
+
+    def load_history(self) -> Dict[str, float]:
+        if self.history_file is None or not os.path.exists(self.history_file):
+            return {}
+        with open(self.history_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_history(self, durations: Dict[str, float]):
+        if self.history_file is None:
+            return
+        tmp_file = f'{self.history_file}.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(durations, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.history_file)
+
+    def _run_shard(self, shard: int, test_files: List[str]) -> List[EpfRunResult]:
+        enterprise = Enterprise(self.platform_version, self.connections[shard])
+        logger.debug(f'Запускаю группу тестов {shard} ({len(test_files)} шт.) в базе {enterprise.connection}')
+
+        results = []
+        for test_file in test_files:
+            c_string = self.c_string(test_file) if self.c_string else None
+            start = time.monotonic()
+            try:
+                enterprise.run_app(ep_x_path=test_file, c_string=c_string)
+                results.append(EpfRunResult(test_file, shard, True, time.monotonic() - start))
+            except Exception as e:
+                # Ошибка одного теста (в том числе лимит времени или зависание) не прерывает остальные тесты группы
+                error = str(e) if type(e) is SyntaxError else f'{type(e).__name__}: {e}'
+                logger.error(f'Тест {test_file} в группе {shard} завершился ошибкой: {error}')
+                results.append(EpfRunResult(test_file, shard, False, time.monotonic() - start, error))
+        return results
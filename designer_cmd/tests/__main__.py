@@ -1,7 +1,15 @@
 import unittest
 
-from .test_api import TestDesigner, TestConnection, TestEnterprise, TestClusterMod, TestSessionMod, TestInfobaseMod
-from .test_utils import TestUtils, TestPlatform
+from .test_api import TestDesigner, TestConnection, TestEnterprise, TestClusterMod, TestSessionMod, TestInfobaseMod, \
+    TestRepoReport, TestDesignerExtensions, TestCompareReport, TestClientPool, \
+    TestShardedEpfRunner, TestResultChannel, TestProcessIndex, TestRacTimeouts, \
+    TestSnapshotStore, TestTemplateCache, TestArtifactStore, TestDumpNormalizer, \
+    TestMetadataIndex, TestRepoCommit, TestRepoVersionExtractor, \
+    TestRepoVersionCache
+from .test_utils import TestUtils, TestPlatform, TestPortAllocator, TestProcessScan, TestKillProcesses, \
+    TestProcessWatchdog, TestTimeoutPolicy, TestConcurrencyGovernor, \
+    TestResourceUsage, TestFastCopy, TestCompression, TestChunking, \
+    TestMerkleIndex, TestFileLock
 
 __all__ = [
     'TestDesigner',
@@ -11,7 +19,35 @@ __all__ = [
     'TestPlatform',
     'TestSessionMod',
     'TestInfobaseMod',
-    'TestClusterMod'
+    'TestClusterMod',
+    'TestRepoReport',
+    'TestDesignerExtensions',
+    'TestCompareReport',
+    'TestPortAllocator',
+    'TestClientPool',
+    'TestShardedEpfRunner',
+    'TestResultChannel',
+    'TestProcessScan',
+    'TestProcessIndex',
+    'TestKillProcesses',
+    'TestProcessWatchdog',
+    'TestTimeoutPolicy',
+    'TestRacTimeouts',
+    'TestConcurrencyGovernor',
+    'TestResourceUsage',
+    'TestSnapshotStore',
+    'TestFastCopy',
+    'TestTemplateCache',
+    'TestCompression',
+    'TestArtifactStore',
+    'TestChunking',
+    'TestMerkleIndex',
+    'TestDumpNormalizer',
+    'TestMetadataIndex',
+    'TestRepoCommit',
+    'TestRepoVersionExtractor',
+    'TestRepoVersionCache',
+    'TestFileLock',
 ]
 
 if __name__ == '__main__':
@@ -1,13 +1,35 @@
 from designer_cmd.api import RepositoryConnection, Connection, Enterprise, Designer, Rac, RacConnection
 from designer_cmd.api.rac_executable import SessionMod, InfobaseMod, ClusterMod, SqlServerConnection, SqlServerType
+from designer_cmd.api.repo_report import iter_repo_report, report_encoding, RepoHistory
+from designer_cmd.api.repo_sync import RepoSync
+from designer_cmd.api.compare_report import CompareIndex, CompareCache, ChangeType
+from designer_cmd.api import client_pool
+from designer_cmd.api.test_runner import ShardedEpfRunner, split_to_shards
+from designer_cmd.api.process_index import ProcessIndex, parse_1c_cmdline, ConnectionKey, operation_name
+from designer_cmd.api import rac_executable
+from designer_cmd.api.snapshot import SnapshotStore
+from designer_cmd.api.template_cache import TemplateCache
+from designer_cmd.api.artifact_store import ArtifactStore
+from designer_cmd.api.dump_normalizer import DumpNormalizer
+from designer_cmd.api.repo_commit import changed_objects, write_objects_list
+from designer_cmd.api.metadata_index import MetadataIndex, owner_from_path, type_target
+from designer_cmd.api.repo_extract import RepoVersionExtractor
+from designer_cmd.api.repo_version_cache import RepoVersionCache, repository_key
+from designer_cmd.utils import Process, CommandResult, ResourceUsage, DurationHistory, TimeoutPolicy, \
+    windows_platform, StalledProcessError
 from typing import List, Dict
 import unittest
+from unittest import mock
 import os.path as path
 import os
 from designer_cmd.utils.utils import clear_folder
-from json import dump
+from json import dump, dumps
+import xml.etree.ElementTree as ElementTree
 import socket
+import shutil
 import time
+import threading
+import subprocess
 
 
 class TestConnection(unittest.TestCase):
@@ -56,6 +78,19 @@ class TestConnection(unittest.TestCase):
             'Не верно определена строка подключени для файловой базы'
         )
 
+    def test_stalled_error_credentials(self):
+        designer = Designer('', Connection(user='admin', password='base_secret', file_path='path'),
+                            RepositoryConnection('repo', 'repo_user', 'repo_secret'))
+        stalled = StalledProcessError(1, 10, '/ConfigurationRepositoryN repo_user '
+                                             '/ConfigurationRepositoryP repo_secret /N admin /P base_secret')
+        with mock.patch('designer_cmd.api.main_executable.execute_command', side_effect=stalled):
+            with self.assertLogs('designer_cmd.api.main_executable', 'ERROR') as logs:
+                with self.assertRaises(StalledProcessError) as cm:
+                    designer.execute_command('DESIGNER', [])
+        for text in (str(cm.exception), '\n'.join(logs.output)):
+            for secret in ('repo_secret', 'base_secret'):
+                self.assertNotIn(secret, text, 'Пароль не скрыт в сообщении о зависании')
+
 
 class DataPrepearer(unittest.TestCase):
 
@@ -648,3 +683,1203 @@ class TestSessionMod(unittest.TestCase):
                           f'--session={self.session_id}', f'--error-message={msg}'},
                          set(self.mock.params), 'Сформированная команда на соответствует ожидаемой.')
         self.assertEqual('session', self.mock.mode, 'Режим не соответствует ожидаемому')
+
+
+class RepoReportDesignerMock:
+
+    def __init__(self, report_path: str):
+        self.report_path = report_path
+        self.repo_connection = RepositoryConnection('repo')
+        self.calls = []
+
+    def get_repo_report(self, report_file: str, v_begin=None, v_end=None, *args, **kwargs):
+        self.calls.append((v_begin, v_end))
+        shutil.copy(self.report_path, report_file)
+
+
+class RepoSyncDesignerMock(RepoReportDesignerMock):
+
+    def __init__(self, report_path: str):
+        super(RepoSyncDesignerMock, self).__init__(report_path)
+        self.connection = Connection(ib_name='work')
+        self.commands = []
+
+    def bind_cfg_to_repo(self):
+        self.commands.append('bind')
+
+    def update_conf_from_repo(self, version=None, force=False):
+        self.commands.append(f'update {version}')
+
+    def dump_config_to_files(self, catalog_path, update=True):
+        self.commands.append('dump')
+
+
+class TestRepoReport(unittest.TestCase):
+
+    def setUp(self) -> None:
+        test_data_dir = path.join(path.dirname(__file__), 'test_data')
+        self.temp_path = path.join(test_data_dir, 'temp')
+        self.report_path = path.join(test_data_dir, 'repo_report.txt')
+        clear_folder(self.temp_path)
+
+    def tearDown(self) -> None:
+        clear_folder(self.temp_path)
+
+    def test_iter_repo_report(self):
+        versions = list(iter_repo_report(self.report_path))
+
+        self.assertEqual([1, 2, 3], [v.version for v in versions], 'Не верно разобраны номера версий')
+        version = versions[1]
+        self.assertEqual('user', version.user, 'Не верно разобран пользователь')
+        self.assertEqual('Добавлен справочник\nвторая строка: комментария', version.comment,
+                         'Не верно разобран многострочный комментарий')
+        self.assertEqual((2021, 2, 2, 11, 0, 5), version.date.timetuple()[:6], 'Не верно разобрана дата версии')
+        self.assertEqual(['Справочник.Справочник2', 'ОбщийМодуль.ОбщийМодуль1'], version.added,
+                         'Не верно разобраны добавленные объекты')
+        self.assertEqual(['Конфигурация', 'Справочник.Справочник1'], version.changed,
+                         'Не верно разобраны измененные объекты')
+        self.assertEqual({'Версия конфигурации': '1.0.0.2'}, version.properties,
+                         'Не верно разобраны дополнительные свойства версии')
+        self.assertEqual(['Документ.Документ1'], versions[2].deleted, 'Не верно разобраны удаленные объекты')
+
+    def test_iter_repo_report_range(self):
+        versions = list(iter_repo_report(self.report_path, v_begin=2, v_end=2))
+        self.assertEqual([2], [v.version for v in versions], 'Не верно отобран диапазон версий')
+
+    def test_repo_history_cache(self):
+        designer = RepoReportDesignerMock(self.report_path)
+        history = RepoHistory(designer, path.join(self.temp_path, 'history.jsonl'))
+
+        versions = list(history.versions(v_begin=2))
+        self.assertEqual([2, 3], [v.version for v in versions], 'Не верно получен диапазон версий')
+        self.assertEqual([(1, None)], designer.calls, 'Не верно сформирован запрос отчета')
+
+        history = RepoHistory(designer, path.join(self.temp_path, 'history.jsonl'))
+        self.assertEqual(3, history.last_version, 'Кэш истории не сохранен')
+        versions = list(history.versions(v_end=3))
+        self.assertEqual([1, 2, 3], [v.version for v in versions], 'Версии не получены из кэша')
+        self.assertEqual(1, len(designer.calls), 'Повторно запрошены версии из кэша')
+        self.assertEqual(versions[1].added, ['Справочник.Справочник2', 'ОбщийМодуль.ОбщийМодуль1'],
+                         'Данные версии не восстановлены из кэша')
+
+    def test_report_encoding(self):
+        report_path = path.join(self.temp_path, 'report.txt')
+        with open(report_path, 'wb') as f:
+            f.write(b' ' * 100 * 1024 + 'Версия: 1'.encode('cp1251'))
+        self.assertEqual('cp1251', report_encoding(report_path), 'Не определена кодировка по концу файла')
+
+        with open(report_path, 'wb') as f:
+            f.write(b' ' * 100 * 1024 + 'Версия: 1'.encode('utf-8'))
+        self.assertEqual('utf-8-sig', report_encoding(report_path), 'Не определена кодировка utf-8')
+
+    def test_repo_history_partial_line(self):
+        designer = RepoReportDesignerMock(self.report_path)
+        cache_file = path.join(self.temp_path, 'history.jsonl')
+        first = next(iter_repo_report(self.report_path))
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            f.write(dumps(first.to_dict(), ensure_ascii=False))
+            f.write('\n{"version": 2, "us')
+
+        history = RepoHistory(designer, cache_file)
+        self.assertEqual(1, history.last_version, 'Не пропущена не дописанная строка кэша')
+        versions = list(history.versions())
+        self.assertEqual([1, 2, 3], [v.version for v in versions], 'Кэш истории не восстановлен')
+        self.assertEqual([(2, None)], designer.calls, 'Не верно сформирован запрос отчета')
+
+    def test_repo_sync(self):
+        designer = RepoSyncDesignerMock(self.report_path)
+        state_file = path.join(self.temp_path, 'sync.json')
+        dump_path = path.join(self.temp_path, 'src')
+        synced_versions = []
+
+        sync = RepoSync(designer, dump_path, state_file, on_version=lambda v, p: synced_versions.append(v.version))
+        self.assertEqual([1, 2], sync.sync(limit=2), 'Не верно синхронизированы версии')
+        self.assertEqual(['bind', 'update 1', 'dump', 'update 2', 'dump'], designer.commands,
+                         'Не верная последовательность команд синхронизации')
+
+        designer.commands = []
+        sync = RepoSync(designer, dump_path, state_file, on_version=lambda v, p: synced_versions.append(v.version))
+        self.assertEqual(2, sync.last_version, 'Состояние синхронизации не сохранено')
+        self.assertEqual([3], sync.sync(), 'Синхронизация не продолжена с последней версии')
+        self.assertEqual(['update 3', 'dump'], designer.commands, 'Не верная последовательность команд синхронизации')
+        self.assertEqual([1, 2, 3], synced_versions, 'Не вызван обработчик версии')
+
+
+class TestDesignerExtensions(unittest.TestCase):
+
+    def setUp(self) -> None:
+        test_data_dir = path.join(path.dirname(__file__), 'test_data')
+        self.temp_path = path.join(test_data_dir, 'temp')
+        clear_folder(self.temp_path)
+
+        self.ext_dir = path.join(self.temp_path, 'cfe')
+        self.extensions = {}
+        for name in ('ext1', 'ext2'):
+            ext_path = path.join(self.ext_dir, name)
+            os.makedirs(ext_path)
+            with open(path.join(ext_path, 'Configuration.xml'), 'w', encoding='utf-8') as f:
+                f.write(name)
+            self.extensions[name] = ext_path
+
+        self.designer = Designer('', Connection(file_path=path.join(self.temp_path, 'base')))
+        self.commands = []
+        patcher = mock.patch.object(self.designer, 'execute_command',
+                                    side_effect=lambda mode, params, *args, **kwargs: self.commands.append(params))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        clear_folder(self.temp_path)
+
+    def test_load_extensions_single_launch(self):
+        loaded = self.designer.load_extensions(self.extensions)
+
+        self.assertEqual({'ext1', 'ext2'}, set(loaded), 'Загружены не все расширения')
+        self.assertEqual([
+            ['/LoadConfigFromFiles', path.abspath(self.ext_dir), '-AllExtensions'],
+            ['/CheckCanApplyConfigurationExtensions']
+        ], self.commands, 'Расширения загружены не одним запуском')
+
+    def test_load_extensions_skip_unchanged(self):
+        self.designer.load_extensions(self.extensions)
+        self.commands = []
+
+        self.assertEqual([], self.designer.load_extensions(self.extensions), 'Загружены не изменившиеся расширения')
+        self.assertEqual([], self.commands, 'Выполнены команды для не изменившихся расширений')
+
+        with open(path.join(self.extensions['ext2'], 'Configuration.xml'), 'w', encoding='utf-8') as f:
+            f.write('changed')
+
+        self.assertEqual(['ext2'], self.designer.load_extensions(self.extensions), 'Не загружено измененное расширение')
+        self.assertEqual([
+            ['/LoadConfigFromFiles', self.extensions['ext2'], '-Extension', 'ext2'],
+            ['/CheckCanApplyConfigurationExtensions']
+        ], self.commands, 'Не верно загружено измененное расширение')
+
+    def test_load_extensions_check_failed(self):
+        extensions = {'ext1': self.extensions['ext1']}
+        with mock.patch.object(self.designer, 'check_apply_extension', side_effect=SyntaxError('check')):
+            with self.assertRaises(SyntaxError):
+                self.designer.load_extensions(extensions)
+        self.commands = []
+
+        self.assertEqual(['ext1'], self.designer.load_extensions(extensions),
+                         'Расширение, не прошедшее проверку, не загружено повторно')
+        self.assertEqual([
+            ['/LoadConfigFromFiles', self.extensions['ext1'], '-Extension', 'ext1'],
+            ['/CheckCanApplyConfigurationExtensions']
+        ], self.commands, 'Не верно повторно загружено расширение')
+
+    def test_load_extension_skip_unchanged(self):
+        cfe_path = path.join(self.temp_path, 'ext.cfe')
+        with open(cfe_path, 'wb') as f:
+            f.write(b'cfe')
+
+        self.assertTrue(self.designer.load_extension_from_file(cfe_path, 'ext'), 'Расширение не загружено')
+        self.assertFalse(self.designer.load_extension_from_file(cfe_path, 'ext'),
+                         'Загружено не изменившееся расширение')
+
+        designer = Designer('', Connection(file_path=path.join(self.temp_path, 'base')))
+        with mock.patch.object(designer, 'execute_command') as execute_command:
+            self.assertFalse(designer.load_extension_from_file(cfe_path, 'ext'), 'Манифест расширений не сохранен')
+            self.assertTrue(designer.load_extension_from_file(cfe_path, 'ext', force=True),
+                            'Не выполнена принудительная загрузка')
+            designer.delete_extension('ext')
+            self.assertTrue(designer.load_extension_from_file(cfe_path, 'ext'),
+                            'Не загружено расширение после удаления')
+            self.assertEqual(3, execute_command.call_count, 'Не верное количество запусков')
+
+
+class TestCompareReport(unittest.TestCase):
+
+    def setUp(self) -> None:
+        test_data_dir = path.join(path.dirname(__file__), 'test_data')
+        self.temp_path = path.join(test_data_dir, 'temp')
+        self.report_path = path.join(test_data_dir, 'compare_report.txt')
+        clear_folder(self.temp_path)
+
+    def tearDown(self) -> None:
+        clear_folder(self.temp_path)
+
+    def test_compare_index(self):
+        index = CompareIndex.from_report(self.report_path)
+
+        self.assertEqual('По именам', index.header.get('Режим сравнения'), 'Не верно разобрана шапка отчета')
+        catalog = index.get('Справочник.Справочник1')
+        self.assertEqual(ChangeType.CHANGED, catalog.change, 'Не верно определен вид изменения')
+        self.assertEqual(['Синоним', 'Модуль объекта'], catalog.properties, 'Не верно определены свойства')
+        self.assertEqual(['Версия'], index.get('Конфигурация.Конфигурация').properties,
+                         'Значения свойств разобраны как свойства')
+
+        self.assertEqual(
+            ['Справочник.Справочник1.Реквизиты.Реквизит2', 'ОбщийМодуль.ОбщийМодуль1'],
+            [e.path for e in index.added()],
+            'Не верно определены добавленные объекты'
+        )
+        self.assertEqual(
+            ['Справочник.Справочник1.Реквизиты.Реквизит3', 'Документ.Документ1'],
+            [e.path for e in index.deleted()],
+            'Не верно определены удаленные объекты'
+        )
+        self.assertEqual(4, len(index.under('Справочник.Справочник1')), 'Не верно определены вложенные объекты')
+        self.assertEqual(['Справочник.Справочник1'], [e.path for e in index.of_type('Справочник')],
+                         'Не верно определены объекты по виду')
+
+    def test_compare_cache(self):
+        designer = Designer('', Connection(file_path=path.join(self.temp_path, 'base')))
+        cf_path = path.join(self.temp_path, '1Cv8.cf')
+        with open(cf_path, 'wb') as f:
+            f.write(b'cf')
+        cache = CompareCache(path.join(self.temp_path, 'compare_cache'))
+
+        def compare(cf_file_path, report_path):
+            shutil.copyfile(self.report_path, report_path)
+
+        with mock.patch.object(designer, 'compare_config_with_file', side_effect=compare) as compare_mock:
+            index = designer.compare_config_with_file_index(cf_path, cache, config_hash='config')
+            self.assertEqual(1, compare_mock.call_count, 'Сравнение не выполнено')
+
+            cached_index = designer.compare_config_with_file_index(cf_path, cache, config_hash='config')
+            self.assertEqual(1, compare_mock.call_count, 'Сравнение выполнено повторно')
+            self.assertEqual([e.path for e in index], [e.path for e in cached_index],
+                             'Отчет из кэша не соответствует отчету сравнения')
+
+            with self.assertRaises(ValueError):
+                designer.compare_config_with_file_index(cf_path, cache)
+            self.assertEqual(1, compare_mock.call_count, 'Сравнение выполнено без хэша конфигурации')
+
+    def test_compare_cache_evict(self):
+        cache = CompareCache(path.join(self.temp_path, 'compare_cache'), max_entries=2)
+        for i, config_hash in enumerate(('config1', 'config2', 'config3')):
+            cache.put(config_hash, 'cf', self.report_path)
+            os.utime(cache.report_path(config_hash, 'cf'), (i, i))
+            if config_hash == 'config2':
+                self.assertIsNotNone(cache.get('config1', 'cf'), 'Отчет не найден в кэше')
+
+        self.assertIsNotNone(cache.get('config1', 'cf'), 'Удален недавно использованный отчет')
+        self.assertIsNone(cache.get('config2', 'cf'), 'Не удален давно не использованный отчет')
+        self.assertEqual(2, len(cache.entries()), 'Не соблюдено количество отчетов')
+        self.assertFalse(path.exists(path.join(cache.cache_dir, '.config2_cf.lock')),
+                         'Не удален файл блокировки удаленного отчета')
+
+
+class ClientPoolEnterpriseMock:
+
+    def __init__(self):
+        self.connection = Connection(ib_name='test')
+        self.port_allocator = object()
+        self.started = []
+
+    def start_test_client(self):
+        pid = 1000 + len(self.started)
+        self.started.append(pid)
+        return 1538 + len(self.started), pid
+
+
+class TestClientPool(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.enterprise = ClientPoolEnterpriseMock()
+        self.killed = []
+        for name, func in (('pid_exists', lambda pid: pid not in self.killed),
+                           ('port_in_use', lambda port: True),
+                           ('kill_processes', self.kill)):
+            patcher = mock.patch.object(client_pool, name, side_effect=func)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def kill(self, pids: List[int], timeout: float) -> List[int]:
+        self.killed.extend(pids)
+        return []
+
+    def test_lease_and_recycle(self):
+        pool = client_pool.TestClientPool(self.enterprise, size=2, max_uses=2, poll_interval=0.01)
+        pool.start()
+        self.assertEqual([1000, 1001], sorted(self.enterprise.started), 'Клиенты пула не запущены')
+
+        for _ in range(4):
+            with pool.lease(timeout=5) as client:
+                self.assertTrue(client.ready(), 'Выдан не готовый клиент')
+
+        with self.assertRaises(ValueError):
+            with pool.lease(timeout=5):
+                raise ValueError('Ошибка теста')
+
+        pool.shutdown()
+        self.assertEqual(5, len(self.enterprise.started), 'Клиенты не перезапущены после использования')
+        self.assertEqual(sorted(self.enterprise.started), sorted(self.killed), 'Не все клиенты пула остановлены')
+
+    def test_recycle_dead_client(self):
+        pool = client_pool.TestClientPool(self.enterprise, size=1, poll_interval=0.01)
+        pool.start()
+        self.killed.append(1000)
+
+        with pool.lease(timeout=5) as client:
+            self.assertEqual(1001, client.pid, 'Выдан завершившийся клиент')
+        pool.shutdown()
+
+    def test_start_failure(self):
+        pool = client_pool.TestClientPool(self.enterprise, size=1, max_uses=1, poll_interval=0.01, start_attempts=2)
+        pool.start()
+        with pool.lease(timeout=5):
+            pass
+
+        attempts = []
+
+        def start_test_client():
+            attempts.append(1)
+            raise SyntaxError('Не удалось запустить клиент')
+
+        self.enterprise.start_test_client = start_test_client
+        with self.assertRaises(RuntimeError):
+            with pool.lease():
+                pass
+        self.assertEqual(2, len(attempts), 'Запуск клиента не повторен')
+        with self.assertRaises(RuntimeError):
+            with pool.lease():
+                pass
+        pool.shutdown()
+        self.assertIsNone(pool._spawn(), 'Клиент запускается после остановки пула')
+
+
+    def test_start_failure_stops_pool(self):
+        start_client = self.enterprise.start_test_client
+        lock = threading.Lock()
+
+        def start_test_client():
+            with lock:
+                if self.enterprise.started:
+                    raise SyntaxError('Не удалось запустить клиент')
+                return start_client()
+
+        self.enterprise.start_test_client = start_test_client
+        pool = client_pool.TestClientPool(self.enterprise, size=2, poll_interval=0.01, start_attempts=1)
+        with self.assertRaises(SyntaxError):
+            pool.start()
+        self.assertEqual([1000], self.killed, 'Запущенный клиент не остановлен')
+        with self.assertRaises(RuntimeError):
+            pool.lease().__enter__()
+
+class TestShardedEpfRunner(unittest.TestCase):
+
+    def setUp(self) -> None:
+        test_data_dir = path.join(path.dirname(__file__), 'test_data')
+        self.temp_path = path.join(test_data_dir, 'temp')
+        clear_folder(self.temp_path)
+
+    def tearDown(self) -> None:
+        clear_folder(self.temp_path)
+
+    def test_split_to_shards(self):
+        durations = {'a': 10, 'b': 6, 'c': 5, 'd': 4}
+        shards = split_to_shards(['a', 'b', 'c', 'd', 'e'], durations, 2)
+        self.assertEqual([['a', 'c'], ['e', 'b', 'd']], shards, 'Тесты не сбалансированы по длительности')
+
+    def test_run(self):
+        test_files = [path.abspath(f'test_{i}.epf') for i in range(5)]
+        history_file = path.join(self.temp_path, 'history.json')
+        connections = [Connection(file_path=path.join(self.temp_path, f'base_{i}')) for i in range(2)]
+        runner = ShardedEpfRunner('', connections, history_file, c_string=lambda f: f'{f}.json')
+        runner.save_history({test_files[1]: 100})
+
+        def run_app(enterprise, ep_x_path=None, c_string=None, **kwargs):
+            self.assertEqual(f'{ep_x_path}.json', c_string, 'Не передана строка /C')
+            if ep_x_path == test_files[3]:
+                raise SyntaxError('Ошибка теста')
+            if ep_x_path == test_files[1]:
+                raise TimeoutError('Лимит времени')
+
+        with mock.patch.object(Enterprise, 'run_app', autospec=True, side_effect=run_app) as run_mock:
+            results = runner.run(test_files)
+
+        self.assertEqual(5, run_mock.call_count, 'Выполнены не все тесты')
+        self.assertEqual(test_files, [r.test_file for r in results], 'Результаты не соответствуют порядку тестов')
+        self.assertEqual([True, False, True, False, True], [r.success for r in results],
+                         'Не верно определен результат тестов')
+        self.assertIn('TimeoutError', results[1].error, 'Не указан тип ошибки теста')
+        self.assertEqual({0, 1}, {r.shard for r in results}, 'Тесты не распределены по базам')
+        history = runner.load_history()
+        self.assertEqual({test_files[0], test_files[1], test_files[2], test_files[4]}, set(history),
+                         'История длительностей не сохранена')
+        self.assertEqual(100, history[test_files[1]], 'Длительность упавшего теста перезаписана')
+
+
+class TestResultChannel(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.enterprise = Enterprise('', Connection(ib_name='test'))
+
+    def test_run_app_with_results(self):
+        def run_app(ep_x_path=None, c_string=None, **kwargs):
+            params, result_file = c_string.split(';ResultFile=')
+            self.assertEqual('param', params, 'Не переданы параметры обработки')
+            with open(result_file, 'a', encoding='utf-8-sig') as f:
+                f.write('{"test": "test1", "status": "passed"}\r\n')
+                f.flush()
+                time.sleep(0.1)
+                f.write('{"test": "test2", ')
+                f.flush()
+                time.sleep(0.1)
+                f.write('"status": "failed"}\r\n')
+
+        with mock.patch.object(self.enterprise, 'run_app', side_effect=run_app):
+            records = list(self.enterprise.run_app_with_results('test.epf', 'param', poll_interval=0.01))
+
+        self.assertEqual([{'test': 'test1', 'status': 'passed'}, {'test': 'test2', 'status': 'failed'}], records,
+                         'Записи канала результатов не получены')
+
+    def test_run_app_with_results_stop(self):
+        finished = []
+
+        def run_app(ep_x_path=None, c_string=None, **kwargs):
+            result_file = c_string.split('ResultFile=')[1]
+            with open(result_file, 'a', encoding='utf-8') as f:
+                f.write('{"test": "test1"}\n')
+                f.flush()
+                time.sleep(0.2)
+                f.write('{"test": "test2"}\n')
+            finished.append(os.path.exists(result_file))
+
+        with mock.patch.object(self.enterprise, 'run_app', side_effect=run_app):
+            records = self.enterprise.run_app_with_results('test.epf', poll_interval=0.01)
+            self.assertEqual({'test': 'test1'}, next(records), 'Запись канала результатов не получена')
+            records.close()
+
+        self.assertEqual([True], finished, 'Файл канала удален до завершения обработки')
+
+    def test_run_app_with_results_error(self):
+        with mock.patch.object(self.enterprise, 'run_app', side_effect=SyntaxError('Ошибка')):
+            with self.assertRaises(SyntaxError):
+                list(self.enterprise.run_app_with_results('test.epf', poll_interval=0.01))
+
+
+class TestProcessIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.base_path = path.abspath(path.join('test_data', 'base with space'))
+        self.conn = Connection(file_path=self.base_path)
+        self.processes = [
+            Process(self.cmdline(['ENTERPRISE ', '/F', self.base_path, '/N', 'user', '/P', 'pass',
+                                  '/TestClient', '-Tport 1540',
+                                  '/DisableStartupDialogs /DisableStartupMessages']), 10),
+            Process(self.cmdline(['ENTERPRISE ', '/F', self.base_path + os.sep, '/TestManager']), 11),
+            Process(self.cmdline(['DESIGNER', '/F', self.base_path, '/DumpCfg', 'conf.cf']), 12),
+            Process(self.cmdline(['ENTERPRISE ', '/S', 'Server\\Base', '/TestClient', '-Tport 1541']), 13),
+            Process(self.cmdline(['/F', self.base_path]), 14),
+        ]
+
+    @staticmethod
+    def cmdline(params: List[str]) -> str:
+        return subprocess.list2cmdline([path.join('bin', '1cv8.exe')] + params)
+
+    def test_parse_cmdline(self):
+        command = parse_1c_cmdline(self.processes[0].cmd)
+        self.assertEqual('ENTERPRISE', command.mode, 'Не верно определен режим запуска')
+        self.assertEqual(ConnectionKey.from_connection(self.conn), command.connection, 'Не верно определена база')
+        self.assertEqual(1540, command.port, 'Не верно определен порт')
+        self.assertEqual('/testclient', command.run_mode, 'Не верно определен режим тестирования')
+        self.assertIsNone(parse_1c_cmdline(self.processes[4].cmd), 'Разобрана строка без режима запуска')
+
+    def test_find(self):
+        index = ProcessIndex(self.processes)
+        self.assertEqual(4, len(index), 'Не верное количество процессов в индексе')
+        self.assertEqual([10, 11, 12], [p.pid for p in index.find(self.conn)], 'Не верно найдены процессы базы')
+        self.assertEqual([10, 11], [p.pid for p in index.find(self.conn, mode='ENTERPRISE')],
+                         'Не верно найдены процессы предприятия')
+        self.assertEqual([11], [p.pid for p in index.find(self.conn, run_mode='/TestManager')],
+                         'Не верно найден тест менеджер')
+        server_conn = Connection(server_path='server', server_base_ref='base')
+        self.assertEqual([13], [p.pid for p in index.find(server_conn)], 'Не найден процесс серверной базы')
+        self.assertEqual([13], [p.pid for p in index.by_port(1541)], 'Не найден процесс по порту')
+
+    def test_kill_all_clients(self):
+        enterprise = Enterprise.__new__(Enterprise)
+        enterprise.connection = self.conn
+        with mock.patch('designer_cmd.api.main_executable.kill_processes', return_value=[11]) as kill:
+            killed = enterprise.kill_all_clients(timeout=1, index=ProcessIndex(self.processes))
+        kill.assert_called_once_with([10, 11], 1)
+        self.assertEqual([10], killed, 'Не верный список завершенных процессов')
+
+    def test_operation_name(self):
+        self.assertEqual('DESIGNER /UpdateDBCfg', operation_name('DESIGNER', ['/UpdateDBCfg', '-Dynamic+']))
+        self.assertEqual('DESIGNER /ConfigurationRepositoryUpdateCfg', operation_name(
+            'DESIGNER', ['/ConfigurationRepositoryF', '/repo', '/ConfigurationRepositoryUpdateCfg', '-force']))
+        self.assertEqual('ENTERPRISE /Execute test.epf', operation_name(
+            'ENTERPRISE ', ['/Execute', path.join('dir', 'test.epf'), '/C', 'param']))
+        self.assertEqual('ENTERPRISE', operation_name('ENTERPRISE ', []))
+
+
+class TestRacTimeouts(unittest.TestCase):
+
+    def setUp(self):
+        with mock.patch.object(rac_executable, 'get_rac_path', return_value='rac'):
+            self.rac = Rac('', RacConnection(server='server', timeout=10))
+
+    def test_min_operation_timeout(self):
+        with mock.patch.object(rac_executable, 'execute_command', return_value=(0, '')) as execute:
+            self.rac.execute_command('infobase', ['create', '--name=base'])
+            self.assertEqual(100, execute.call_args[0][2], 'Не учтен минимальный лимит создания базы')
+
+            self.rac.execute_command('infobase', ['summary', 'list'])
+            self.assertEqual(10, execute.call_args[0][2], 'Не использован лимит соединения')
+        self.assertEqual(10, self.rac.command_timeout, 'Изменен лимит соединения')
+
+    def test_policy_timeout(self):
+        history = DurationHistory(path.join(path.dirname(__file__), 'test_data', 'temp', 'durations.sqlite'))
+        self.addCleanup(clear_folder, path.join(path.dirname(__file__), 'test_data', 'temp'))
+        self.rac.timeout_policy = TimeoutPolicy(history, factor=1, margin=0, min_samples=1)
+        history.record('infobase create', 'server:1545', 1)
+        self.assertEqual(100, self.rac.operation_timeout('infobase create'), 'История уменьшила минимальный лимит')
+
+        timed_out = CommandResult(1, 'Выполнение процесса вышло за рамки отведенного времени.')
+        timed_out.timed_out = True
+        with mock.patch.object(rac_executable, 'execute_command', return_value=timed_out):
+            with self.assertRaises(SyntaxError):
+                self.rac.execute_command('cluster', ['list'])
+        self.assertEqual([10], history.durations('cluster list'), 'Не записана прерванная по лимиту операция')
+
+    def test_result_usage(self):
+        results = []
+        self.rac.on_result = results.append
+        command_result = CommandResult(0, '', usage=ResourceUsage(wall_time=1.5))
+        with mock.patch.object(rac_executable, 'execute_command', return_value=command_result):
+            self.rac.execute_command('cluster', ['list'])
+        self.assertIs(command_result, self.rac.last_result, 'Не сохранен результат последней команды')
+        self.assertEqual([command_result], results, 'Не вызван обработчик результата')
+        self.assertEqual('cluster list', command_result.operation, 'Не верная операция')
+        self.assertEqual('server:1545', command_result.infobase, 'Не верное соединение')
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        clear_folder(self.temp_path)
+        self.base_path = path.join(self.temp_path, 'base')
+        os.makedirs(path.join(self.base_path, 'sub'))
+        with open(path.join(self.base_path, '1Cv8.1CD'), 'wb') as f:
+            f.write(b'data' * 1000)
+            f.seek(4 * 1024 * 1024)
+            f.write(b'tail')
+        with open(path.join(self.base_path, 'sub', 'file.txt'), 'w') as f:
+            f.write('text')
+        self.store = SnapshotStore(path.join(self.temp_path, 'snapshots'))
+
+    def test_create_restore(self):
+        conn = Connection(file_path=self.base_path)
+        info = self.store.create(conn, 'clean')
+        self.assertEqual({'1Cv8.1CD', 'sub/file.txt'}, set(info['files']), 'Не верный состав снимка')
+        with self.assertRaises(FileExistsError):
+            self.store.create(conn, 'clean')
+
+        with open(path.join(self.base_path, '1Cv8.1CD'), 'r+b') as f:
+            f.write(b'changed')
+        with open(path.join(self.base_path, '1Cv8tmp.1CD'), 'w') as f:
+            f.write('temp')
+
+        restored = self.store.restore('clean', conn, verify=True)
+        self.assertIs(conn, restored, 'Не возвращено соединение с базой')
+        self.assertFalse(path.exists(path.join(self.base_path, '1Cv8tmp.1CD')), 'Не удален файл, которого нет в снимке')
+        with open(path.join(self.base_path, '1Cv8.1CD'), 'rb') as f:
+            self.assertEqual(b'data', f.read(4), 'База не восстановлена')
+        self.assertEqual(['clean'], self.store.names(), 'Не верный список снимков')
+
+    def test_verify(self):
+        self.store.create(self.base_path, 'clean')
+        self.assertEqual([], self.store.verify('clean'), 'Снимок поврежден')
+        with open(path.join(self.store.store_dir, 'clean', 'data', 'sub', 'file.txt'), 'w') as f:
+            f.write('damaged')
+        self.assertEqual(['sub/file.txt'], self.store.verify('clean'), 'Повреждение снимка не обнаружено')
+
+    def test_server_connection(self):
+        with self.assertRaises(ValueError):
+            self.store.create(Connection(server_path='server', server_base_ref='base'), 'server')
+
+    def tearDown(self):
+        clear_folder(self.temp_path)
+
+
+class TestTemplateCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        clear_folder(self.temp_path)
+        self.cache = TemplateCache(path.join(self.temp_path, 'cache'), quota=2500)
+        self.builds = []
+        self.artifacts = []
+        for i in range(3):
+            artifact = path.join(self.temp_path, f'base_{i}.dt')
+            with open(artifact, 'w') as f:
+                f.write(f'dt {i}')
+            self.artifacts.append(artifact)
+
+    def build(self, platform_version: str, artifact_path: str, connection: Connection):
+        self.builds.append((platform_version, artifact_path))
+        os.makedirs(connection.file_path)
+        with open(path.join(connection.file_path, '1Cv8.1CD'), 'wb') as f:
+            f.write(b'0' * 1000)
+
+    def test_materialize(self):
+        conn1 = Connection(file_path=path.join(self.temp_path, 'base1'))
+        conn2 = Connection(file_path=path.join(self.temp_path, 'base2'))
+        self.cache.materialize('8.3.18', self.artifacts[0], conn1, self.build)
+        self.cache.materialize('8.3.18', self.artifacts[0], conn2, self.build)
+        self.assertEqual(1, len(self.builds), 'Шаблон собран повторно')
+        self.assertTrue(path.exists(path.join(conn2.file_path, '1Cv8.1CD')), 'База не создана из шаблона')
+
+        self.cache.materialize('8.3.19', self.artifacts[0], conn1, self.build)
+        self.assertEqual(2, len(self.builds), 'Шаблон другой версии платформы не собран')
+
+    def test_evict(self):
+        conn = Connection(file_path=path.join(self.temp_path, 'base'))
+        self.cache.materialize('8.3.18', self.artifacts[0], conn, self.build)
+        self.cache.materialize('8.3.18', self.artifacts[1], conn, self.build)
+        self.cache.materialize('8.3.18', self.artifacts[0], conn, self.build)
+        self.cache.materialize('8.3.18', self.artifacts[2], conn, self.build)
+
+        keys = [t['key'] for t in self.cache.templates()]
+        self.assertEqual(2, len(keys), 'Квота кэша не соблюдена')
+        self.assertNotIn(TemplateCache.key('8.3.18', self.artifacts[1]), keys, 'Удален не самый старый шаблон')
+        self.assertLessEqual(self.cache.size(), 2500, 'Размер кэша превышает квоту')
+
+    def tearDown(self):
+        clear_folder(self.temp_path)
+
+
+class TestArtifactStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        clear_folder(self.temp_path)
+        self.store = ArtifactStore(path.join(self.temp_path, 'store'), workers=1, avg_chunk_size=16 * 1024)
+        self.data = os.urandom(512 * 1024)
+        self.v1 = path.join(self.temp_path, 'v1.cf')
+        self.v2 = path.join(self.temp_path, 'v2.cf')
+        with open(self.v1, 'wb') as f:
+            f.write(self.data)
+        with open(self.v2, 'wb') as f:
+            f.write(self.data[:100000] + b'changed' + self.data[100000:400000] + self.data[410000:])
+
+    def test_put_dedup(self):
+        info1 = self.store.put(self.v1)
+        info2 = self.store.put(self.v2)
+        self.assertEqual(info1['size'], info1['new_bytes'], 'Первый файл должен быть добавлен полностью')
+        self.assertLess(info2['new_bytes'], info2['size'] // 4, 'Общие блоки версий не переиспользованы')
+
+        stats = self.store.stats()
+        self.assertEqual(2, stats['artifacts'])
+        self.assertGreater(stats['ratio'], 1.5, 'Не верный коэффициент дедупликации')
+        with self.assertRaises(FileExistsError):
+            self.store.put(self.v1)
+
+    def test_get(self):
+        self.store.put(self.v1)
+        self.store.put(self.v2)
+        restored = self.store.get('v2.cf', path.join(self.temp_path, 'restored.cf'))
+        with open(restored, 'rb') as f1, open(self.v2, 'rb') as f2:
+            self.assertEqual(f2.read(), f1.read(), 'Файл собран неверно')
+
+        with self.store.checkout('v1.cf') as tmp_path:
+            self.assertTrue(tmp_path.endswith('.cf'), 'Не сохранено расширение файла')
+            with open(tmp_path, 'rb') as f:
+                self.assertEqual(self.data, f.read(), 'Файл собран неверно')
+        self.assertFalse(path.exists(tmp_path), 'Временный файл не удален')
+
+    def test_load(self):
+        self.store.put(self.v1)
+        loaded = []
+        designer = mock.Mock(spec=Designer)
+        designer.load_config_from_file.side_effect = lambda file_path: loaded.append(open(file_path, 'rb').read())
+        self.store.load(designer, 'v1.cf')
+        self.assertEqual([self.data], loaded, 'В конфигуратор передан неверный файл')
+
+    def test_delete(self):
+        self.store.put(self.v1)
+        self.store.put(self.v2)
+        size = self.store.stats()['stored_size']
+        self.store.delete('v2.cf')
+        self.assertEqual(['v1.cf'], self.store.names())
+        self.assertLess(self.store.stats()['stored_size'], size, 'Неиспользуемые блоки не удалены')
+        self.store.get('v1.cf', path.join(self.temp_path, 'restored.cf'))
+
+    def test_collect_during_put(self):
+        lock = self.store._lock
+
+        def collect_then_lock():
+            # Сборка мусора другим процессом после записи блоков, до записи описания
+            ArtifactStore(self.store.store_dir).collect_garbage()
+            return lock()
+
+        with mock.patch.object(self.store, '_lock', side_effect=collect_then_lock):
+            self.store.put(self.v1)
+        restored = self.store.get('v1.cf', path.join(self.temp_path, 'restored.cf'))
+        with open(restored, 'rb') as f:
+            self.assertEqual(self.data, f.read(), 'Блоки, удаленные сборкой мусора, не записаны повторно')
+
+    def tearDown(self):
+        clear_folder(self.temp_path)
+
+
+class TestDumpNormalizer(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        clear_folder(self.temp_path)
+        self.dump = path.join(self.temp_path, 'dump')
+        os.makedirs(path.join(self.dump, 'Catalogs'))
+        self.write('ConfigDumpInfo.xml', '<ConfigDumpInfo>\r\n</ConfigDumpInfo>')
+        self.write('Catalogs/Catalog.xml',
+                   '\ufeff<?xml version="1.0" encoding="UTF-8"?>\r\n'
+                   '<MetaDataObject xmlns:v8="http://v8" version="2.10">\r\n'
+                   '\t<ChildObjects>\r\n\t\t<Attribute name="B" v8:uuid="1"/>\r\n'
+                   '\t\t<Attribute name="A" v8:uuid="2"/>\r\n\t</ChildObjects>\r\n'
+                   '</MetaDataObject>')
+        self.write('Catalogs/Module.bsl', 'Процедура А()\r\nКонецПроцедуры')
+        self.normalizer = DumpNormalizer(strip_attributes=['v8:uuid'], sort_elements=['ChildObjects'], workers=1)
+
+    def write(self, rel_path: str, text: str):
+        with open(path.join(self.dump, *rel_path.split('/')), 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+
+    def read(self, rel_path: str) -> str:
+        with open(path.join(self.dump, *rel_path.split('/')), 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+
+    def test_normalize(self):
+        report = self.normalizer.normalize(self.dump)
+        self.assertEqual(2, report.files_rewritten, 'Не все файлы нормализованы')
+        self.assertEqual(3, report.files_total)
+
+        self.assertEqual('\ufeff<?xml version="1.0" encoding="UTF-8"?>\n'
+                         '<MetaDataObject xmlns:v8="http://v8" version="2.10">\n'
+                         '\t<ChildObjects>\n\t\t<Attribute name="A"/>\n'
+                         '\t\t<Attribute name="B"/>\n\t</ChildObjects>\n'
+                         '</MetaDataObject>', self.read('Catalogs/Catalog.xml'), 'Не верный результат нормализации')
+        self.assertEqual('Процедура А()\nКонецПроцедуры', self.read('Catalogs/Module.bsl'))
+        self.assertIn('\r\n', self.read('ConfigDumpInfo.xml'), 'ConfigDumpInfo.xml не должен изменяться')
+
+    def test_sort_preserves_markup(self):
+        normalizer = DumpNormalizer(sort_elements=['ChildObjects'], newline=None, workers=1)
+        text = ('<?xml version="1.0"?>\n<!-- <MetaDataObject> -->\n'
+                '<MetaDataObject xmlns:v8="http://v8"  a=\'x>y\'>\n'
+                '\t<ChildObjects>\n\t\t<Item name="B" ><ChildObjects><b/><a/></ChildObjects></Item>\n'
+                '\t\t<!-- A -->\n\t\t<Item name="A"  />\n\t</ChildObjects>\n'
+                '</MetaDataObject>\n')
+        self.assertEqual('<?xml version="1.0"?>\n<!-- <MetaDataObject> -->\n'
+                         '<MetaDataObject xmlns:v8="http://v8"  a=\'x>y\'>\n'
+                         '\t<ChildObjects>\n\t\t<Item name="A"  />\n'
+                         '\t\t<!-- A -->\n\t\t<Item name="B" ><ChildObjects><a/><b/></ChildObjects></Item>\n'
+                         '\t</ChildObjects>\n'
+                         '</MetaDataObject>\n', normalizer.normalize_text('Catalog.xml', text),
+                         'Изменена разметка, кроме порядка элементов')
+
+    def test_only_changed(self):
+        self.normalizer.normalize(self.dump)
+        report = self.normalizer.normalize(self.dump)
+        self.assertEqual(0, report.files_processed, 'Повторно обработаны неизмененные файлы')
+
+        self.write('Catalogs/Module.bsl', 'Процедура Б()\r\nКонецПроцедуры')
+        report = self.normalizer.normalize(self.dump)
+        self.assertEqual(1, report.files_processed, 'Обработаны не только измененные файлы')
+        self.assertEqual('Процедура Б()\nКонецПроцедуры', self.read('Catalogs/Module.bsl'))
+
+    def test_parse_error(self):
+        self.write('Catalogs/Bad.xml', '<MetaDataObject><ChildObjects>\r\n')
+        report = self.normalizer.normalize(self.dump)
+        self.assertEqual(['Catalogs/Bad.xml'], list(report.errors), 'Не указан файл с ошибкой')
+        self.assertEqual('Процедура А()\nКонецПроцедуры', self.read('Catalogs/Module.bsl'),
+                         'Ошибка в одном файле прервала нормализацию остальных')
+
+        self.write('Catalogs/Bad.xml', '<MetaDataObject><ChildObjects/></MetaDataObject>\r\n')
+        report = self.normalizer.normalize(self.dump)
+        self.assertEqual((1, {}), (report.files_processed, report.errors), 'Файл с ошибкой не обработан повторно')
+        self.assertNotIn('\r\n', self.read('Catalogs/Bad.xml'))
+
+    def test_interrupted(self):
+        with mock.patch('designer_cmd.api.dump_normalizer._normalize_file', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.normalizer.normalize(self.dump)
+        report = self.normalizer.normalize(self.dump)
+        self.assertEqual(2, report.files_rewritten, 'Индекс сохранен до нормализации файлов')
+
+    def test_process_pool(self):
+        for i in range(40):
+            self.write(f'Catalogs/Module{i}.bsl', f'Процедура {i}()\r\nКонецПроцедуры')
+        report = DumpNormalizer(workers=2).normalize(self.dump)
+        self.assertEqual(42, report.files_rewritten, 'Не все файлы нормализованы')
+        self.assertEqual('Процедура 7()\nКонецПроцедуры', self.read('Catalogs/Module7.bsl'))
+        self.assertGreater(report.files_per_second, 0)
+
+    def test_dump_config_to_files(self):
+        designer = Designer('', Connection(file_path=path.join(self.temp_path, 'base')))
+        with mock.patch.object(designer, 'execute_command') as execute_mock:
+            report = designer.dump_config_to_files(self.dump, normalizer=self.normalizer)
+        execute_mock.assert_called_once()
+        self.assertEqual(2, report.files_rewritten, 'Выгрузка не нормализована')
+
+    def tearDown(self):
+        clear_folder(self.temp_path)
+
+
+MD_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+            '<MetaDataObject xmlns="http://v8.1c.ru/8.3/MDClasses" xmlns:v8="http://v8.1c.ru/8.1/data/core" ' \
+            'xmlns:xr="http://v8.1c.ru/8.3/xcf/readable" ' \
+            'xmlns:cfg="http://v8.1c.ru/8.1/data/enterprise/current-config" version="2.10">\n'
+
+
+def md_attribute(name: str, type_name: str) -> str:
+    return f'<Attribute uuid="{name}"><Properties><Name>{name}</Name>' \
+           f'<Type><v8:Type>{type_name}</v8:Type></Type></Properties></Attribute>'
+
+
+class TestMetadataIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        clear_folder(self.temp_path)
+        self.dump = path.join(self.temp_path, 'dump')
+        self.write('Configuration.xml', MD_HEADER + '<Configuration uuid="c"><Properties><Name>Конф</Name>'
+                   '</Properties><ChildObjects><Catalog>Номенклатура</Catalog></ChildObjects>'
+                   '</Configuration></MetaDataObject>')
+        self.write('Catalogs/Номенклатура.xml', MD_HEADER + '<Catalog uuid="n"><Properties><Name>Номенклатура</Name>'
+                   '<Owners><xr:Item xsi:type="xr:MDObjectRef" '
+                   'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">Catalog.Организации</xr:Item></Owners>'
+                   '</Properties><ChildObjects>' + md_attribute('Артикул', 'xs:string') +
+                   '<Form>ФормаЭлемента</Form></ChildObjects></Catalog></MetaDataObject>')
+        self.write('Documents/Заказ.xml', MD_HEADER + '<Document uuid="d"><Properties><Name>Заказ</Name></Properties>'
+                   '<ChildObjects>' + md_attribute('Организация', 'cfg:CatalogRef.Организации') +
+                   '<TabularSection uuid="t"><Properties><Name>Товары</Name></Properties><ChildObjects>' +
+                   md_attribute('Номенклатура', 'cfg:CatalogRef.Номенклатура') +
+                   '</ChildObjects></TabularSection></ChildObjects></Document></MetaDataObject>')
+        self.write('CommonModules/ОбщегоНазначения.xml', MD_HEADER + '<CommonModule uuid="m"><Properties>'
+                   '<Name>ОбщегоНазначения</Name></Properties></CommonModule></MetaDataObject>')
+        self.write('Catalogs/Номенклатура/Forms/ФормаЭлемента/Ext/Form/Module.bsl',
+                   '&НаКлиенте\nПроцедура П()\n\tОбщегоНазначения.Сообщить("Модуль.Метод"); // Прочий.Вызов()\n'
+                   '\tЗначение = Объект.Реквизит;\nКонецПроцедуры')
+        self.write('Documents/Заказ/Ext/ObjectModule.bsl', 'общегоназначения.Проверить();')
+        self.index = MetadataIndex(self.dump, path.join(self.temp_path, 'metadata.sqlite'), workers=1)
+
+    def write(self, rel_path: str, text: str):
+        file_path = path.join(self.dump, *rel_path.split('/'))
+        os.makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_helpers(self):
+        self.assertEqual('Catalog.Н.Form.Ф', owner_from_path('Catalogs/Н/Forms/Ф/Ext/Form.xml'))
+        self.assertEqual('ChartOfAccounts.П', owner_from_path('ChartsOfAccounts/П.xml'))
+        self.assertEqual('BusinessProcess.Б', owner_from_path('BusinessProcesses/Б/Ext/ObjectModule.bsl'))
+        self.assertEqual('Configuration', owner_from_path('Ext/ManagedApplicationModule.bsl'))
+        self.assertEqual('InformationRegister.Цены', type_target('cfg:InformationRegisterRecordSet.Цены'))
+        self.assertEqual('Catalog.Н', type_target('Catalog.Н.Attribute.Код'))
+        self.assertIsNone(type_target('xs:string'))
+
+    def test_objects(self):
+        self.index.update()
+        self.assertEqual(['Catalog.Номенклатура', 'CommonModule.ОбщегоНазначения', 'Configuration', 'Document.Заказ'],
+                         [o.full_name for o in self.index.objects()])
+        self.assertEqual([('Организация', 'Attribute'), ('Товары.Номенклатура', 'Attribute'),
+                          ('Товары', 'TabularSection')], self.index.attributes('Document.Заказ'))
+        self.assertIn(('ФормаЭлемента', 'Form'), self.index.attributes('Catalog.Номенклатура'))
+        self.assertEqual({'Артикул': ['xs:string']}, self.index.attribute_types('Catalog.Номенклатура'))
+
+    def test_references(self):
+        self.index.update()
+        refs = self.index.references_to('Catalog.Организации')
+        self.assertEqual([('Catalog.Номенклатура', '', 'Owners'), ('Document.Заказ', 'Организация', 'Type')],
+                         [(r.source, r.attribute, r.via) for r in refs])
+        refs = self.index.references_to('Catalog.Номенклатура', kind='Document')
+        self.assertEqual(['Товары.Номенклатура'], [r.attribute for r in refs])
+
+    def test_common_module_usages(self):
+        self.index.update()
+        usages = self.index.common_module_usages('ОбщегоНазначения')
+        self.assertEqual(['Catalog.Номенклатура.Form.ФормаЭлемента', 'Document.Заказ'], [u.owner for u in usages])
+        forms = self.index.common_module_usages('ОбщегоНазначения', forms_only=True)
+        self.assertEqual(['Catalog.Номенклатура.Form.ФормаЭлемента'], [u.owner for u in forms])
+        self.assertEqual([], self.index.common_module_usages('Модуль'), 'Учтено обращение в строке')
+        self.assertEqual([], self.index.common_module_usages('Прочий'), 'Учтено обращение в комментарии')
+        self.assertEqual([], self.index.common_module_usages('Реквизит'), 'Учтена середина цепочки обращений')
+
+    def test_incremental_update(self):
+        self.index.update()
+        self.assertEqual({}, self.index.update(), 'Изменения найдены в неизменной выгрузке')
+
+        self.write('Documents/Заказ/Ext/ObjectModule.bsl', 'Возврат;')
+        os.remove(path.join(self.dump, 'Catalogs', 'Номенклатура.xml'))
+        changes = self.index.update()
+        self.assertEqual(2, len(changes))
+        self.assertEqual(['Catalog.Номенклатура.Form.ФормаЭлемента'],
+                         [u.owner for u in self.index.common_module_usages('ОбщегоНазначения')])
+        self.assertEqual([], self.index.references_to('Catalog.Организации', kind='Catalog'))
+        self.assertEqual(1, len(self.index.references_to('Catalog.Организации')), 'Удалены лишние ссылки')
+
+    def test_interrupted_update(self):
+        with mock.patch('designer_cmd.api.metadata_index._parse_file', side_effect=OSError('Ошибка чтения')):
+            with self.assertRaises(OSError):
+                self.index.update()
+        self.assertEqual(6, len(self.index.update()), 'Индекс файлов сохранен до индекса метаданных')
+        self.assertEqual(4, len(self.index.objects()))
+
+    def tearDown(self):
+        clear_folder(self.temp_path)
+
+
+class TestRepoCommit(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        clear_folder(self.temp_path)
+        self.dump = path.join(self.temp_path, 'dump')
+        self.changes = {
+            'ConfigDumpInfo.xml': 'changed',
+            'Catalogs/Номенклатура/Forms/ФормаЭлемента/Ext/Form/Module.bsl': 'changed',
+            'Catalogs/Номенклатура.xml': 'changed',
+            'Documents/Заказ/Ext/ObjectModule.bsl': 'added',
+        }
+        self.designer = Designer('', Connection(file_path=path.join(self.temp_path, 'base')),
+                                 RepositoryConnection(path.join(self.temp_path, 'repo')))
+        self.calls = []
+        for method in ('lock_objects_in_repository', 'load_config_from_files', 'commit_config_to_repo',
+                       'unlock_objects_in_repository'):
+            patcher = mock.patch.object(self.designer, method, side_effect=self.recorder(method))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def recorder(self, method: str):
+        def record(*args):
+            files = [a for a in args if isinstance(a, str) and a.endswith(('.xml', '.txt'))]
+            contents = []
+            for file_path in files:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    contents.append(f.read())
+            self.calls.append((method, contents))
+        return record
+
+    def test_changed_objects(self):
+        self.assertEqual(['Catalog.Номенклатура', 'Document.Заказ'], changed_objects(self.changes))
+        self.assertEqual(['Configuration', 'Catalog.Н'],
+                         changed_objects({'Catalogs/Н.xml': 'added', 'Configuration.xml': 'changed'}))
+
+    def test_write_objects_list(self):
+        list_file = write_objects_list(['Configuration', 'Catalog.Номенклатура'],
+                                       path.join(self.temp_path, 'objects.xml'))
+        root = ElementTree.parse(list_file).getroot()
+        ns = '{http://v8.1c.ru/8.3/config/objects}'
+        self.assertEqual(ns + 'Objects', root.tag)
+        self.assertEqual('false', root.find(ns + 'Configuration').get('includeChildObjects'))
+        self.assertEqual('Catalog.Номенклатура', root.find(ns + 'Object').get('fullName'))
+
+    def test_commit_changes(self):
+        objects = self.designer.commit_changes_to_repo(self.dump, self.changes, 'Комментарий')
+        self.assertEqual(['Catalog.Номенклатура', 'Document.Заказ'], objects)
+        self.assertEqual(['lock_objects_in_repository', 'load_config_from_files', 'commit_config_to_repo'],
+                         [method for method, _ in self.calls], 'Не верная последовательность операций')
+
+        objects_list = self.calls[0][1][0]
+        self.assertIn('fullName="Document.Заказ"', objects_list)
+        self.assertEqual(objects_list, self.calls[2][1][0], 'Захвачены и отправлены разные объекты')
+        files_list = self.calls[1][1][0].splitlines()
+        self.assertEqual(3, len(files_list), 'Загружаются не только измененные файлы')
+        self.assertIn(path.join(self.dump, 'Documents', 'Заказ', 'Ext', 'ObjectModule.bsl'), files_list)
+
+    def test_commit_with_deleted(self):
+        self.changes['Documents/Заказ.xml'] = 'deleted'
+        self.designer.commit_changes_to_repo(self.dump, self.changes)
+        self.assertEqual([], self.calls[1][1], 'При удалении файлов конфигурация должна загружаться полностью')
+
+    def test_unlock_on_error(self):
+        self.designer.commit_config_to_repo.side_effect = SyntaxError('commit')
+        with self.assertRaises(SyntaxError):
+            self.designer.commit_changes_to_repo(self.dump, self.changes)
+        self.designer.unlock_objects_in_repository.assert_called_once()
+
+    def test_no_changes(self):
+        self.assertEqual([], self.designer.commit_changes_to_repo(self.dump, {'ConfigDumpInfo.xml': 'changed'}))
+        self.assertEqual([], self.calls)
+
+    def tearDown(self):
+        clear_folder(self.temp_path)
+
+
+class TestRepoVersionExtractor(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        clear_folder(self.temp_path)
+        self.output_dir = path.join(self.temp_path, 'versions')
+        self.dumped = []
+        self.designers = []
+        for i in range(3):
+            designer = Designer('', Connection(file_path=path.join(self.temp_path, f'base{i}')),
+                                RepositoryConnection(path.join(self.temp_path, 'repo'), f'user{i}'))
+            for method, side_effect in (('execute_command', self.execute(designer)),
+                                        ('bind_cfg_to_repo', None), ('create_base', None)):
+                patcher = mock.patch.object(designer, method, side_effect=side_effect)
+                patcher.start()
+                self.addCleanup(patcher.stop)
+            self.designers.append(designer)
+
+    def tearDown(self):
+        clear_folder(self.temp_path)
+
+    def execute(self, designer: Designer):
+        def execute_command(mode: str, params: list, *args, **kwargs):
+            version = params[params.index('-v') + 1]
+            if version == '13':
+                raise SyntaxError('Ошибка выгрузки')
+            time.sleep(0.05)
+            with open(params[params.index('/ConfigurationRepositoryDumpCfg') + 1], 'w', encoding='utf-8') as f:
+                f.write(version)
+            self.dumped.append((version, designer))
+        return execute_command
+
+    def test_extract(self):
+        extractor = RepoVersionExtractor(self.designers, self.output_dir, concurrency=2)
+        files = extractor.extract(range(1, 7))
+
+        self.assertEqual(list(range(1, 7)), sorted(files), 'Возвращены не все версии')
+        for version, file_path in files.items():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                self.assertEqual(str(version), f.read(), 'Неверное содержимое выгрузки версии')
+        self.assertEqual(list(range(1, 7)), extractor.extracted(), 'Неверный список выгруженных версий')
+        used = {id(designer) for _, designer in self.dumped}
+        self.assertEqual(2, len(used), 'Использовано неверное количество рабочих баз')
+
+        self.dumped.clear()
+        extractor.extract(range(5, 9))
+        self.assertEqual(['7', '8'], sorted(v for v, _ in self.dumped), 'Выгружены уже выгруженные версии')
+
+    def test_extract_failed(self):
+        extractor = RepoVersionExtractor(self.designers, self.output_dir)
+        with self.assertRaises(SyntaxError) as cm:
+            extractor.extract([12, 13, 14])
+        self.assertIn('[13]', str(cm.exception), 'Не указана версия с ошибкой')
+        self.assertEqual([12, 14], extractor.extracted(), 'Не сохранены успешно выгруженные версии')
+        self.assertFalse([f for f in os.listdir(self.output_dir) if f.endswith('.tmp')],
+                         'Не удален временный файл')
+
+    def test_prepare(self):
+        RepoVersionExtractor(self.designers, self.output_dir).prepare()
+        for designer in self.designers:
+            designer.create_base.assert_called_once()
+            designer.bind_cfg_to_repo.assert_called_once()
+
+        RepoVersionExtractor(self.designers, self.output_dir).prepare()
+        for designer in self.designers:
+            designer.bind_cfg_to_repo.assert_called_once()
+
+    def test_extract_cache(self):
+        cache = RepoVersionCache(path.join(self.temp_path, 'cache'))
+        cache_file = path.join(self.temp_path, 'cached.cf')
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            f.write('2')
+        cache.put(path.join(self.temp_path, 'repo'), 2, cache_file)
+
+        files = RepoVersionExtractor(self.designers, self.output_dir, cache=cache).extract([1, 2, 3])
+        self.assertEqual(['1', '3'], sorted(v for v, _ in self.dumped), 'Версия из кэша выгружена повторно')
+        with open(files[2], 'r', encoding='utf-8') as f:
+            self.assertEqual('2', f.read(), 'Неверное содержимое версии из кэша')
+        self.assertIsNotNone(cache.path(path.join(self.temp_path, 'repo'), 3), 'Выгруженная версия не помещена в кэш')
+
+
+class TestRepoVersionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        clear_folder(self.temp_path)
+        self.cache = RepoVersionCache(path.join(self.temp_path, 'cache'))
+        self.designer = Designer('', Connection(file_path=path.join(self.temp_path, 'base')),
+                                 RepositoryConnection(path.join(self.temp_path, 'repo')))
+        self.launches = []
+        patcher = mock.patch.object(self.designer, 'execute_command', side_effect=self.execute)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        clear_folder(self.temp_path)
+
+    def execute(self, mode: str, params: list):
+        version = params[params.index('-v') + 1]
+        time.sleep(0.05)
+        with open(params[params.index('/ConfigurationRepositoryDumpCfg') + 1], 'w', encoding='utf-8') as f:
+            f.write(f'version {version}')
+        self.launches.append(version)
+
+    def read(self, file_path: str) -> str:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def test_dump(self):
+        first = path.join(self.temp_path, 'first.cf')
+        second = path.join(self.temp_path, 'second.cf')
+        self.designer.dump_config_to_file_from_repo(first, '5', cache=self.cache)
+        self.designer.dump_config_to_file_from_repo(second, '5', cache=self.cache)
+
+        self.assertEqual(['5'], self.launches, 'Конфигуратор запущен для закэшированной версии')
+        self.assertEqual('version 5', self.read(second), 'Неверное содержимое файла из кэша')
+        stats = self.cache.stats()
+        self.assertEqual((1, 1, 1), (stats['entries'], stats['hits'], stats['misses']), 'Неверная статистика кэша')
+        self.assertEqual(len('version 5'), stats['size'], 'Неверный размер кэша')
+
+    def test_latest_version(self):
+        file_path = path.join(self.temp_path, 'latest.cf')
+        self.designer.dump_config_to_file_from_repo(file_path, cache=self.cache)
+        self.designer.dump_config_to_file_from_repo(file_path, '-1', cache=self.cache)
+
+        self.assertEqual(['-1', '-1'], self.launches, 'Последняя версия взята из кэша')
+        self.assertFalse(self.cache.entries(), 'Последняя версия помещена в кэш')
+
+    def test_concurrent_dump(self):
+        results = []
+
+        def dump(i: int):
+            cache = RepoVersionCache(self.cache.cache_dir)
+            results.append(cache.dump(self.designer, path.join(self.temp_path, f'{i}.cf'), 7))
+
+        threads = [threading.Thread(target=dump, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(['7'], self.launches, 'Версия выгружена несколько раз')
+        self.assertEqual([False, True, True, True], sorted(results), 'Неверные попадания в кэш')
+        for i in range(4):
+            self.assertEqual('version 7', self.read(path.join(self.temp_path, f'{i}.cf')), 'Неверное содержимое')
+
+    def test_evict(self):
+        cache = RepoVersionCache(self.cache.cache_dir, max_entries=2)
+        file_path = path.join(self.temp_path, 'version.cf')
+        for version in (1, 2, 1, 3):
+            cache.dump(self.designer, file_path, version)
+
+        repo = self.designer.repo_connection.repository_path
+        self.assertIsNone(cache.path(repo, 2), 'Не удалена давно не использованная версия')
+        self.assertIsNotNone(cache.path(repo, 1), 'Удалена недавно использованная версия')
+        self.assertEqual(1, cache.stats()['evictions'], 'Неверное количество удалений')
+        locks = [name for name in os.listdir(cache.cache_dir) if name.endswith('.lock') and name != '.evict.lock']
+        self.assertEqual(2, len(locks), 'Не удалены файлы блокировок удаленных версий')
+
+    def test_lock_file_removed_on_miss(self):
+        self.assertFalse(self.cache.get(self.designer.repo_connection.repository_path, 3,
+                                        path.join(self.temp_path, 'version.cf')))
+        self.assertEqual([], [name for name in os.listdir(self.cache.cache_dir) if name.endswith('.lock')],
+                         'Не удален файл блокировки отсутствующей версии')
+
+    def test_key(self):
+        repo = path.join(self.temp_path, 'repo')
+        self.assertEqual(RepoVersionCache.key(repo, 3), RepoVersionCache.key(repo + os.sep, '3'),
+                         'Ключ зависит от записи пути к хранилищу')
+        self.assertNotEqual(RepoVersionCache.key(repo, 3), RepoVersionCache.key(repo + '2', 3),
+                            'Ключ не зависит от хранилища')
+        self.assertNotEqual(RepoVersionCache.key(repo, 3), RepoVersionCache.key(repo, 4),
+                            'Ключ не зависит от версии')
+
+    def test_repository_key(self):
+        self.assertEqual('tcp://srv/Repo', repository_key('TCP://Srv/Repo/'), 'Не нормализован адрес сервера')
+        self.assertNotEqual(repository_key('tcp://srv/Repo'), repository_key('tcp://srv/repo'),
+                            'Путь на сервере не должен приводиться к нижнему регистру')
+        if not windows_platform():
+            self.assertNotEqual(repository_key('/srv/tcp_backup/Repo'), repository_key('/srv/tcp_backup/repo'),
+                                'Каталоги хранилищ в разном регистре совпадают')
@@ -1,7 +1,31 @@
 from designer_cmd.utils import utils
+from designer_cmd.utils.ports import PortAllocator
+from designer_cmd.utils.process_scan import scan_processes, process_tree
+from designer_cmd.utils.watchdog import ProcessWatchdog, StalledProcessError
+from designer_cmd.utils.durations import DurationHistory, TimeoutPolicy, percentile
+from designer_cmd.utils.governor import ConcurrencyGovernor
+from designer_cmd.utils.fastcopy import copy_tree, CopyMethod
+from designer_cmd.utils.hashing import content_hash, file_hash
+from designer_cmd.utils.compression import compress_file, decompress_file, decompressed, detect_compression, \
+    Compression
+from designer_cmd.utils.chunking import chunk_boundaries, iter_chunks
+from designer_cmd.utils.locks import FileLock
+from designer_cmd.utils import locks
+from designer_cmd.utils import chunking
+from designer_cmd.utils import process_scan
+from designer_cmd.utils.merkle import MerkleIndex, FileChange, scan_tree
 
+import gzip
+import hashlib
 import unittest
 from unittest import mock
+import os
+import shutil
+import os.path as path
+import subprocess
+import sys
+import time
+import threading
 
 
 class TestPlatform(unittest.TestCase):
@@ -121,3 +145,534 @@ class TestUtils(unittest.TestCase):
 
     def tearDown(self):
         pass
+
+
+class TestPortAllocator(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        utils.clear_folder(self.temp_path)
+        self.allocator = PortAllocator(47100, 47102, path.join(self.temp_path, 'ports'))
+
+    def test_acquire_release(self):
+        lease1 = self.allocator.acquire()
+        lease2 = self.allocator.acquire()
+        self.assertNotEqual(lease1.port, lease2.port, 'Один порт выдан дважды')
+
+        with self.assertRaises(SyntaxError):
+            self.allocator.acquire(lease1.port)
+
+        lease1.release()
+        self.assertEqual(lease1.port, self.allocator.acquire(lease1.port).port, 'Освобожденный порт не выдан')
+
+    def test_range_exhausted(self):
+        for _ in range(3):
+            self.allocator.acquire()
+        with self.assertRaises(SyntaxError):
+            self.allocator.acquire()
+
+    def test_release_on_client_exit(self):
+        lease = self.allocator.acquire(47100)
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        lease.bind_process(process.pid)
+        process.wait()
+
+        other_allocator = PortAllocator(47100, 47102, self.allocator.lock_dir)
+        self.assertEqual(47100, other_allocator.acquire(47100).port, 'Порт завершившегося клиента не освобожден')
+
+    def tearDown(self):
+        utils.clear_folder(self.temp_path)
+
+
+class TestProcessScan(unittest.TestCase):
+
+    def test_scan_all(self):
+        pids = [p.pid for p in scan_processes()]
+        self.assertIn(os.getpid(), pids, 'Текущий процесс не найден')
+
+    def test_scan_by_name(self):
+        current = next(p for p in scan_processes() if p.pid == os.getpid())
+        found = scan_processes([current.name])
+        self.assertIn(os.getpid(), [p.pid for p in found], 'Процесс не найден по имени')
+        self.assertTrue(all(p.name == current.name for p in found), 'В результат попали процессы с другим именем')
+
+        process = next(p for p in found if p.pid == os.getpid())
+        self.assertTrue(process.rss, 'Не заполнен объем памяти')
+        self.assertIsNotNone(process.cpu_time, 'Не заполнено процессорное время')
+        self.assertIsNotNone(process.start_time, 'Не заполнено время запуска')
+
+    def test_scan_unknown_name(self):
+        self.assertEqual([], scan_processes(['designer_cmd_unknown_process']), 'Найден несуществующий процесс')
+
+
+class TestKillProcesses(unittest.TestCase):
+
+    def test_kill(self):
+        process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+        self.assertEqual([], utils.kill_processes([process.pid], timeout=5), 'Процесс не завершен')
+        self.assertIsNotNone(process.wait(5), 'Процесс не завершен')
+
+    @unittest.skipIf(utils.windows_platform(), 'Проверка игнорирования SIGTERM только для linux')
+    def test_force_kill(self):
+        process = subprocess.Popen([
+            sys.executable, '-c',
+            'import signal, time, sys; signal.signal(signal.SIGTERM, signal.SIG_IGN); print(1, flush=True); '
+            'time.sleep(60)'
+        ], stdout=subprocess.PIPE)
+        process.stdout.readline()
+        self.assertEqual([], utils.kill_processes([process.pid], timeout=0.5), 'Процесс не завершен принудительно')
+        self.assertEqual(-9, process.wait(5), 'Процесс завершен не принудительно')
+
+
+class TestProcessWatchdog(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        utils.clear_folder(self.temp_path)
+        self.log_file = path.join(self.temp_path, 'out.log')
+
+    def test_stalled(self):
+        with open(self.log_file, 'w', encoding='utf-8') as f:
+            f.write('Начало выполнения\nОжидание ответа')
+        watchdog = ProcessWatchdog(1, log_file=self.log_file, poll_interval=0.2)
+
+        start = time.monotonic()
+        with self.assertRaises(StalledProcessError) as error:
+            utils.execute_command(sys.executable, ['-c', 'import time; time.sleep(30)'], 60, watchdog=watchdog)
+        self.assertLess(time.monotonic() - start, 15, 'Зависание не определено')
+        self.assertIn('Ожидание ответа', error.exception.log_tail, 'В исключение не передано окончание лога')
+        self.assertFalse(utils.pid_exists(error.exception.pid), 'Зависший процесс не завершен')
+
+    def test_active(self):
+        script = f'''
+import time
+for i in range(15):
+    with open({self.log_file!r}, 'a') as f:
+        f.write(str(i))
+    time.sleep(0.1)
+'''
+        watchdog = ProcessWatchdog(0.5, log_file=self.log_file, poll_interval=0.1, cpu_threshold=10)
+        result = utils.execute_command(sys.executable, ['-c', script], 60, watchdog=watchdog)
+        self.assertEqual(0, result[0], 'Активный процесс завершен как зависший')
+
+    def test_kill_process_tree(self):
+        process = subprocess.Popen([
+            sys.executable, '-c',
+            'import subprocess, sys, time; '
+            'child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"]); '
+            'print(child.pid, flush=True); time.sleep(60)'
+        ], stdout=subprocess.PIPE)
+        child_pid = int(process.stdout.readline())
+        tree = [p.pid for p in process_tree(scan_processes(), process.pid)]
+        self.assertEqual([process.pid, child_pid], tree, 'Не верно определено дерево процессов')
+
+        utils.kill_process_tree(process.pid, timeout=5)
+        process.wait(5)
+        self.assertFalse(utils.pid_exists(child_pid), 'Дочерний процесс не завершен')
+
+    def tearDown(self):
+        utils.clear_folder(self.temp_path)
+
+
+class TestTimeoutPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        utils.clear_folder(self.temp_path)
+        self.history = DurationHistory(path.join(self.temp_path, 'durations.sqlite'))
+        self.policy = TimeoutPolicy(self.history, percentile=90, factor=2, margin=10, min_samples=3)
+
+    def test_percentile(self):
+        values = list(range(1, 11))
+        self.assertEqual(9, percentile(values, 90), 'Не верно рассчитан перцентиль')
+        self.assertEqual(10, percentile(values, 100), 'Не верно рассчитан перцентиль')
+        self.assertEqual(1, percentile(values, 1), 'Не верно рассчитан перцентиль')
+
+    def test_default_timeout(self):
+        self.history.record('DESIGNER /UpdateDBCfg', 'F=base', 10)
+        self.assertEqual(3600, self.policy.timeout('DESIGNER /UpdateDBCfg', 'F=base', default=3600),
+                         'При недостаточной истории должен использоваться лимит по умолчанию')
+
+    def test_timeout_levels(self):
+        for duration in (10, 20, 30):
+            self.history.record('DESIGNER /UpdateDBCfg', 'F=base1', duration, size=1000)
+        for duration in (100, 200, 300):
+            self.history.record('DESIGNER /UpdateDBCfg', 'F=base2', duration, size=10 ** 9)
+
+        self.assertEqual(70, self.policy.timeout('DESIGNER /UpdateDBCfg', 'F=base1', 1000),
+                         'Не использована история базы')
+        self.assertEqual(610, self.policy.timeout('DESIGNER /UpdateDBCfg', 'F=base3', 10 ** 9),
+                         'Не использована история по размеру')
+        self.assertEqual(610, self.policy.timeout('DESIGNER /UpdateDBCfg', 'F=base3'),
+                         'Не использована общая история операции')
+
+        bounded = TimeoutPolicy(self.history, min_samples=3, max_timeout=100)
+        self.assertEqual(100, bounded.timeout('DESIGNER /UpdateDBCfg'), 'Не учтена верхняя граница')
+
+    def test_record_timed_out(self):
+        for duration in (10, 20, 30):
+            self.policy.record('DESIGNER /UpdateDBCfg', 'F=base', duration)
+        timeout = self.policy.timeout('DESIGNER /UpdateDBCfg', 'F=base')
+        self.policy.record('DESIGNER /UpdateDBCfg', 'F=base', timeout - 1, timed_out=True, timeout=timeout)
+        self.assertEqual(timeout, self.history.durations('DESIGNER /UpdateDBCfg')[0],
+                         'Прерванная операция записана с длительностью меньше лимита')
+        self.assertGreater(self.policy.timeout('DESIGNER /UpdateDBCfg', 'F=base'), timeout,
+                           'Лимит не увеличен после прерывания операции')
+
+    def tearDown(self):
+        utils.clear_folder(self.temp_path)
+
+
+class TestConcurrencyGovernor(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        utils.clear_folder(self.temp_path)
+        self.governor = ConcurrencyGovernor(
+            2, path.join(self.temp_path, 'governor'),
+            weights={'DESIGNER /UpdateDBCfg': 2, 'RAC': 1}, default_weight=1, poll_interval=0.01
+        )
+
+    def test_weight(self):
+        self.assertEqual(2, self.governor.weight('DESIGNER /UpdateDBCfg'), 'Не верный вес операции')
+        self.assertEqual(1, self.governor.weight('RAC infobase create'), 'Не верный вес режима')
+        self.assertEqual(1, self.governor.weight('DESIGNER /DumpCfg'), 'Не верный вес по умолчанию')
+        self.governor.weights['ENTERPRISE'] = 5
+        self.assertEqual(2, self.governor.weight('ENTERPRISE /Execute test.epf'), 'Вес не ограничен емкостью')
+
+    def test_capacity(self):
+        with self.governor.acquire('DESIGNER /DumpCfg'):
+            with self.governor.acquire('DESIGNER /DumpCfg'):
+                with self.assertRaises(TimeoutError):
+                    self.governor.acquire('DESIGNER /DumpCfg', timeout=0.1)
+            with self.assertRaises(TimeoutError):
+                self.governor.acquire('DESIGNER /UpdateDBCfg', timeout=0.1)
+        with self.governor.acquire('DESIGNER /UpdateDBCfg') as lease:
+            self.assertEqual(2, lease.weight, 'Не верный вес выданных слотов')
+
+    def test_wait_time(self):
+        lease = self.governor.acquire(weight=2)
+        timer = threading.Timer(0.3, lease.release)
+        timer.start()
+        try:
+            waiting = self.governor.acquire('DESIGNER /DumpCfg', timeout=5)
+        finally:
+            timer.join()
+        waiting.release()
+        self.assertGreaterEqual(waiting.wait_time, 0.2, 'Не учтено время ожидания в очереди')
+
+    def tearDown(self):
+        utils.clear_folder(self.temp_path)
+
+
+class TestResourceUsage(unittest.TestCase):
+
+    def test_usage(self):
+        script = 'import sys; data = bytearray(50 * 1024 * 1024); print("x" * 99); sys.stderr.write("err")'
+        result = utils.execute_command(sys.executable, ['-c', script])
+        self.assertEqual((0, 'x' * 99), result, 'Результат не совместим с кортежем (код возврата, сообщение)')
+        self.assertEqual(0, result.returncode, 'Не верный код возврата')
+
+        usage = result.usage
+        self.assertGreater(usage.wall_time, 0, 'Не заполнена длительность')
+        self.assertIsNotNone(usage.user_time, 'Не заполнено время пользователя')
+        self.assertIsNotNone(usage.system_time, 'Не заполнено время ядра')
+        self.assertGreater(usage.peak_rss, 50 * 1024 * 1024, 'Не верный пиковый объем памяти')
+        self.assertEqual(len(os.linesep) + 99, usage.stdout_bytes, 'Не верный размер stdout')
+        self.assertEqual(3, usage.stderr_bytes, 'Не верный размер stderr')
+
+    def test_failed_usage(self):
+        result = utils.execute_command(sys.executable, ['-c', 'import sys; sys.exit(3)'])
+        self.assertEqual(1, result[0], 'Ошибка выполнения не определена')
+        self.assertIsNotNone(result.usage.wall_time, 'Не заполнена длительность')
+
+    def test_windows_handle_usage(self):
+        process = subprocess.Popen([sys.executable, '-c', ''], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with mock.patch.object(process_scan, 'open_process_handle', return_value=42) as open_handle, \
+                mock.patch.object(process_scan, 'handle_usage', return_value=(1.0, 0.5, 1024)) as handle_usage, \
+                mock.patch.object(process_scan, 'close_process_handle') as close_handle:
+            waiter = utils._ProcessWaiter(process, windows=True)
+            waiter.wait(10)
+            waiter.rusage = None
+            usage = waiter.usage(time.monotonic())
+
+        open_handle.assert_called_once_with(process.pid)
+        handle_usage.assert_called_once_with(42)
+        close_handle.assert_called_once_with(42)
+        self.assertEqual((1.0, 0.5, 1024), (usage.user_time, usage.system_time, usage.peak_rss),
+                         'Ресурсы не получены по дескриптору процесса')
+
+    def test_output_encoding_error(self):
+        process = subprocess.Popen([sys.executable, '-c', 'print("вывод")'], stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        with mock.patch.object(utils, 'encoding', side_effect=AttributeError('windll')):
+            waiter = utils._ProcessWaiter(process)
+            waiter.wait(10)
+        stdout, _ = waiter.output()
+        self.assertEqual('вывод', stdout.strip(), 'Вывод процесса потерян при ошибке кодировки')
+        waiter.close()
+
+    def test_no_wait(self):
+        result = utils.execute_command(sys.executable, ['-c', ''], wait=False)
+        self.assertEqual(3, len(result), 'Не передан pid процесса')
+        self.assertEqual(result[2], result.pid, 'Не верный pid процесса')
+        utils.wait_processes([result.pid], 5)
+
+
+class TestFastCopy(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        utils.clear_folder(self.temp_path)
+        self.src = path.join(self.temp_path, 'src')
+        os.makedirs(self.src)
+
+    def test_copy_tree(self):
+        sparse_file = path.join(self.src, 'sparse.bin')
+        with open(sparse_file, 'wb') as f:
+            f.write(b'head')
+            f.seek(8 * 1024 * 1024)
+            f.write(b'tail')
+        with open(path.join(self.src, 'file.txt'), 'w') as f:
+            f.write('text')
+        os.link(path.join(self.src, 'file.txt'), path.join(self.src, 'link.txt'))
+
+        dst = path.join(self.temp_path, 'dst')
+        methods = copy_tree(self.src, dst)
+        self.assertEqual(CopyMethod.HARDLINK, methods['link.txt'], 'Жесткая ссылка скопирована повторно')
+        with open(path.join(dst, 'sparse.bin'), 'rb') as f:
+            data = f.read()
+        self.assertEqual(8 * 1024 * 1024 + 4, len(data), 'Не верный размер копии')
+        self.assertEqual(b'tail', data[-4:], 'Не верное содержимое копии')
+        self.assertEqual(content_hash(self.src), content_hash(dst), 'Копия отличается от исходного каталога')
+
+    def tearDown(self):
+        utils.clear_folder(self.temp_path)
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        utils.clear_folder(self.temp_path)
+        self.src = path.join(self.temp_path, 'base.dt')
+        with open(self.src, 'wb') as f:
+            for i in range(2000):
+                f.write(f'block {i} '.encode('ascii') * 50)
+                f.write(os.urandom(64))
+
+    def test_compress_file(self):
+        sha256 = file_hash(self.src)
+        size = path.getsize(self.src)
+        result = compress_file(self.src, chunk_size=64 * 1024, workers=4, remove_source=True)
+
+        self.assertEqual(f'{self.src}.gz', result.path, 'Не верный путь сжатого файла')
+        self.assertFalse(path.exists(self.src), 'Исходный файл не удален')
+        self.assertEqual(sha256, result.sha256, 'Не верный sha256 содержимого')
+        self.assertEqual(size, result.size, 'Не верный размер содержимого')
+        self.assertEqual(path.getsize(result.path), result.compressed_size, 'Не верный размер сжатого файла')
+        self.assertLess(result.ratio, 1, 'Файл не сжат')
+        self.assertEqual(Compression.GZIP, detect_compression(result.path), 'Не определено сжатие')
+
+        # Сжатый блоками файл читается стандартными средствами
+        with gzip.open(result.path, 'rb') as f:
+            self.assertEqual(sha256, hashlib.sha256(f.read()).hexdigest(), 'Содержимое сжатого файла отличается')
+
+    def test_decompressed(self):
+        sha256 = file_hash(self.src)
+        result = compress_file(self.src, chunk_size=100 * 1024)
+
+        with decompressed(result.path) as plain_path:
+            self.assertTrue(plain_path.endswith('.dt'), 'Не сохранено расширение файла')
+            self.assertEqual(sha256, file_hash(plain_path), 'Не верное содержимое распакованного файла')
+        self.assertFalse(path.exists(plain_path), 'Временный файл не удален')
+
+        with decompressed(self.src) as plain_path:
+            self.assertEqual(self.src, plain_path, 'Несжатый файл не должен распаковываться')
+
+        missing = path.join(self.temp_path, 'missing.dt')
+        with decompressed(missing) as plain_path:
+            self.assertEqual(missing, plain_path, 'Отсутствующий файл не передан как есть')
+
+        dst = path.join(self.temp_path, 'copy.dt')
+        with self.assertRaises(ValueError):
+            decompress_file(result.path, dst, sha256='0' * 64)
+        self.assertFalse(path.exists(dst), 'Файл с неверным содержимым не удален')
+        self.assertEqual(sha256, decompress_file(result.path, dst, sha256=sha256))
+
+    def test_empty_file(self):
+        empty = path.join(self.temp_path, 'empty.cf')
+        open(empty, 'wb').close()
+        result = compress_file(empty)
+        with gzip.open(result.path, 'rb') as f:
+            self.assertEqual(b'', f.read(), 'Не верное содержимое пустого файла')
+
+    def test_unavailable_algorithm(self):
+        with self.assertRaises(ValueError):
+            compress_file(self.src, algorithm='lz4')
+
+    def tearDown(self):
+        utils.clear_folder(self.temp_path)
+
+
+class TestChunking(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        utils.clear_folder(self.temp_path)
+        self.data = os.urandom(1024 * 1024)
+        self.file = path.join(self.temp_path, 'v1.cf')
+        with open(self.file, 'wb') as f:
+            f.write(self.data)
+        self.sizes = dict(min_size=4 * 1024, avg_size=16 * 1024, max_size=64 * 1024)
+
+    def test_boundaries(self):
+        boundaries = list(chunk_boundaries(self.file, workers=1, **self.sizes))
+        self.assertEqual(len(self.data), sum(length for _, length in boundaries), 'Блоки не покрывают файл')
+        for offset, length in boundaries[:-1]:
+            self.assertTrue(4 * 1024 < length <= 64 * 1024, 'Размер блока вне допустимых границ')
+
+        segmented = list(chunk_boundaries(self.file, workers=2, segment_size=100 * 1000, **self.sizes))
+        self.assertEqual(boundaries, segmented, 'Границы блоков зависят от деления файла на сегменты')
+
+    @unittest.skipIf(chunking.numpy is None, 'numpy не установлен')
+    def test_numpy_scan(self):
+        data = self.data[:300 * 1000]
+        self.assertEqual(chunking._scan_python(data, 10, 70, 12), chunking._scan_numpy(data, 10, 70, 12),
+                         'Векторный поиск границ отличается от построчного')
+
+    def test_insert(self):
+        changed = path.join(self.temp_path, 'v2.cf')
+        with open(changed, 'wb') as f:
+            f.write(self.data[:300000] + b'inserted' + self.data[300000:])
+
+        chunks = set(iter_chunks(self.file, **self.sizes))
+        changed_chunks = list(iter_chunks(changed, **self.sizes))
+        self.assertLessEqual(len([c for c in changed_chunks if c not in chunks]), 2,
+                             'Вставка изменила больше соседних блоков')
+
+    def test_small_file(self):
+        small = path.join(self.temp_path, 'small.cf')
+        with open(small, 'wb') as f:
+            f.write(b'data')
+        self.assertEqual([(0, 4)], list(chunk_boundaries(small)))
+        open(small, 'wb').close()
+        self.assertEqual([], list(chunk_boundaries(small)))
+
+    def tearDown(self):
+        utils.clear_folder(self.temp_path)
+
+
+class TestMerkleIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        utils.clear_folder(self.temp_path)
+        self.dump = path.join(self.temp_path, 'dump')
+        self.write('Configuration.xml', 'conf')
+        self.write('Catalogs/Nomenclature.xml', 'catalog')
+        self.write('Catalogs/Nomenclature/Ext/ObjectModule.bsl', 'module')
+        self.write('Documents/Order.xml', 'document')
+        self.index = MerkleIndex(self.dump, path.join(self.temp_path, 'dump.sqlite'), workers=4)
+
+    def write(self, rel_path: str, text: str, root: str = None):
+        file_path = path.join(root or self.dump, *rel_path.split('/'))
+        os.makedirs(path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_update_without_commit(self):
+        self.assertEqual(4, len(self.index.update(commit=False)))
+        self.assertIsNone(self.index.hash(), 'Индекс сохранен без commit')
+        self.assertEqual(4, len(self.index.update()), 'Изменения потеряны без commit')
+
+        root_hash = self.index.hash()
+        self.index.forget(['Documents/Order.xml'])
+        self.assertNotEqual(root_hash, self.index.hash(), 'Хэш корня не пересчитан')
+        self.assertEqual({'Documents/Order.xml': FileChange.ADDED}, self.index.update())
+        self.assertEqual(root_hash, self.index.hash())
+
+    def test_scan_tree(self):
+        files, dirs = scan_tree(self.dump, workers=2)
+        self.assertEqual({'Configuration.xml', 'Catalogs/Nomenclature.xml',
+                          'Catalogs/Nomenclature/Ext/ObjectModule.bsl', 'Documents/Order.xml'}, set(files))
+        self.assertIn('Catalogs/Nomenclature/Ext', dirs)
+
+    def test_update(self):
+        changes = self.index.update()
+        self.assertEqual(4, len(changes), 'Не все файлы добавлены в индекс')
+        root_hash = self.index.hash()
+        catalog_hash = self.index.hash('Catalogs/Nomenclature')
+        self.assertEqual({}, self.index.update(), 'Изменения найдены в неизменном каталоге')
+        self.assertEqual(root_hash, self.index.hash(), 'Хэш неизменного каталога изменился')
+
+        self.write('Catalogs/Nomenclature/Ext/ObjectModule.bsl', 'new module')
+        self.assertFalse(self.index.changed('Documents'), 'Изменения найдены в неизменном подкаталоге')
+        self.assertEqual({'Catalogs/Nomenclature/Ext/ObjectModule.bsl': FileChange.CHANGED},
+                         self.index.update('Catalogs'))
+        self.assertNotEqual(catalog_hash, self.index.hash('Catalogs/Nomenclature'), 'Хэш каталога не изменился')
+        self.assertNotEqual(root_hash, self.index.hash(), 'Хэш корня не пересчитан')
+
+        shutil.rmtree(path.join(self.dump, 'Documents'))
+        self.assertEqual({'Documents/Order.xml': FileChange.DELETED}, self.index.update())
+        self.assertIsNone(self.index.hash('Documents'), 'Удаленный каталог остался в индексе')
+
+    def test_skip_rehash(self):
+        self.index.update()
+        with mock.patch('designer_cmd.utils.merkle.file_hash') as file_hash_mock:
+            self.index.update()
+        file_hash_mock.assert_not_called()
+
+    def test_diff(self):
+        self.index.update()
+        other_dump = path.join(self.temp_path, 'other')
+        shutil.copytree(self.dump, other_dump)
+        self.write('Documents/Order.xml', 'changed', other_dump)
+        self.write('Documents/Invoice.xml', 'new', other_dump)
+        os.remove(path.join(other_dump, 'Catalogs', 'Nomenclature', 'Ext', 'ObjectModule.bsl'))
+        other = MerkleIndex(other_dump, path.join(self.temp_path, 'other.sqlite'))
+        other.update()
+
+        self.assertEqual({
+            'Catalogs/Nomenclature/Ext/ObjectModule.bsl': FileChange.DELETED,
+            'Documents/Invoice.xml': FileChange.ADDED,
+            'Documents/Order.xml': FileChange.CHANGED,
+        }, self.index.diff(other))
+        self.assertEqual({'Documents/Invoice.xml': FileChange.ADDED, 'Documents/Order.xml': FileChange.CHANGED},
+                         self.index.diff(other, 'Documents'))
+
+    def tearDown(self):
+        utils.clear_folder(self.temp_path)
+
+
+class TestFileLock(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_path = path.join(path.dirname(__file__), 'test_data', 'temp')
+        utils.clear_folder(self.temp_path)
+        self.lock_path = path.join(self.temp_path, '.key.lock')
+
+    def tearDown(self):
+        utils.clear_folder(self.temp_path)
+
+    def test_release_remove(self):
+        lock = FileLock(self.lock_path)
+        other = FileLock(self.lock_path)
+        lock.acquire()
+        self.assertFalse(other.acquire(blocking=False), 'Блокировка захвачена дважды')
+
+        lock.release(remove=True)
+        self.assertFalse(path.exists(self.lock_path), 'Файл блокировки не удален')
+        self.assertTrue(other.acquire(blocking=False), 'Блокировка не захвачена после освобождения')
+        self.assertTrue(path.exists(self.lock_path), 'Не создан новый файл блокировки')
+        other.release()
+
+    def test_removed_while_waiting(self):
+        lock = FileLock(self.lock_path)
+        lock.acquire()
+        # Ожидающий процесс открыл файл до его удаления владельцем
+        stale_fd = os.open(self.lock_path, os.O_RDWR)
+        lock.release(remove=True)
+        with FileLock(self.lock_path):
+            self.assertFalse(locks._same_file(stale_fd, self.lock_path), 'Удаленный файл считается текущим')
+        os.close(stale_fd)
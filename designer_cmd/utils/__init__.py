@@ -1,2 +1,16 @@
 from .utils import (get_1c_exe_path, get_rac_path, execute_command, xml_conf_version_file_exists,
-                    PlatformVersion, clear_folder, windows_platform, port_in_use, get_1c_processes, kill_process)
+                    PlatformVersion, clear_folder, windows_platform, port_in_use, get_1c_processes, kill_process,
+                    kill_processes, wait_processes, kill_process_tree, pid_exists,
+                    Process, ONE_C_PROCESS_NAMES, CommandResult, ResourceUsage)
+from .hashing import file_hash, dir_hash, content_hash
+from .locks import FileLock
+from .ports import PortAllocator, PortLease, port_bindable
+from .process_scan import scan_processes
+from .watchdog import ProcessWatchdog, StalledProcessError
+from .durations import DurationHistory, TimeoutPolicy, size_bucket
+from .governor import ConcurrencyGovernor, GovernorLease
+from .fastcopy import copy_file, copy_tree, CopyMethod
+from .compression import compress_file, decompress_file, decompressed, detect_compression, Compression, CompressedFile
+from .chunking import chunk_boundaries, iter_chunks
+from .merkle import MerkleIndex, FileChange, scan_tree
+from .lru_cache import LruCache, write_json
@@ -0,0 +1,170 @@
+import os
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MASK_64 = (1 << 64) - 1
+# Хэш позиции зависит только от последних WINDOW байт: старшие биты вытесняются сдвигом
+WINDOW = 64
+
+# Таблица gear-хэша должна быть одинаковой во всех процессах и версиях: от нее зависят границы блоков
+GEAR = tuple(
+    int.from_bytes(hashlib.sha256(f'designer_cmd.gear.{i}'.encode('ascii')).digest()[:8], 'little')
+    for i in range(256)
+)
+
+MIN_CHUNK_SIZE = 64 * 1024
+AVG_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+SEGMENT_SIZE = 32 * 1024 * 1024
+# Размер блока векторного поиска: массив хэшей блока (8 байт на байт данных) должен помещаться в кэш процессора
+SCAN_BLOCK_SIZE = 64 * 1024
+
+_GEAR_ARRAY = numpy.array(GEAR, dtype=numpy.uint64) if numpy is not None else None
+
+
+def _mask(bits: int) -> int:
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+def _scan(data: bytes, offset: int, skip: int, bits: int) -> List[Tuple[int, bool]]:
+    if numpy is not None:
+        return _scan_numpy(data, offset, skip, bits)
+    return _scan_python(data, offset, skip, bits)
+
+
+def _scan_numpy(data: bytes, offset: int, skip: int, bits: int) -> List[Tuple[int, bool]]:
+    # Хэш позиции - сумма GEAR[byte] << k по последним WINDOW байтам (k - расстояние до позиции),
+    # сумма по окну 2w собирается из двух сумм по окну w, поэтому достаточно log2(WINDOW) векторных сложений
+    weak = numpy.uint64(_mask(bits - 1))
+    strict = numpy.uint64(_mask(bits + 1))
+    view = numpy.frombuffer(data, dtype=numpy.uint8)
+    result = []
+    for start in range(0, len(data), SCAN_BLOCK_SIZE):
+        warmup = min(start, WINDOW - 1)
+        h = _GEAR_ARRAY[view[start - warmup:start + SCAN_BLOCK_SIZE]]
+        width = 1
+        while width < WINDOW:
+            h[width:] += h[:-width] << numpy.uint64(width)
+            width *= 2
+        h = h[warmup:]
+        positions = numpy.flatnonzero((h & weak) == 0)
+        strict_flags = (h[positions] & strict) == 0
+        positions += start
+        keep = positions >= skip
+        result.extend(zip((positions[keep] + offset + 1).tolist(), strict_flags[keep].tolist()))
+    return result
+
+
+def _scan_python(data: bytes, offset: int, skip: int, bits: int) -> List[Tuple[int, bool]]:
+    weak = _mask(bits - 1)
+    strict = _mask(bits + 1)
+    gear = GEAR
+    h = 0
+    result = []
+    for i, byte in enumerate(data):
+        h = ((h << 1) + gear[byte]) & MASK_64
+        if not h & weak and i >= skip:
+            result.append((offset + i + 1, not h & strict))
+    return result
+
+
+def _scan_segment(file_path: str, start: int, end: int, bits: int) -> List[Tuple[int, bool]]:
+    # Предыдущие WINDOW - 1 байт прогревают хэш, поэтому результат не зависит от деления файла на сегменты
+    warmup = min(start, WINDOW - 1)
+    with open(file_path, 'rb') as f:
+        f.seek(start - warmup)
+        data = f.read(end - start + warmup)
+    return _scan(data, start - warmup, warmup, bits)
+
+
+def _iter_candidates(file_path: str, size: int, bits: int, workers: int,
+                     segment_size: int) -> Iterator[Tuple[int, bool]]:
+    segments = [(start, min(start + segment_size, size)) for start in range(0, size, segment_size)]
+    if workers == 1 or len(segments) <= 1:
+        for start, end in segments:
+            yield from _scan_segment(file_path, start, end, bits)
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for start, end in segments:
+            pending.append(pool.submit(_scan_segment, file_path, start, end, bits))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def chunk_boundaries(file_path: str,
+                     min_size: int = MIN_CHUNK_SIZE,
+                     avg_size: int = AVG_CHUNK_SIZE,
+                     max_size: int = MAX_CHUNK_SIZE,
+                     workers: Optional[int] = None,
+                     segment_size: int = SEGMENT_SIZE) -> Iterator[Tuple[int, int]]:
+    """
+    Делит файл на блоки с границами по содержимому (gear-хэш, FastCDC с нормализацией размера):
+    вставка или удаление данных меняет только соседние блоки, остальные блоки совпадают с блоками
+    прежней версии файла.
+
+    Позиции-кандидаты ищутся параллельно по сегментам файла в пуле процессов,
+    результат не зависит от количества процессов. Если установлен numpy, поиск выполняется векторно
+    (на порядок быстрее), границы блоков при этом не меняются.
+
+    :param file_path: Путь к файлу
+    :param min_size: Минимальный размер блока
+    :param avg_size: Средний размер блока (степень двойки)
+    :param max_size: Максимальный размер блока
+    :param workers: Количество процессов, по умолчанию - количество процессоров.
+    :param segment_size: Размер сегмента файла для одного процесса
+    :return: Смещения и размеры блоков
+    """
+    if not 0 < min_size <= avg_size <= max_size or avg_size & (avg_size - 1):
+        raise ValueError('Размеры блока должны удовлетворять min <= avg <= max, avg - степень двойки')
+
+    size = os.path.getsize(file_path)
+    bits = avg_size.bit_length() - 1
+    candidates = _iter_candidates(file_path, size, bits, workers or os.cpu_count() or 1, segment_size)
+    pending = deque()
+    exhausted = False
+    start = 0
+    while start < size:
+        limit = min(start + max_size, size)
+        while not exhausted and (not pending or pending[-1][0] < limit):
+            try:
+                pending.append(next(candidates))
+            except StopIteration:
+                exhausted = True
+        while pending and pending[0][0] <= start + min_size:
+            pending.popleft()
+
+        end = limit
+        if size - start > min_size:
+            # До среднего размера граница - только по строгой маске, после - по слабой
+            for pos, strict in pending:
+                if pos > limit:
+                    break
+                if strict or pos > start + avg_size:
+                    end = pos
+                    break
+        yield start, end - start
+        start = end
+
+
+def iter_chunks(file_path: str, **kwargs) -> Iterator[bytes]:
+    """
+    Читает файл блоками chunk_boundaries.
+
+    :param file_path: Путь к файлу
+    :param kwargs: Параметры chunk_boundaries
+    :return: Блоки данных
+    """
+    with open(file_path, 'rb') as f:
+        for _, length in chunk_boundaries(file_path, **kwargs):
+            yield f.read(length)
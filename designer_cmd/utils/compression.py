@@ -0,0 +1,217 @@
+import os
+import gzip
+import time
+import hashlib
+import logging
+import tempfile
+import contextlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Iterator
+
+try:
+    # Стандартная библиотека Python 3.14+
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_CHUNK_SIZE = 16 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class Compression:
+    GZIP = 'gzip'
+    ZSTD = 'zstd'
+
+
+EXTENSIONS = {Compression.GZIP: '.gz', Compression.ZSTD: '.zst'}
+MAGIC = {Compression.GZIP: b'\x1f\x8b', Compression.ZSTD: b'\x28\xb5\x2f\xfd'}
+DEFAULT_LEVELS = {Compression.GZIP: 6, Compression.ZSTD: 3}
+
+
+@dataclass
+class CompressedFile:
+    path: str
+    algorithm: str
+    # sha256 исходного (несжатого) содержимого
+    sha256: str
+    size: int
+    compressed_size: int
+    duration: float
+
+    @property
+    def ratio(self) -> float:
+        return self.compressed_size / self.size if self.size else 1.0
+
+
+def available_compressions() -> list:
+    """
+    Возвращает алгоритмы сжатия, доступные в стандартной библиотеке.
+
+    :return:
+    """
+    result = [Compression.GZIP]
+    if zstd is not None:
+        result.append(Compression.ZSTD)
+    return result
+
+
+def detect_compression(file_path: str) -> Optional[str]:
+    """
+    Определяет алгоритм сжатия файла по сигнатуре.
+
+    :param file_path: Путь к файлу
+    :return: Алгоритм (Compression) или None для несжатого файла
+    """
+    with open(file_path, 'rb') as f:
+        header = f.read(4)
+    for algorithm, magic in MAGIC.items():
+        if header.startswith(magic):
+            return algorithm
+    return None
+
+
+def compress_file(src: str,
+                  dst: Optional[str] = None,
+                  algorithm: str = Compression.GZIP,
+                  level: Optional[int] = None,
+                  chunk_size: int = COMPRESS_CHUNK_SIZE,
+                  workers: Optional[int] = None,
+                  remove_source: bool = False) -> CompressedFile:
+    """
+    Сжимает файл и вычисляет sha256 его содержимого за одно чтение.
+
+    Файл сжимается блоками параллельно, каждый блок - отдельный член gzip (кадр zstd),
+    результат - корректный файл формата, который распаковывается стандартными средствами.
+
+    :param src: Исходный файл
+    :param dst: Сжатый файл, по умолчанию - исходный файл с расширением алгоритма (.gz, .zst).
+    :param algorithm: Алгоритм сжатия (Compression)
+    :param level: Уровень сжатия, по умолчанию - стандартный для алгоритма.
+    :param chunk_size: Размер блока сжатия в байтах
+    :param workers: Количество потоков сжатия, по умолчанию - количество процессоров.
+    :param remove_source: Удалить исходный файл после сжатия
+    :return: Описание сжатого файла
+    """
+    if algorithm not in available_compressions():
+        raise ValueError(f'Алгоритм сжатия {algorithm} не доступен, доступны: {available_compressions()}')
+    if dst is None:
+        dst = f'{src}{EXTENSIONS[algorithm]}'
+    if level is None:
+        level = DEFAULT_LEVELS[algorithm]
+    workers = workers or os.cpu_count() or 1
+
+    if algorithm == Compression.ZSTD:
+        def compress_chunk(data: bytes) -> bytes:
+            return zstd.compress(data, level)
+    else:
+        def compress_chunk(data: bytes) -> bytes:
+            return gzip.compress(data, level, mtime=0)
+
+    start = time.monotonic()
+    sha256 = hashlib.sha256()
+    size = 0
+    compressed_size = 0
+    tmp_file = f'{dst}.tmp'
+    try:
+        with open(src, 'rb') as src_f, open(tmp_file, 'wb') as dst_f, ThreadPoolExecutor(workers) as pool:
+            # Не больше двух блоков на поток в памяти, блоки записываются в порядке чтения
+            pending = deque()
+            while True:
+                chunk = src_f.read(chunk_size)
+                if chunk:
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    pending.append(pool.submit(compress_chunk, chunk))
+                while pending and (not chunk or len(pending) >= workers * 2):
+                    data = pending.popleft().result()
+                    dst_f.write(data)
+                    compressed_size += len(data)
+                if not chunk:
+                    break
+            if size == 0:
+                data = compress_chunk(b'')
+                dst_f.write(data)
+                compressed_size += len(data)
+        os.replace(tmp_file, dst)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    if remove_source:
+        os.remove(src)
+
+    result = CompressedFile(dst, algorithm, sha256.hexdigest(), size, compressed_size, time.monotonic() - start)
+    logger.debug(f'Файл {src} сжат ({algorithm}) в {dst}: {size} -> {compressed_size} байт '
+                 f'за {result.duration:.1f} с.')
+    return result
+
+
+def decompress_file(src: str, dst: str, sha256: Optional[str] = None) -> str:
+    """
+    Распаковывает файл, сжатый compress_file (или любой файл gzip/zstd).
+
+    :param src: Сжатый файл
+    :param dst: Распакованный файл
+    :param sha256: Ожидаемый sha256 содержимого, при несовпадении - исключение.
+    :return: sha256 распакованного содержимого
+    """
+    algorithm = detect_compression(src)
+    if algorithm is None:
+        raise ValueError(f'Файл {src} не сжат')
+    if algorithm == Compression.ZSTD:
+        if zstd is None:
+            raise ValueError(f'Распаковка zstd не доступна, файл {src}')
+        opener = zstd.open
+    else:
+        opener = gzip.open
+
+    h = hashlib.sha256()
+    tmp_file = f'{dst}.tmp'
+    try:
+        with opener(src, 'rb') as src_f, open(tmp_file, 'wb') as dst_f:
+            for chunk in iter(lambda: src_f.read(READ_CHUNK_SIZE), b''):
+                h.update(chunk)
+                dst_f.write(chunk)
+        digest = h.hexdigest()
+        if sha256 is not None and digest != sha256:
+            raise ValueError(f'sha256 содержимого файла {src} не совпадает: {digest}, ожидается {sha256}')
+        os.replace(tmp_file, dst)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return digest
+
+
+@contextlib.contextmanager
+def decompressed(file_path: str, temp_dir: Optional[str] = None) -> Iterator[str]:
+    """
+    Возвращает путь к несжатому содержимому файла: для несжатого файла - сам файл,
+    для сжатого - временный распакованный файл, который удаляется при выходе.
+    Отсутствующий файл возвращается как есть, ошибку формирует команда, которой передан путь.
+
+    :param file_path: Путь к файлу
+    :param temp_dir: Каталог временного файла, по умолчанию - системный временный каталог.
+    :return:
+    """
+    if not os.path.isfile(file_path) or detect_compression(file_path) is None:
+        yield file_path
+        return
+
+    base_name = os.path.basename(file_path)
+    root, ext = os.path.splitext(base_name)
+    if ext.lower() not in EXTENSIONS.values():
+        root = base_name
+    # Платформа определяет тип файла по расширению, поэтому сохраняется расширение до сжатия (.dt, .cf)
+    fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(root)[1], dir=temp_dir)
+    os.close(fd)
+    try:
+        logger.debug(f'Распаковываю {file_path} в {tmp_path}')
+        decompress_file(file_path, tmp_path)
+        yield tmp_path
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
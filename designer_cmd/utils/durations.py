@@ -0,0 +1,185 @@
+import os
+import time
+import sqlite3
+import logging
+import tempfile
+import contextlib
+from typing import Optional, List, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+def size_bucket(size: Optional[int]) -> Optional[int]:
+    """
+    Возвращает группу размера (степень двойки), длительности сравниваются внутри группы.
+
+    :param size: Размер в байтах
+    :return:
+    """
+    if not size:
+        return None
+    return int(size).bit_length()
+
+
+class DurationHistory:
+    """
+    История длительностей операций в базе SQLite (операция, база, группа размера).
+    Сохраняются длительности успешно завершенных операций и операций, прерванных по лимиту времени
+    (TimeoutPolicy.record).
+    """
+
+    def __init__(self, db_file: Optional[str] = None):
+        """
+        :param db_file: Файл базы истории, по умолчанию - во временном каталоге.
+        """
+        if db_file is None:
+            db_file = os.path.join(tempfile.gettempdir(), 'designer_cmd', 'durations.sqlite')
+        self.db_file = os.path.abspath(db_file)
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS durations ('
+                'operation TEXT NOT NULL, infobase TEXT NOT NULL, size_bucket INTEGER, '
+                'duration REAL NOT NULL, created REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS durations_key ON durations (operation, infobase, size_bucket)')
+
+    def record(self, operation: str, infobase: str, duration: float, size: Optional[int] = None):
+        """
+        Сохраняет длительность операции.
+
+        :param operation: Операция
+        :param infobase: Ключ базы
+        :param duration: Длительность в секундах
+        :param size: Размер конфигурации (базы) в байтах
+        """
+        with self._connect() as conn:
+            conn.execute('INSERT INTO durations VALUES (?, ?, ?, ?, ?)',
+                         (operation, infobase, size_bucket(size), duration, time.time()))
+
+    def durations(self, operation: str, infobase: Optional[str] = None, size: Optional[int] = None,
+                  limit: int = 100) -> List[float]:
+        """
+        Возвращает последние длительности операции.
+
+        :param operation: Операция
+        :param infobase: Ключ базы, None - по всем базам.
+        :param size: Размер конфигурации в байтах, None - для всех размеров.
+        :param limit: Количество последних значений
+        :return:
+        """
+        query = 'SELECT duration FROM durations WHERE operation = ?'
+        args = [operation]
+        if infobase is not None:
+            query += ' AND infobase = ?'
+            args.append(infobase)
+        if size is not None:
+            query += ' AND size_bucket = ?'
+            args.append(size_bucket(size))
+        query += ' ORDER BY created DESC LIMIT ?'
+        args.append(limit)
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(query, args)]
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+class TimeoutPolicy:
+    """
+    Лимит времени операции по истории длительностей: percentile прошлых длительностей * factor + margin.
+
+    Используется история наиболее точного уровня с достаточным количеством значений:
+    операция в базе для размера, операция в базе, операция для размера, операция.
+    """
+
+    def __init__(self,
+                 history: DurationHistory,
+                 percentile: float = 95,
+                 factor: float = 1.5,
+                 margin: float = 60,
+                 min_samples: int = 5,
+                 min_timeout: Optional[float] = None,
+                 max_timeout: Optional[float] = None):
+        """
+        :param history: История длительностей
+        :param percentile: Перцентиль прошлых длительностей
+        :param factor: Множитель перцентиля
+        :param margin: Запас в секундах
+        :param min_samples: Минимальное количество значений в истории для расчета лимита
+        :param min_timeout: Нижняя граница лимита
+        :param max_timeout: Верхняя граница лимита
+        """
+        if not 0 < percentile <= 100:
+            raise ValueError('Перцентиль должен быть в диапазоне (0, 100]')
+        self.history = history
+        self.percentile = percentile
+        self.factor = factor
+        self.margin = margin
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+
+    def timeout(self, operation: str, infobase: Optional[str] = None, size: Optional[int] = None,
+                default: Optional[float] = None) -> Optional[float]:
+        """
+        Рассчитывает лимит времени операции.
+
+        :param operation: Операция
+        :param infobase: Ключ базы
+        :param size: Размер конфигурации в байтах
+        :param default: Лимит при недостаточной истории
+        :return:
+        """
+        levels = [(infobase, size), (infobase, None), (None, size), (None, None)]
+        for level_infobase, level_size in dict.fromkeys(levels):
+            durations = self.history.durations(operation, level_infobase, level_size)
+            if len(durations) >= self.min_samples:
+                break
+        else:
+            return default
+
+        timeout = percentile(durations, self.percentile) * self.factor + self.margin
+        if self.min_timeout is not None:
+            timeout = max(timeout, self.min_timeout)
+        if self.max_timeout is not None:
+            timeout = min(timeout, self.max_timeout)
+        logger.debug(f'Лимит времени операции {operation} по истории ({len(durations)} шт.): {timeout:.0f} с.')
+        return timeout
+
+    def record(self, operation: str, infobase: str, duration: float, size: Optional[int] = None,
+               timed_out: bool = False, timeout: Optional[float] = None):
+        """
+        Сохраняет длительность операции. Для операции, прерванной по лимиту времени, сохраняется
+        длительность не меньше лимита: иначе лимит не увеличивается для операций, которые стали дольше.
+
+        :param operation: Операция
+        :param infobase: Ключ базы
+        :param duration: Длительность в секундах
+        :param size: Размер конфигурации (базы) в байтах
+        :param timed_out: Операция прервана по лимиту времени
+        :param timeout: Лимит времени операции
+        """
+        if timed_out:
+            duration = max(duration, timeout or 0)
+            logger.debug(f'Операция {operation} прервана по лимиту времени, в историю записано {duration:.0f} с.')
+        self.history.record(operation, infobase, duration, size)
+
+
+def percentile(values: List[float], value: float) -> float:
+    """
+    Перцентиль по методу ближайшего ранга.
+
+    :param values: Значения
+    :param value: Перцентиль (0, 100]
+    :return:
+    """
+    ordered = sorted(values)
+    rank = max(int(-(-value * len(ordered) // 100)), 1)
+    return ordered[rank - 1]
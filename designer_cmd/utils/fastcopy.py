@@ -0,0 +1,108 @@
+import os
+import shutil
+import logging
+from typing import Dict, Tuple
+from .utils import windows_platform
+
+logger = logging.getLogger(__name__)
+
+if not windows_platform():
+    import fcntl
+
+# ioctl FICLONE (linux, btrfs/xfs): файл назначения разделяет блоки с исходным до первого изменения
+FICLONE = 0x40049409
+SPARSE_BLOCK_SIZE = 1024 * 1024
+
+
+class CopyMethod:
+    REFLINK = 'reflink'
+    HARDLINK = 'hardlink'
+    SPARSE = 'sparse'
+    COPY = 'copy'
+
+
+def copy_file(src: str, dst: str) -> str:
+    """
+    Копирует файл наиболее быстрым доступным способом: клонирование блоков (reflink),
+    копирование с пропуском пустых областей для разреженных файлов, обычное копирование.
+
+    :param src: Исходный файл
+    :param dst: Файл назначения
+    :return: Способ копирования (CopyMethod)
+    """
+    if _reflink(src, dst):
+        method = CopyMethod.REFLINK
+    elif _is_sparse(src):
+        _sparse_copy(src, dst)
+        method = CopyMethod.SPARSE
+    else:
+        shutil.copyfile(src, dst)
+        method = CopyMethod.COPY
+    shutil.copystat(src, dst)
+    return method
+
+
+def copy_tree(src_dir: str, dst_dir: str) -> Dict[str, str]:
+    """
+    Копирует каталог через copy_file. Жесткие ссылки внутри исходного каталога
+    воспроизводятся в каталоге назначения, а не копируются повторно.
+
+    :param src_dir: Исходный каталог
+    :param dst_dir: Каталог назначения
+    :return: Способы копирования по относительным путям файлов
+    """
+    methods = {}
+    copied: Dict[Tuple[int, int], str] = {}
+    for root, dirs, file_names in os.walk(src_dir):
+        rel_root = os.path.relpath(root, src_dir)
+        os.makedirs(os.path.join(dst_dir, rel_root), exist_ok=True)
+        for file_name in file_names:
+            src = os.path.join(root, file_name)
+            dst = os.path.join(dst_dir, rel_root, file_name)
+            rel_path = os.path.normpath(os.path.join(rel_root, file_name))
+
+            stat = os.stat(src)
+            inode = (stat.st_dev, stat.st_ino)
+            if stat.st_nlink > 1 and stat.st_ino and inode in copied:
+                os.link(copied[inode], dst)
+                methods[rel_path] = CopyMethod.HARDLINK
+                continue
+
+            methods[rel_path] = copy_file(src, dst)
+            copied[inode] = dst
+    return methods
+
+
+def _reflink(src: str, dst: str) -> bool:
+    if windows_platform():
+        return False
+    with open(src, 'rb') as src_f, open(dst, 'wb') as dst_f:
+        try:
+            fcntl.ioctl(dst_f.fileno(), FICLONE, src_f.fileno())
+            return True
+        except OSError:
+            pass
+    os.remove(dst)
+    return False
+
+
+def _is_sparse(path: str) -> bool:
+    stat = os.stat(path)
+    blocks = getattr(stat, 'st_blocks', None)
+    return blocks is not None and blocks * 512 < stat.st_size
+
+
+def _sparse_copy(src: str, dst: str):
+    with open(src, 'rb') as src_f, open(dst, 'wb') as dst_f:
+        size = os.fstat(src_f.fileno()).st_size
+        zero_block = bytes(SPARSE_BLOCK_SIZE)
+        while True:
+            block = src_f.read(SPARSE_BLOCK_SIZE)
+            if not block:
+                break
+            if block == zero_block[:len(block)]:
+                # Пустой блок не записывается, в файле назначения остается дыра
+                dst_f.seek(len(block), os.SEEK_CUR)
+            else:
+                dst_f.write(block)
+        dst_f.truncate(size)
@@ -0,0 +1,121 @@
+import os
+import time
+import logging
+import tempfile
+from typing import Optional, Dict, List
+from .locks import FileLock
+
+logger = logging.getLogger(__name__)
+
+
+class GovernorLease:
+    """
+    Слоты, выданные ConcurrencyGovernor.
+    """
+
+    def __init__(self, operation: str, weight: int, wait_time: float, slots: List[FileLock]):
+        self.operation = operation
+        self.weight = weight
+        # Время ожидания в очереди в секундах
+        self.wait_time = wait_time
+        self._slots = slots
+
+    def release(self):
+        for slot in self._slots:
+            slot.release()
+        self._slots = []
+
+    def __enter__(self) -> 'GovernorLease':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def __repr__(self):
+        return f'<GovernorLease> operation: {self.operation} weight: {self.weight} wait: {self.wait_time:.1f}'
+
+
+class ConcurrencyGovernor:
+    """
+    Ограничение количества одновременно запущенных процессов 1cv8/rac на сервере для всех процессов.
+
+    Емкость задается количеством слотов, каждый слот - файловая блокировка в каталоге lock_dir,
+    операция занимает количество слотов по своему весу. Ожидающие операции выстраиваются в очередь
+    на общей блокировке, поэтому тяжелые операции не вытесняются легкими. При аварийном завершении
+    процесса блокировки снимаются операционной системой.
+    """
+
+    def __init__(self,
+                 capacity: Optional[int] = None,
+                 lock_dir: Optional[str] = None,
+                 weights: Optional[Dict[str, int]] = None,
+                 default_weight: int = 1,
+                 poll_interval: float = 0.1):
+        """
+        :param capacity: Количество слотов, по умолчанию - половина количества процессоров.
+        :param lock_dir: Каталог блокировок, общий для всех процессов, по умолчанию - во временном каталоге.
+        :param weights: Веса операций по имени операции (DESIGNER /UpdateDBCfg) или режиму запуска (DESIGNER)
+        :param default_weight: Вес операций, для которых вес не задан
+        :param poll_interval: Интервал проверки освобождения слотов
+        """
+        if capacity is None:
+            capacity = max((os.cpu_count() or 2) // 2, 1)
+        if capacity < 1:
+            raise ValueError('Количество слотов должно быть больше 0')
+        if lock_dir is None:
+            lock_dir = os.path.join(tempfile.gettempdir(), 'designer_cmd', 'governor')
+
+        self.capacity = capacity
+        self.lock_dir = os.path.abspath(lock_dir)
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.poll_interval = poll_interval
+
+    def weight(self, operation: str) -> int:
+        """
+        Возвращает вес операции, не больше емкости.
+
+        :param operation: Имя операции
+        :return:
+        """
+        weight = self.weights.get(operation)
+        if weight is None:
+            weight = self.weights.get(operation.split(' ', 1)[0], self.default_weight)
+        return min(max(weight, 1), self.capacity)
+
+    def acquire(self, operation: str = '', weight: Optional[int] = None,
+                timeout: Optional[float] = None) -> GovernorLease:
+        """
+        Ожидает свободные слоты для операции.
+
+        :param operation: Имя операции
+        :param weight: Вес операции, по умолчанию - по настройке weights.
+        :param timeout: Время ожидания в секундах, None - без ограничения.
+        :return: Выданные слоты
+        """
+        weight = self.weight(operation) if weight is None else min(max(weight, 1), self.capacity)
+        start = time.monotonic()
+
+        with FileLock(os.path.join(self.lock_dir, 'queue.lock'), timeout, self.poll_interval):
+            slots: Dict[int, FileLock] = {}
+            while True:
+                for i in range(self.capacity):
+                    if len(slots) == weight:
+                        break
+                    if i in slots:
+                        continue
+                    slot = FileLock(os.path.join(self.lock_dir, f'slot_{i}.lock'))
+                    if slot.acquire(blocking=False):
+                        slots[i] = slot
+                if len(slots) == weight:
+                    break
+
+                if timeout is not None and time.monotonic() - start >= timeout:
+                    for slot in slots.values():
+                        slot.release()
+                    raise TimeoutError(f'Нет свободных слотов для операции {operation} за {timeout} с.')
+                time.sleep(self.poll_interval)
+
+        wait_time = time.monotonic() - start
+        logger.debug(f'Операция {operation} (вес {weight}) получила слоты, ожидание {wait_time:.1f} с.')
+        return GovernorLease(operation, weight, wait_time, list(slots.values()))
@@ -0,0 +1,55 @@
+import os
+import hashlib
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path: str, algorithm: str = 'sha256') -> str:
+    """
+    Вычисляет хэш содержимого файла, читая его блоками.
+
+    :param file_path: Путь к файлу
+    :param algorithm: Алгоритм хэширования (hashlib)
+    :return: hex представление хэша
+    """
+    h = hashlib.new(algorithm)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def dir_hash(dir_path: str, algorithm: str = 'sha256') -> str:
+    """
+    Вычисляет хэш каталога по относительным путям и содержимому всех вложенных файлов.
+
+    :param dir_path: Путь к каталогу
+    :param algorithm: Алгоритм хэширования (hashlib)
+    :return: hex представление хэша
+    """
+    files = []
+    for root, dirs, file_names in os.walk(dir_path):
+        for file_name in file_names:
+            full_path = os.path.join(root, file_name)
+            files.append((os.path.relpath(full_path, dir_path).replace(os.sep, '/'), full_path))
+
+    h = hashlib.new(algorithm)
+    for rel_path, full_path in sorted(files):
+        h.update(rel_path.encode('utf-8'))
+        h.update(b'\0')
+        h.update(file_hash(full_path, algorithm).encode('ascii'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def content_hash(content_path: str, algorithm: str = 'sha256') -> str:
+    """
+    Вычисляет хэш файла или каталога.
+
+    :param content_path: Путь к файлу или каталогу
+    :param algorithm: Алгоритм хэширования (hashlib)
+    :return: hex представление хэша
+    """
+    if os.path.isdir(content_path):
+        return dir_hash(content_path, algorithm)
+    return file_hash(content_path, algorithm)
@@ -0,0 +1,131 @@
+import os
+import time
+import logging
+from typing import Optional
+from .utils import windows_platform
+
+logger = logging.getLogger(__name__)
+
+if windows_platform():
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+    """
+    Межпроцессная блокировка на основе файла.
+
+    Используется блокировка операционной системы (fcntl.flock / msvcrt.locking), поэтому
+    при аварийном завершении процесса блокировка снимается автоматически.
+    """
+
+    def __init__(self, lock_path: str, timeout: Optional[float] = None, poll_interval: float = 0.05):
+        """
+        :param lock_path: Путь к файлу блокировки
+        :param timeout: Время ожидания блокировки в секундах, None - без ограничения.
+        :param poll_interval: Интервал повторных попыток захвата блокировки
+        """
+        self.lock_path = os.path.abspath(lock_path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd: Optional[int] = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Захватывает блокировку.
+
+        :param blocking: Ожидать освобождения блокировки (не дольше timeout)
+        :return: Захвачена ли блокировка
+        """
+        if self._fd is not None:
+            raise RuntimeError(f'Блокировка {self.lock_path} уже захвачена')
+
+        lock_dir = os.path.dirname(self.lock_path)
+        if not os.path.exists(lock_dir):
+            os.makedirs(lock_dir, exist_ok=True)
+
+        start = time.monotonic()
+        while True:
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+            if _try_lock(fd):
+                if _same_file(fd, self.lock_path):
+                    self._fd = fd
+                    return True
+                # Файл блокировки удален владельцем (release(remove=True)) после открытия, блокируется новый файл
+                _unlock(fd)
+                os.close(fd)
+                continue
+            os.close(fd)
+
+            if not blocking:
+                return False
+            if self.timeout is not None and time.monotonic() - start >= self.timeout:
+                raise TimeoutError(f'Не удалось захватить блокировку {self.lock_path} за {self.timeout} с.')
+            time.sleep(self.poll_interval)
+
+    def release(self, remove: bool = False):
+        """
+        Освобождает блокировку.
+
+        :param remove: Удалить файл блокировки. Процессы, ожидающие удаленный файл, блокируют новый файл.
+        """
+        if self._fd is None:
+            return
+        if remove and not windows_platform():
+            _remove(self.lock_path)
+        try:
+            _unlock(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+        if remove and windows_platform():
+            # В windows открытый файл не удаляется: если его уже открыл другой процесс, файл остается
+            _remove(self.lock_path)
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if windows_platform():
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd: int):
+    if windows_platform():
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _same_file(fd: int, path: str) -> bool:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    fd_stat = os.fstat(fd)
+    return (stat.st_dev, stat.st_ino) == (fd_stat.st_dev, fd_stat.st_ino)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,121 @@
+import os
+import json
+import logging
+import contextlib
+from abc import ABC, abstractmethod
+from typing import Optional, List, Iterator
+from .locks import FileLock
+
+logger = logging.getLogger(__name__)
+
+
+def write_json(file_path: str, data: dict):
+    """
+    Записывает json атомарно: во временный файл с последующей заменой.
+
+    :param file_path: Путь к файлу
+    :param data: Данные
+    """
+    tmp_file = f'{file_path}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, file_path)
+
+
+class LruCache(ABC):
+    """
+    Основа файловых кэшей, общих для нескольких процессов: блокировки записей по ключу и удаление давно
+    не использованных записей при превышении квоты размера или количества записей.
+
+    Описание записи (entries) - словарь с ключами key, size и last_used.
+    """
+
+    def __init__(self, cache_dir: str, quota: Optional[int] = None, max_entries: Optional[int] = None):
+        """
+        :param cache_dir: Каталог кэша
+        :param quota: Максимальный размер кэша в байтах
+        :param max_entries: Максимальное количество записей
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.quota = quota
+        self.max_entries = max_entries
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @abstractmethod
+    def entries(self) -> List[dict]:
+        """
+        Возвращает описания записей кэша.
+
+        :return:
+        """
+
+    @abstractmethod
+    def _exists(self, key: str) -> bool:
+        """
+        Проверяет наличие записи в кэше.
+
+        :param key: Ключ записи
+        :return:
+        """
+
+    @abstractmethod
+    def _remove(self, key: str):
+        """
+        Удаляет запись кэша, вызывается под блокировкой ключа.
+
+        :param key: Ключ записи
+        """
+
+    def size(self) -> int:
+        return sum(i['size'] for i in self.entries())
+
+    @contextlib.contextmanager
+    def locked(self, key: str) -> Iterator[None]:
+        """
+        Блокирует запись на время выполнения блока with. Если записи нет после выполнения блока,
+        файл блокировки удаляется, поэтому каталог кэша не накапливает файлы блокировок.
+
+        :param key: Ключ записи
+        """
+        lock = self._key_lock(key)
+        lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release(remove=not self._exists(key))
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Удаляет давно не использованные записи до соблюдения квоты и количества записей.
+        Записи, заблокированные другими процессами, пропускаются.
+
+        :param keep: Ключ записи, которая не удаляется
+        :return: Ключи удаленных записей
+        """
+        removed = []
+        with FileLock(os.path.join(self.cache_dir, '.evict.lock')):
+            entries = sorted(self.entries(), key=lambda i: i['last_used'])
+            total = sum(i['size'] for i in entries)
+            for info in entries:
+                over_quota = self.quota is not None and total > self.quota
+                over_count = self.max_entries is not None and len(entries) - len(removed) > self.max_entries
+                if not over_quota and not over_count:
+                    break
+                if info['key'] == keep:
+                    continue
+
+                lock = self._key_lock(info['key'])
+                if not lock.acquire(blocking=False):
+                    # Запись создается или используется другим процессом
+                    continue
+                try:
+                    self._remove(info['key'])
+                finally:
+                    lock.release(remove=True)
+                total -= info['size']
+                removed.append(info['key'])
+                logger.debug(f'Из кэша {self.cache_dir} удалена запись {info["key"]}')
+        return removed
+
+    def _key_lock(self, key: str) -> FileLock:
+        return FileLock(os.path.join(self.cache_dir, f'.{key}.lock'))
@@ -0,0 +1,276 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Tuple, Set, List, Iterator, Iterable
+from .hashing import file_hash
+
+logger = logging.getLogger(__name__)
+
+FileStat = Tuple[int, int]
+
+
+class FileChange:
+    ADDED = 'added'
+    DELETED = 'deleted'
+    CHANGED = 'changed'
+
+
+def _join(rel_dir: str, name: str) -> str:
+    return f'{rel_dir}/{name}' if rel_dir else name
+
+
+def _parent(rel_path: str) -> str:
+    return rel_path.rpartition('/')[0]
+
+
+def _scan_dir(root_dir: str, rel_dir: str) -> Tuple[str, Dict[str, FileStat], List[str]]:
+    files = {}
+    dirs = []
+    with os.scandir(os.path.join(root_dir, rel_dir)) as entries:
+        for entry in entries:
+            rel_path = _join(rel_dir, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(rel_path)
+            elif entry.is_file():
+                stat = entry.stat()
+                files[rel_path] = (stat.st_size, stat.st_mtime_ns)
+    return rel_dir, files, dirs
+
+
+def scan_tree(root_dir: str, sub_path: str = '', workers: Optional[int] = None) -> Tuple[Dict[str, FileStat], Set[str]]:
+    """
+    Обходит каталог параллельно: каждый вложенный каталог читается os.scandir в пуле потоков.
+
+    :param root_dir: Корневой каталог
+    :param sub_path: Относительный путь обходимого подкаталога (через /)
+    :param workers: Количество потоков
+    :return: Размеры и время изменения файлов, каталоги (относительные пути через /)
+    """
+    files = {}
+    dirs = set()
+    with ThreadPoolExecutor(workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        pending = {pool.submit(_scan_dir, root_dir, sub_path)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel_dir, dir_files, sub_dirs = future.result()
+                dirs.add(rel_dir)
+                files.update(dir_files)
+                pending.update(pool.submit(_scan_dir, root_dir, d) for d in sub_dirs)
+    return files, dirs
+
+
+class MerkleIndex:
+    """
+    Индекс каталога (выгрузки конфигурации в xml) в виде дерева Меркла: для файла хранится хэш содержимого,
+    для каталога - хэш по именам и хэшам вложенных файлов и каталогов. Индекс хранится в SQLite.
+
+    При обновлении файлы с неизменными размером и временем изменения повторно не хэшируются,
+    хэши пересчитываются только для каталогов с изменениями и их родителей.
+    """
+
+    def __init__(self, root_dir: str, index_file: Optional[str] = None, workers: Optional[int] = None):
+        """
+        :param root_dir: Индексируемый каталог
+        :param index_file: Файл индекса, по умолчанию - .<имя каталога>.merkle.sqlite рядом с каталогом.
+        :param workers: Количество потоков обхода и хэширования
+        """
+        self.root_dir = os.path.abspath(root_dir)
+        if index_file is None:
+            index_file = os.path.join(os.path.dirname(self.root_dir),
+                                      f'.{os.path.basename(self.root_dir)}.merkle.sqlite')
+        self.index_file = os.path.abspath(index_file)
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS files ('
+                         'path TEXT PRIMARY KEY, parent TEXT NOT NULL, size INTEGER, mtime_ns INTEGER, hash TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, hash TEXT)')
+            conn.execute('CREATE INDEX IF NOT EXISTS files_parent ON files (parent)')
+            conn.execute('CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)')
+
+    def update(self, sub_path: str = '', commit: bool = True) -> Dict[str, str]:
+        """
+        Обновляет индекс подкаталога по состоянию на диске.
+
+        :param sub_path: Относительный путь подкаталога (через /), по умолчанию - весь каталог.
+        :param commit: Сохранить изменения в индексе. Без сохранения изменения только возвращаются,
+            например, чтобы сохранить их после успешной обработки измененных файлов.
+        :return: Изменения файлов с прошлого обновления (FileChange) по относительным путям
+        """
+        sub_path = self._normalize(sub_path)
+        start = time.monotonic()
+        if os.path.isdir(os.path.join(self.root_dir, sub_path)):
+            files, dirs = scan_tree(self.root_dir, sub_path, self.workers)
+        else:
+            files, dirs = {}, set()
+
+        with self._connect() as conn:
+            stored_files = {row[0]: row[1:] for row in
+                            self._select(conn, 'files', 'path, size, mtime_ns, hash', sub_path)}
+            stored_dirs = {row[0] for row in self._select(conn, 'dirs', 'path', sub_path)}
+
+            deleted = stored_files.keys() - files.keys()
+            changes = {rel_path: FileChange.DELETED for rel_path in deleted}
+            to_hash = [rel_path for rel_path, stat in files.items()
+                       if rel_path not in stored_files or stored_files[rel_path][:2] != stat]
+            hashes = self._hash_files(to_hash)
+            for rel_path in to_hash:
+                if rel_path not in stored_files:
+                    changes[rel_path] = FileChange.ADDED
+                elif stored_files[rel_path][2] != hashes[rel_path]:
+                    changes[rel_path] = FileChange.CHANGED
+
+            conn.executemany('DELETE FROM files WHERE path = ?', ((rel_path,) for rel_path in deleted))
+            conn.executemany('DELETE FROM dirs WHERE path = ?', ((rel_dir,) for rel_dir in stored_dirs - dirs))
+            conn.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                             ((p, _parent(p), files[p][0], files[p][1], hashes[p]) for p in to_hash))
+            conn.executemany('INSERT INTO dirs VALUES (?, ?, NULL)',
+                             ((d, _parent(d) if d else None) for d in dirs - stored_dirs))
+            self._rehash_dirs(conn, {_parent(rel_path) for rel_path in changes} | (dirs ^ stored_dirs))
+            if not commit:
+                conn.rollback()
+
+        logger.debug(f'Индекс {self.root_dir}/{sub_path} обновлен за {time.monotonic() - start:.3f} с.: '
+                     f'файлов {len(files)}, хэшировано {len(to_hash)}, изменений {len(changes)}')
+        return dict(sorted(changes.items()))
+
+    def forget(self, rel_paths: Iterable[str]):
+        """
+        Удаляет файлы из индекса: при следующем обновлении они будут считаться добавленными.
+
+        :param rel_paths: Относительные пути файлов (через /)
+        """
+        rel_paths = {self._normalize(rel_path) for rel_path in rel_paths}
+        if not rel_paths:
+            return
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM files WHERE path = ?', ((rel_path,) for rel_path in rel_paths))
+            self._rehash_dirs(conn, {_parent(rel_path) for rel_path in rel_paths})
+
+    def hash(self, sub_path: str = '') -> Optional[str]:
+        """
+        Возвращает хэш файла или каталога из индекса без обращения к диску.
+
+        :param sub_path: Относительный путь (через /)
+        :return: Хэш или None, если путь не проиндексирован
+        """
+        sub_path = self._normalize(sub_path)
+        with self._connect() as conn:
+            row = conn.execute('SELECT hash FROM dirs WHERE path = ?', (sub_path,)).fetchone()
+            if row is None:
+                row = conn.execute('SELECT hash FROM files WHERE path = ?', (sub_path,)).fetchone()
+        return row[0] if row else None
+
+    def changed(self, sub_path: str = '') -> bool:
+        """
+        Проверяет, изменилось ли содержимое подкаталога с прошлого обновления, и обновляет индекс подкаталога.
+
+        :param sub_path: Относительный путь подкаталога (через /)
+        :return:
+        """
+        return bool(self.update(sub_path))
+
+    def files(self, sub_path: str = '') -> Dict[str, str]:
+        """
+        Возвращает хэши файлов подкаталога из индекса.
+
+        :param sub_path: Относительный путь подкаталога (через /)
+        :return:
+        """
+        sub_path = self._normalize(sub_path)
+        with self._connect() as conn:
+            return {row[0]: row[1] for row in self._select(conn, 'files', 'path, hash', sub_path)}
+
+    def diff(self, other: 'MerkleIndex', sub_path: str = '') -> Dict[str, str]:
+        """
+        Сравнивает индекс с индексом другого каталога, спускаясь только в отличающиеся подкаталоги.
+        Индексы должны быть обновлены.
+
+        :param other: Индекс другого (нового) каталога
+        :param sub_path: Относительный путь сравниваемого подкаталога (через /)
+        :return: Изменения файлов other относительно индекса (FileChange) по относительным путям
+        """
+        sub_path = self._normalize(sub_path)
+        changes = {}
+        with self._connect() as conn, other._connect() as other_conn:
+            self._diff_dir(conn, other_conn, sub_path, changes)
+        return dict(sorted(changes.items()))
+
+    def _diff_dir(self, conn: sqlite3.Connection, other_conn: sqlite3.Connection, rel_dir: str,
+                  changes: Dict[str, str]):
+        old_hash = conn.execute('SELECT hash FROM dirs WHERE path = ?', (rel_dir,)).fetchone()
+        new_hash = other_conn.execute('SELECT hash FROM dirs WHERE path = ?', (rel_dir,)).fetchone()
+        if old_hash == new_hash:
+            return
+        if old_hash is None or new_hash is None:
+            change, source = (FileChange.ADDED, other_conn) if old_hash is None else (FileChange.DELETED, conn)
+            changes.update((row[0], change) for row in self._select(source, 'files', 'path', rel_dir))
+            return
+
+        old_files = dict(conn.execute('SELECT path, hash FROM files WHERE parent = ?', (rel_dir,)))
+        new_files = dict(other_conn.execute('SELECT path, hash FROM files WHERE parent = ?', (rel_dir,)))
+        for rel_path in old_files.keys() | new_files.keys():
+            if rel_path not in new_files:
+                changes[rel_path] = FileChange.DELETED
+            elif rel_path not in old_files:
+                changes[rel_path] = FileChange.ADDED
+            elif old_files[rel_path] != new_files[rel_path]:
+                changes[rel_path] = FileChange.CHANGED
+
+        sub_dirs = {row[0] for row in conn.execute('SELECT path FROM dirs WHERE parent = ?', (rel_dir,))}
+        sub_dirs |= {row[0] for row in other_conn.execute('SELECT path FROM dirs WHERE parent = ?', (rel_dir,))}
+        for sub_dir in sub_dirs:
+            self._diff_dir(conn, other_conn, sub_dir, changes)
+
+    def _hash_files(self, rel_paths: List[str]) -> Dict[str, str]:
+        if not rel_paths:
+            return {}
+        with ThreadPoolExecutor(self.workers) as pool:
+            hashes = pool.map(lambda p: file_hash(os.path.join(self.root_dir, p)), rel_paths)
+            return dict(zip(rel_paths, hashes))
+
+    def _rehash_dirs(self, conn: sqlite3.Connection, dirty: Set[str]):
+        # Изменение каталога меняет хэши всех его родителей
+        for rel_dir in list(dirty):
+            while rel_dir:
+                rel_dir = _parent(rel_dir)
+                dirty.add(rel_dir)
+
+        # Сначала вложенные каталоги: хэш каталога вычисляется по хэшам дочерних элементов
+        for rel_dir in sorted(dirty, key=lambda d: d.count('/') + bool(d), reverse=True):
+            if conn.execute('SELECT 1 FROM dirs WHERE path = ?', (rel_dir,)).fetchone() is None:
+                continue
+            entries = [(row[0], 'f', row[1]) for row in
+                       conn.execute('SELECT path, hash FROM files WHERE parent = ?', (rel_dir,))]
+            entries += [(row[0], 'd', row[1]) for row in
+                        conn.execute('SELECT path, hash FROM dirs WHERE parent = ?', (rel_dir,))]
+            h = hashlib.sha256()
+            for rel_path, kind, entry_hash in sorted(entries):
+                h.update(f'{rel_path.rpartition("/")[2]}\0{kind}\0{entry_hash}\n'.encode('utf-8'))
+            conn.execute('UPDATE dirs SET hash = ? WHERE path = ?', (h.hexdigest(), rel_dir))
+
+    @staticmethod
+    def _select(conn: sqlite3.Connection, table: str, columns: str, sub_path: str) -> Iterator[tuple]:
+        if not sub_path:
+            return conn.execute(f'SELECT {columns} FROM {table}')
+        return conn.execute(
+            f'SELECT {columns} FROM {table} WHERE path = ? OR substr(path, 1, ?) = ?',
+            (sub_path, len(sub_path) + 1, f'{sub_path}/')
+        )
+
+    @staticmethod
+    def _normalize(sub_path: str) -> str:
+        return sub_path.replace('\\', '/').strip('/')
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.index_file, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
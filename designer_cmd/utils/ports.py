@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import socket
+import logging
+import tempfile
+from typing import Optional
+from .utils import pid_exists
+from .locks import FileLock
+
+logger = logging.getLogger(__name__)
+
+
+class PortLease:
+    """
+    Порт, выданный PortAllocator.
+
+    Пока аренда не привязана к процессу клиента, порт занят до завершения процесса, получившего аренду,
+    после привязки (bind_process) - до завершения процесса клиента.
+    """
+
+    def __init__(self, allocator: 'PortAllocator', port: int):
+        self.allocator = allocator
+        self.port = port
+        self.client_pid: Optional[int] = None
+
+    def bind_process(self, pid: int):
+        """
+        Привязывает аренду к процессу, слушающему порт. Порт освобождается при завершении процесса.
+
+        :param pid: Идентификатор процесса клиента
+        """
+        self.client_pid = pid
+        self.allocator._write_lease(self.port, pid)
+
+    def release(self):
+        self.allocator.release(self.port)
+
+    def __enter__(self) -> 'PortLease':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def __repr__(self):
+        return f'<PortLease> port: {self.port} client_pid: {self.client_pid}'
+
+
+class PortAllocator:
+    """
+    Межпроцессный распределитель портов для запуска тест клиентов.
+
+    Порты выдаются из диапазона, занятость порта фиксируется файлом аренды в каталоге lock_dir,
+    выдача выполняется под общей файловой блокировкой. Аренды процессов, которые уже завершились,
+    считаются свободными. Дополнительно порт проверяется локальным bind (без установки tcp соединения).
+    """
+
+    def __init__(self, port_begin: int = 1538, port_end: int = 1637, lock_dir: Optional[str] = None):
+        """
+        :param port_begin: Первый порт диапазона
+        :param port_end: Последний порт диапазона (включительно)
+        :param lock_dir: Каталог файлов аренды, общий для всех процессов, по умолчанию - во временном каталоге.
+        """
+        if port_begin > port_end:
+            raise ValueError(f'Не верный диапазон портов {port_begin}-{port_end}')
+
+        if lock_dir is None:
+            lock_dir = os.path.join(tempfile.gettempdir(), 'designer_cmd', 'ports')
+        self.port_begin = port_begin
+        self.port_end = port_end
+        self.lock_dir = os.path.abspath(lock_dir)
+        self._next_port = port_begin
+
+    def acquire(self, port: Optional[int] = None, timeout: float = 0, poll_interval: float = 0.1) -> PortLease:
+        """
+        Выдает свободный порт из диапазона.
+
+        :param port: Конкретный порт, который необходимо получить
+        :param timeout: Время ожидания освобождения порта в секундах
+        :param poll_interval: Интервал повторных попыток
+        :return: Аренда порта
+        """
+        start = time.monotonic()
+        while True:
+            with FileLock(os.path.join(self.lock_dir, 'ports.lock')):
+                lease_port = self._find_port(port)
+                if lease_port is not None:
+                    self._write_lease(lease_port, None)
+                    logger.debug(f'Выдан порт {lease_port}')
+                    return PortLease(self, lease_port)
+
+            if time.monotonic() - start >= timeout:
+                break
+            time.sleep(poll_interval)
+
+        if port is not None:
+            raise SyntaxError('Порт уже занят')
+        raise SyntaxError(f'Нет свободных портов в диапазоне {self.port_begin}-{self.port_end}')
+
+    def release(self, port: int):
+        try:
+            os.remove(self._lease_path(port))
+            logger.debug(f'Освобожден порт {port}')
+        except FileNotFoundError:
+            pass
+
+    def _find_port(self, port: Optional[int]) -> Optional[int]:
+        if port is not None:
+            return port if self._port_free(port) else None
+
+        count = self.port_end - self.port_begin + 1
+        for i in range(count):
+            check_port = self.port_begin + (self._next_port - self.port_begin + i) % count
+            if self._port_free(check_port):
+                self._next_port = self.port_begin + (check_port - self.port_begin + 1) % count
+                return check_port
+        return None
+
+    def _port_free(self, port: int) -> bool:
+        lease = self._read_lease(port)
+        if lease is not None:
+            pid = lease.get('client_pid') or lease.get('pid') or 0
+            if pid_exists(pid):
+                return False
+            logger.debug(f'Освобождаю порт {port} завершившегося процесса {pid}')
+            self.release(port)
+        return port_bindable(port)
+
+    def _lease_path(self, port: int) -> str:
+        return os.path.join(self.lock_dir, f'port_{port}.json')
+
+    def _read_lease(self, port: int) -> Optional[dict]:
+        try:
+            with open(self._lease_path(port), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # Файл аренды записывается атомарно, не читаемый файл оставлен не этим модулем
+            return {}
+
+    def _write_lease(self, port: int, client_pid: Optional[int]):
+        lease_path = self._lease_path(port)
+        tmp_path = f'{lease_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pid': os.getpid(), 'client_pid': client_pid}, f)
+        os.replace(tmp_path, lease_path)
+
+
+def port_bindable(port: int) -> bool:
+    """
+    Проверяет, что порт не занят, попыткой локального bind.
+
+    :param port: Номер порта
+    :return:
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind(('', port))
+        except OSError:
+            return False
+    return True
@@ -0,0 +1,282 @@
+import os
+import time
+import ctypes
+import logging
+import subprocess
+from typing import List, Optional, Iterable, Set, Tuple
+from .utils import Process, windows_platform
+
+logger = logging.getLogger(__name__)
+
+
+def scan_processes(names: Optional[Iterable[str]] = None) -> List[Process]:
+    """
+    Получает список процессов системы средствами ОС (/proc в linux, toolhelp в windows).
+    Фильтр по имени исполняемого файла применяется до чтения данных процесса.
+
+    :param names: Имена исполняемых файлов без расширения (1cv8, 1cv8c), None - все процессы.
+    :return:
+    """
+    name_filter = {_normalize_name(n) for n in names} if names is not None else None
+    if windows_platform():
+        return _scan_processes_windows(name_filter)
+    return _scan_processes_linux(name_filter)
+
+
+def process_tree(processes: Iterable[Process], pid: int) -> List[Process]:
+    """
+    Возвращает процесс и все его дочерние процессы.
+
+    :param processes: Процессы системы (scan_processes)
+    :param pid: Идентификатор корневого процесса
+    :return: Корневой процесс (если найден) и его потомки
+    """
+    children = {}
+    by_pid = {}
+    for process in processes:
+        by_pid[process.pid] = process
+        if process.ppid is not None and process.ppid != process.pid:
+            children.setdefault(process.ppid, []).append(process)
+
+    result = [by_pid[pid]] if pid in by_pid else []
+    queue = [pid]
+    seen = {pid}
+    while queue:
+        for child in children.get(queue.pop(), []):
+            # pid может быть переиспользован, поэтому дочерний процесс не может быть запущен раньше родителя
+            parent = by_pid.get(child.ppid)
+            if child.pid in seen or (parent is not None and parent.start_time and child.start_time
+                                     and child.start_time < parent.start_time):
+                continue
+            seen.add(child.pid)
+            result.append(child)
+            queue.append(child.pid)
+    return result
+
+
+def _normalize_name(name: str) -> str:
+    name = name.lower()
+    if name.endswith('.exe'):
+        name = name[:-4]
+    return name
+
+
+def _scan_processes_linux(name_filter: Optional[Set[str]]) -> List[Process]:
+    clock_ticks = os.sysconf('SC_CLK_TCK')
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    boot_time = _linux_boot_time()
+
+    result = []
+    with os.scandir('/proc') as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry.name}/stat', 'rb') as f:
+                    stat = f.read().decode('utf-8', 'replace')
+                name = stat[stat.index('(') + 1:stat.rindex(')')]
+                if name_filter is not None and _normalize_name(name) not in name_filter:
+                    continue
+
+                with open(f'/proc/{entry.name}/cmdline', 'rb') as f:
+                    cmdline = f.read()
+            except (OSError, ValueError):
+                # Процесс завершился во время чтения
+                continue
+
+            fields = stat[stat.rindex(')') + 2:].split()
+            result.append(Process(
+                # Командная строка в формате windows, чтобы разбор не зависел от платформы
+                cmd=subprocess.list2cmdline([p.decode('utf-8', 'replace') for p in cmdline.split(b'\0') if p]),
+                pid=int(entry.name),
+                name=name,
+                ppid=int(fields[1]),
+                start_time=boot_time + int(fields[19]) / clock_ticks,
+                rss=int(fields[21]) * page_size,
+                cpu_time=(int(fields[11]) + int(fields[12])) / clock_ticks,
+            ))
+    return result
+
+
+def _linux_boot_time() -> float:
+    with open('/proc/stat', 'r') as f:
+        for line in f:
+            if line.startswith('btime'):
+                return float(line.split()[1])
+    return time.time() - time.monotonic()
+
+
+# Windows
+
+TH32CS_SNAPPROCESS = 0x2
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+PROCESS_COMMAND_LINE_INFORMATION = 60
+STATUS_INFO_LENGTH_MISMATCH = 0xC0000004
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+FILETIME_UNIX_EPOCH = 11644473600
+
+if windows_platform():
+    from ctypes import wintypes
+
+    class PROCESSENTRY32W(ctypes.Structure):
+        _fields_ = [
+            ('dwSize', wintypes.DWORD),
+            ('cntUsage', wintypes.DWORD),
+            ('th32ProcessID', wintypes.DWORD),
+            ('th32DefaultHeapID', ctypes.c_size_t),
+            ('th32ModuleID', wintypes.DWORD),
+            ('cntThreads', wintypes.DWORD),
+            ('th32ParentProcessID', wintypes.DWORD),
+            ('pcPriClassBase', ctypes.c_long),
+            ('dwFlags', wintypes.DWORD),
+            ('szExeFile', ctypes.c_wchar * 260),
+        ]
+
+    class UNICODE_STRING(ctypes.Structure):
+        _fields_ = [
+            ('Length', wintypes.USHORT),
+            ('MaximumLength', wintypes.USHORT),
+            ('Buffer', ctypes.c_void_p),
+        ]
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+
+def _scan_processes_windows(name_filter: Optional[Set[str]]) -> List[Process]:
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+    kernel32.CreateToolhelp32Snapshot.argtypes = [wintypes.DWORD, wintypes.DWORD]
+    kernel32.Process32FirstW.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32W)]
+    kernel32.Process32NextW.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32W)]
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    kernel32.GetProcessTimes.argtypes = [wintypes.HANDLE] + [ctypes.POINTER(wintypes.FILETIME)] * 4
+    kernel32.K32GetProcessMemoryInfo.argtypes = [
+        wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+
+    snapshot = kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    if snapshot == INVALID_HANDLE_VALUE:
+        raise ctypes.WinError(ctypes.get_last_error())
+
+    found = []
+    try:
+        entry = PROCESSENTRY32W()
+        entry.dwSize = ctypes.sizeof(PROCESSENTRY32W)
+        has_entry = kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+        while has_entry:
+            if name_filter is None or _normalize_name(entry.szExeFile) in name_filter:
+                found.append((entry.th32ProcessID, entry.szExeFile, entry.th32ParentProcessID))
+            has_entry = kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+    finally:
+        kernel32.CloseHandle(snapshot)
+
+    result = []
+    for pid, name, ppid in found:
+        process = Process(cmd='', pid=pid, name=name, ppid=ppid)
+        _fill_windows_process_info(kernel32, process)
+        result.append(process)
+    return result
+
+
+def _fill_windows_process_info(kernel32, process: Process):
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, process.pid)
+    if not handle:
+        # Нет доступа к процессу (системный процесс или процесс другого пользователя)
+        return
+
+    try:
+        ntdll = ctypes.WinDLL('ntdll')
+        ntdll.NtQueryInformationProcess.restype = ctypes.c_ulong
+        ntdll.NtQueryInformationProcess.argtypes = [
+            wintypes.HANDLE, ctypes.c_ulong, ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong)]
+        size = ctypes.c_ulong(0)
+        status = ntdll.NtQueryInformationProcess(handle, PROCESS_COMMAND_LINE_INFORMATION, None, 0,
+                                                 ctypes.byref(size))
+        if status == STATUS_INFO_LENGTH_MISMATCH and size.value:
+            buffer = ctypes.create_string_buffer(size.value)
+            status = ntdll.NtQueryInformationProcess(handle, PROCESS_COMMAND_LINE_INFORMATION, buffer, size,
+                                                     ctypes.byref(size))
+            if status == 0:
+                cmd_line = UNICODE_STRING.from_buffer(buffer)
+                process.cmd = ctypes.wstring_at(cmd_line.Buffer, cmd_line.Length // 2)
+
+        creation, exit_time, kernel, user = (wintypes.FILETIME() for _ in range(4))
+        if kernel32.GetProcessTimes(handle, ctypes.byref(creation), ctypes.byref(exit_time),
+                                    ctypes.byref(kernel), ctypes.byref(user)):
+            process.start_time = _filetime_value(creation) / 10 ** 7 - FILETIME_UNIX_EPOCH
+            process.cpu_time = (_filetime_value(kernel) + _filetime_value(user)) / 10 ** 7
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+        if kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            process.rss = counters.WorkingSetSize
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def open_process_handle(pid: int) -> Optional[int]:
+    """
+    Открывает дескриптор процесса windows для чтения израсходованных ресурсов.
+    Дескриптор сохраняет данные процесса после его завершения, поэтому открывается до ожидания процесса.
+
+    :param pid: Идентификатор процесса
+    :return: Дескриптор процесса, None - нет доступа к процессу
+    """
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    return kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid) or None
+
+
+def close_process_handle(handle: int):
+    """
+    Закрывает дескриптор процесса windows.
+
+    :param handle: Дескриптор процесса
+    """
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    kernel32.CloseHandle(handle)
+
+
+def handle_usage(handle: int) -> Tuple[Optional[float], Optional[float], Optional[int]]:
+    """
+    Возвращает израсходованные процессом ресурсы по дескриптору процесса windows.
+
+    :param handle: Дескриптор процесса
+    :return: (время пользователя, время ядра, пиковый объем памяти)
+    """
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.GetProcessTimes.argtypes = [wintypes.HANDLE] + [ctypes.POINTER(wintypes.FILETIME)] * 4
+    kernel32.K32GetProcessMemoryInfo.argtypes = [
+        wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+
+    user_time = system_time = peak_rss = None
+    creation, exit_time, kernel, user = (wintypes.FILETIME() for _ in range(4))
+    if kernel32.GetProcessTimes(handle, ctypes.byref(creation), ctypes.byref(exit_time),
+                                ctypes.byref(kernel), ctypes.byref(user)):
+        user_time = _filetime_value(user) / 10 ** 7
+        system_time = _filetime_value(kernel) / 10 ** 7
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+    if kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+        peak_rss = counters.PeakWorkingSetSize
+    return user_time, system_time, peak_rss
+
+
+def _filetime_value(filetime) -> int:
+    return (filetime.dwHighDateTime << 32) + filetime.dwLowDateTime
@@ -5,11 +5,18 @@ import os
 import subprocess
 from functools import total_ordering
 import shutil
-from ctypes import windll
-from typing import List
+import ctypes
+from typing import List, Optional, Iterable, Tuple
 import signal
+import time
+import threading
 import dataclasses
 
+try:
+    from ctypes import windll
+except ImportError:
+    windll = None
+
 
 logger = logging.getLogger(__name__)
 
@@ -76,28 +83,203 @@ class PlatformVersion:
         return self.version_weight < other.version_weight
 
 
+ONE_C_PROCESS_NAMES = ('1cv8', '1cv8c')
+
+
 @dataclasses.dataclass
 class Process:
     cmd: str
     pid: int
+    name: str = ''
+    ppid: Optional[int] = None
+    # Время запуска процесса (unix time)
+    start_time: Optional[float] = None
+    # Размер резидентной памяти в байтах
+    rss: Optional[int] = None
+    # Процессорное время (user + system) в секундах
+    cpu_time: Optional[float] = None
 
     def kill(self):
         kill_process(self.pid)
 
 
-def kill_process(pid: int):
+@dataclasses.dataclass
+class ResourceUsage:
+    """
+    Ресурсы, израсходованные командой
+    """
+    # Длительность выполнения в секундах
+    wall_time: Optional[float] = None
+    # Процессорное время в режиме пользователя и ядра в секундах
+    user_time: Optional[float] = None
+    system_time: Optional[float] = None
+    # Пиковый объем резидентной памяти в байтах
+    peak_rss: Optional[int] = None
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    # Размер лога /Out в байтах
+    out_file_size: Optional[int] = None
+    # Время ожидания в очереди запуска в секундах
+    queue_wait: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+
+class CommandResult(tuple):
+    """
+    Результат выполнения команды: (код возврата, сообщение) или, при запуске без ожидания,
+    (код возврата, сообщение, pid процесса). Израсходованные ресурсы - в атрибуте usage.
+    """
+
+    def __new__(cls, returncode: int, message: str, pid: Optional[int] = None,
+                usage: Optional[ResourceUsage] = None) -> 'CommandResult':
+        values = (returncode, message) if pid is None else (returncode, message, pid)
+        result = super(CommandResult, cls).__new__(cls, values)
+        result.usage = usage or ResourceUsage()
+        # Операция и база заполняются исполнителем команды (Designer, Enterprise, Rac)
+        result.operation = ''
+        result.infobase = ''
+        # Процесс завершен по истечении лимита времени
+        result.timed_out = False
+        return result
+
+    @property
+    def returncode(self) -> int:
+        return self[0]
+
+    @property
+    def message(self) -> str:
+        return self[1]
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self[2] if len(self) > 2 else None
+
+
+def kill_process(pid: int, force: bool = False):
+    """
+    Отправляет процессу сигнал завершения.
+
+    :param pid: Идентификатор процесса
+    :param force: Принудительное завершение (TerminateProcess в windows, SIGKILL в linux)
+    """
     if windows_platform():
-        __kill_process_windows(pid)
+        __kill_process_windows(pid, force)
     else:
-        __kill_process_linux(pid)
+        __kill_process_linux(pid, force)
 
 
-def __kill_process_windows(pid: int):
-    os.kill(pid, signal.SIGBREAK)
+def __kill_process_windows(pid: int, force: bool = False):
+    os.kill(pid, signal.SIGTERM if force else signal.SIGBREAK)
 
 
-def __kill_process_linux(pid: int):
-    raise NotImplementedError
+def __kill_process_linux(pid: int, force: bool = False):
+    os.kill(pid, signal.SIGKILL if force else signal.SIGTERM)
+
+
+def kill_processes(pids: Iterable[int], timeout: float = 10, poll_interval: float = 0.1) -> List[int]:
+    """
+    Завершает процессы: сигнал штатного завершения отправляется всем процессам сразу,
+    процессы, не завершившиеся за timeout, завершаются принудительно.
+
+    :param pids: Идентификаторы процессов
+    :param timeout: Время ожидания завершения процессов на каждом шаге в секундах
+    :param poll_interval: Интервал проверки завершения
+    :return: Идентификаторы процессов, которые не удалось завершить
+    """
+    alive = [pid for pid in pids if pid_exists(pid)]
+    for force in (False, True):
+        if not alive:
+            break
+        if force:
+            logger.debug(f'Процессы {alive} не завершились за {timeout} с., завершаю принудительно')
+        for pid in alive:
+            try:
+                kill_process(pid, force)
+            except ProcessLookupError:
+                pass
+            except OSError as e:
+                # Например, процесс вне группы консоли не получает CTRL_BREAK
+                logger.debug(f'Не удалось отправить сигнал завершения процессу {pid}: {e}')
+        alive = wait_processes(alive, timeout, poll_interval)
+    return alive
+
+
+def kill_process_tree(pid: int, timeout: float = 10) -> List[int]:
+    """
+    Завершает процесс и все его дочерние процессы.
+
+    :param pid: Идентификатор процесса
+    :param timeout: Время ожидания штатного завершения в секундах
+    :return: Идентификаторы процессов, которые не удалось завершить
+    """
+    from .process_scan import scan_processes, process_tree
+    pids = [p.pid for p in process_tree(scan_processes(), pid)] or [pid]
+    return kill_processes(pids, timeout)
+
+
+def wait_processes(pids: Iterable[int], timeout: float, poll_interval: float = 0.1) -> List[int]:
+    """
+    Ожидает завершения процессов.
+
+    :param pids: Идентификаторы процессов
+    :param timeout: Время ожидания в секундах
+    :param poll_interval: Интервал проверки завершения
+    :return: Идентификаторы процессов, которые не завершились
+    """
+    start = time.monotonic()
+    alive = [pid for pid in pids if pid_exists(pid)]
+    while alive and time.monotonic() - start < timeout:
+        time.sleep(poll_interval)
+        alive = [pid for pid in alive if pid_exists(pid)]
+    return alive
+
+
+def pid_exists(pid: int) -> bool:
+    """
+    Проверяет, что процесс с указанным pid запущен.
+
+    :param pid: Идентификатор процесса
+    :return:
+    """
+    if pid <= 0:
+        return False
+    if windows_platform():
+        return __pid_exists_windows(pid)
+    return __pid_exists_linux(pid)
+
+
+def __pid_exists_windows(pid: int) -> bool:
+    process_query_limited_information = 0x1000
+    still_active = 259
+
+    handle = windll.kernel32.OpenProcess(process_query_limited_information, False, pid)
+    if not handle:
+        return False
+    try:
+        exit_code = ctypes.c_ulong()
+        if not windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return False
+        return exit_code.value == still_active
+    finally:
+        windll.kernel32.CloseHandle(handle)
+
+
+def __pid_exists_linux(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # Завершившийся, но не дождавшийся wait родителя процесс (zombie) не считается запущенным
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+        return stat[stat.rindex(b')') + 2:stat.rindex(b')') + 3] != b'Z'
+    except (OSError, ValueError):
+        return True
 
 
 def windows_platform() -> bool:
@@ -193,30 +375,34 @@ def __is_platform_dir(dir_name: str) -> bool:
     return True
 
 
-def execute_command(command: str, params: list, timeout: int = None, wait: bool = True) -> tuple:
+def execute_command(command: str, params: list, timeout: int = None, wait: bool = True, watchdog=None) -> tuple:
     """
     Выполняет команду в системе.
 
     :param command: Команда
     :param params: Параметры команды
     :param timeout: Лимит времени на выполнение команды, после выхода за пределы будет возбуждено исключение.
-    :return:
+    :param wait: Ожидать завершения команды.
+    :param watchdog: Контроль зависания (ProcessWatchdog), зависший процесс завершается вместе с дочерними
+        процессами и возбуждается StalledProcessError.
+    :return: (код возврата, сообщение), при запуске без ожидания - (код возврата, сообщение, pid процесса).
+        Израсходованные ресурсы - в атрибуте usage результата (CommandResult).
     """
     if windows_platform():
-        result = __execute_windows_command(command, params, timeout, wait)
+        result = __execute_windows_command(command, params, timeout, wait, watchdog)
     else:
-        result = __execute_linux_command(command, params, timeout, wait)
+        result = __execute_linux_command(command, params, timeout, wait, watchdog)
     return result
 
 
-def __execute_windows_command(command: str, params: list, timeout: int, wait: bool = True) -> tuple:
+def __execute_windows_command(command: str, params: list, timeout: int, wait: bool = True, watchdog=None) -> tuple:
     if wait:
-        return __execute_windows_command_wait(command, params, timeout)
+        return __execute_windows_command_wait(command, params, timeout, watchdog)
     else:
         return __execute_windows_command_no_wait(command, params)
 
 
-def __execute_windows_command_wait(command: str, params: list, timeout: int) -> tuple:
+def __execute_windows_command_wait(command: str, params: list, timeout: int, watchdog=None) -> tuple:
     """
         Выполняет команду системы в windows с ожиданием выполнения
 
@@ -226,28 +412,161 @@ def __execute_windows_command_wait(command: str, params: list, timeout: int) ->
     prev_codepage = windll.kernel32.GetConsoleOutputCP()
     windll.kernel32.SetConsoleOutputCP(65001)
     try:
-        process = subprocess.run(
-            args=[command] + params,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            check=True,
-            encoding=encoding(),
-            timeout=timeout
-        )
-        if process.returncode == 0:
-            msg = process.stdout
-        else:
-            msg = process.stderr
-        return process.returncode, msg.strip()
-    except subprocess.TimeoutExpired:
-        return 1, 'Выполнение процесса вышло за рамки отведенного времени.'
-    except subprocess.CalledProcessError as e:
-        return 1, f'Ошибка выполнения команды {e}'
+        return __run_process(command, params, timeout, watchdog)
     finally:
         windll.kernel32.SetConsoleOutputCP(prev_codepage)
 
 
+def __run_process(command: str, params: list, timeout: int, watchdog=None) -> CommandResult:
+    start = time.monotonic()
+    process = subprocess.Popen(
+        args=[command] + params,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    waiter = _ProcessWaiter(process)
+    try:
+        waiter.wait(timeout, watchdog)
+    except subprocess.TimeoutExpired:
+        waiter.kill()
+        result = CommandResult(1, 'Выполнение процесса вышло за рамки отведенного времени.',
+                               usage=waiter.usage(start))
+        result.timed_out = True
+        return result
+    except BaseException:
+        waiter.kill()
+        waiter.close()
+        raise
+
+    usage = waiter.usage(start)
+    stdout, stderr = waiter.output()
+    if process.returncode != 0:
+        error = subprocess.CalledProcessError(process.returncode, process.args, stdout, stderr)
+        return CommandResult(1, f'Ошибка выполнения команды {error}', usage=usage)
+    return CommandResult(process.returncode, stdout.strip(), usage=usage)
+
+
+class _ProcessWaiter:
+    """
+    Ожидание завершения процесса с чтением вывода, контролем зависания и сбором израсходованных ресурсов
+    (wait4 в linux, GetProcessTimes в windows).
+    """
+
+    def __init__(self, process: subprocess.Popen, windows: Optional[bool] = None):
+        """
+        :param process: Процесс
+        :param windows: Получать ресурсы по дескриптору процесса windows, по умолчанию - по платформе
+        """
+        self.process = process
+        self.rusage = None
+        self._handle = None
+        if windows_platform() if windows is None else windows:
+            from .process_scan import open_process_handle
+            self._handle = open_process_handle(process.pid)
+        self._output = {}
+        self._exited = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._read, args=(name, stream), daemon=True)
+            for name, stream in (('stdout', process.stdout), ('stderr', process.stderr))
+        ]
+        self._threads.append(threading.Thread(target=self._wait, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def wait(self, timeout: Optional[float], watchdog=None):
+        start = time.monotonic()
+        if watchdog is not None:
+            watchdog.start()
+        while True:
+            wait_time = watchdog.poll_interval if watchdog is not None else None
+            if timeout is not None:
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(self.process.args, timeout)
+                wait_time = remaining if wait_time is None else min(wait_time, remaining)
+            if self._exited.wait(wait_time):
+                break
+
+            if watchdog is not None and watchdog.stalled(self.process.pid):
+                error = watchdog.error(self.process.pid)
+                logger.error(f'Процесс {self.process.pid} завис, завершаю дерево процессов')
+                kill_process_tree(self.process.pid, timeout=5)
+                self.kill()
+                raise error
+
+        for thread in self._threads:
+            thread.join()
+
+    def kill(self):
+        if not self._exited.is_set():
+            try:
+                kill_process(self.process.pid, force=True)
+            except OSError:
+                pass
+        for thread in self._threads:
+            thread.join()
+
+    def output(self) -> Tuple[str, str]:
+        return self._output.get('stdout', ''), self._output.get('stderr', '')
+
+    def usage(self, start: float) -> ResourceUsage:
+        usage = ResourceUsage(
+            wall_time=time.monotonic() - start,
+            stdout_bytes=self._output.get('stdout_bytes', 0),
+            stderr_bytes=self._output.get('stderr_bytes', 0),
+        )
+        if self.rusage is not None:
+            usage.user_time = self.rusage.ru_utime
+            usage.system_time = self.rusage.ru_stime
+            # ru_maxrss в linux в килобайтах
+            usage.peak_rss = self.rusage.ru_maxrss * 1024
+        elif self._handle is not None:
+            from .process_scan import handle_usage
+            usage.user_time, usage.system_time, usage.peak_rss = handle_usage(self._handle)
+        self.close()
+        return usage
+
+    def close(self):
+        if self._handle is not None:
+            from .process_scan import close_process_handle
+            close_process_handle(self._handle)
+            self._handle = None
+
+    def _read(self, name: str, stream):
+        try:
+            data = stream.read()
+        except (OSError, ValueError) as e:
+            logger.error(f'Не удалось прочитать {name} процесса {self.process.pid}: {e}')
+            data = b''
+        finally:
+            stream.close()
+        self._output[f'{name}_bytes'] = len(data)
+        try:
+            text = data.decode(encoding(), 'replace')
+        except Exception as e:
+            logger.warning(f'Не удалось определить кодировку {name} процесса {self.process.pid}, '
+                           f'вывод декодирован как utf-8: {e}')
+            text = data.decode('utf-8', 'replace')
+        self._output[name] = text.replace('\r\n', '\n').replace('\r', '\n')
+
+    def _wait(self):
+        if hasattr(os, 'wait4'):
+            try:
+                _, status, self.rusage = os.wait4(self.process.pid, 0)
+                self.process.returncode = _exit_code(status)
+            except ChildProcessError:
+                self.process.wait()
+        else:
+            self.process.wait()
+        self._exited.set()
+
+
+def _exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
 def __execute_windows_command_no_wait(command: str, params: list) -> tuple:
     """
         Выполняет команду системы в windows без ожидания выполнения
@@ -264,9 +583,9 @@ def __execute_windows_command_no_wait(command: str, params: list) -> tuple:
             encoding=encoding(),
             close_fds=True
         )
-        return 0, ''
+        return CommandResult(0, '', process.pid)
     except subprocess.CalledProcessError as e:
-        return 1, f'Ошибка выполнения команды {e}'
+        return CommandResult(1, f'Ошибка выполнения команды {e}')
     finally:
         windll.kernel32.SetConsoleOutputCP(prev_codepage)
 
@@ -286,15 +605,18 @@ def encoding() -> str:
                 sys.getfilesystemencoding() or "utf-8")
 
 
-def __execute_linux_command(command: str, params: list, timeout: int, wait: bool = True) -> str:
+def __execute_linux_command(command: str, params: list, timeout: int, wait: bool = True, watchdog=None) -> tuple:
     """
     Выполняет команду системы в linux
 
     :param command:
     :return:
     """
-    raise NotImplementedError('Не реализовано!')
-    pass
+    if wait:
+        return __run_process(command, params, timeout, watchdog)
+
+    process = subprocess.Popen(args=[command] + params, close_fds=True)
+    return CommandResult(0, '', process.pid)
 
 
 def xml_conf_version_file_exists(dir_path: str):
@@ -322,16 +644,31 @@ def port_in_use(port):
         return s.connect_ex(('localhost', port)) == 0
 
 
-def get_1c_processes() -> List[Process]:
+def get_1c_processes(names: Iterable[str] = ONE_C_PROCESS_NAMES) -> List[Process]:
+    """
+    Получает список запущенных процессов 1с.
+
+    :param names: Имена исполняемых файлов процессов без расширения
+    :return:
+    """
     result = None
     if windows_platform():
-        result = _get_1c_processes_windows()
+        result = _get_1c_processes_windows(names)
     else:
-        result = _get_1c_processes_linux()
+        result = _get_1c_processes_linux(names)
     return result
 
 
-def _get_1c_processes_windows() -> List[Process]:
+def _get_1c_processes_windows(names: Iterable[str] = ONE_C_PROCESS_NAMES) -> List[Process]:
+    from .process_scan import scan_processes
+    try:
+        return scan_processes(names)
+    except OSError as e:
+        logger.warning(f'Не удалось получить список процессов средствами toolhelp: {e}, использую wmic')
+        return _get_1c_processes_wmic()
+
+
+def _get_1c_processes_wmic() -> List[Process]:
     result = subprocess.run(
         [
             'wmic', 'process', 'where',
@@ -359,5 +696,6 @@ def parse_wmic_data(data: str) -> List[Process]:
     return procs
 
 
-def _get_1c_processes_linux() -> List[Process]:
-    raise NotImplementedError
\ No newline at end of file
+def _get_1c_processes_linux(names: Iterable[str] = ONE_C_PROCESS_NAMES) -> List[Process]:
+    from .process_scan import scan_processes
+    return scan_processes(names)
\ No newline at end of file
@@ -0,0 +1,132 @@
+import os
+import time
+import logging
+from typing import Optional
+from .process_scan import scan_processes, process_tree
+
+logger = logging.getLogger(__name__)
+
+
+class StalledProcessError(SyntaxError):
+    """
+    Процесс завершен, так как не проявлял активности дольше допустимого времени.
+
+    Наследуется от SyntaxError, так как ошибки выполнения команд 1с возбуждаются этим типом.
+    """
+
+    def __init__(self, pid: int, idle_time: float, log_tail: str = ''):
+        self.pid = pid
+        self.idle_time = idle_time
+        self.log_tail = log_tail
+        message = f'Процесс {pid} не проявлял активности {idle_time:.0f} с. и был завершен.'
+        if log_tail:
+            message += f' Окончание лога:\n{log_tail}'
+        super(StalledProcessError, self).__init__(message)
+
+
+class ProcessWatchdog:
+    """
+    Контроль зависания процесса.
+
+    Процесс считается активным, пока растет процессорное время его дерева процессов или размер файла лога (/Out).
+    Если активности нет дольше idle_timeout, процесс считается зависшим (модальный диалог, взаимоблокировка).
+    """
+
+    def __init__(self,
+                 idle_timeout: float,
+                 log_file: Optional[str] = None,
+                 poll_interval: float = 1.0,
+                 cpu_threshold: float = 0.05,
+                 tail_size: int = 4096):
+        """
+        :param idle_timeout: Допустимое время без активности в секундах
+        :param log_file: Файл лога процесса
+        :param poll_interval: Интервал проверки активности
+        :param cpu_threshold: Минимальный прирост процессорного времени между проверками (в секундах),
+            который считается активностью.
+        :param tail_size: Размер окончания лога в байтах, которое передается в исключение
+        """
+        if idle_timeout <= 0:
+            raise ValueError('Время без активности должно быть больше 0')
+        self.idle_timeout = idle_timeout
+        self.log_file = log_file
+        self.poll_interval = poll_interval
+        self.cpu_threshold = cpu_threshold
+        self.tail_size = tail_size
+
+        self._last_activity = time.monotonic()
+        self._cpu_time: Optional[float] = None
+        self._log_size: Optional[int] = None
+
+    def start(self):
+        """
+        Сбрасывает состояние перед контролем нового процесса.
+        """
+        self._last_activity = time.monotonic()
+        self._cpu_time = None
+        self._log_size = None
+
+    @property
+    def idle_time(self) -> float:
+        return time.monotonic() - self._last_activity
+
+    def stalled(self, pid: int) -> bool:
+        """
+        Проверяет активность процесса с прошлой проверки.
+
+        :param pid: Идентификатор процесса
+        :return: Процесс не проявлял активности дольше idle_timeout
+        """
+        cpu_time = self._tree_cpu_time(pid)
+        log_size = self._current_log_size()
+
+        cpu_active = self._cpu_time is None or cpu_time - self._cpu_time >= self.cpu_threshold
+        if cpu_active or log_size != self._log_size:
+            self._last_activity = time.monotonic()
+        # Малые приросты не накапливаются: цикл обработки сообщений модального диалога тоже расходует процессор
+        self._cpu_time = cpu_time
+        self._log_size = log_size
+        return self.idle_time >= self.idle_timeout
+
+    def error(self, pid: int) -> StalledProcessError:
+        """
+        Формирует исключение зависания с окончанием лога.
+
+        :param pid: Идентификатор процесса
+        :return:
+        """
+        return StalledProcessError(pid, self.idle_time, self.log_tail())
+
+    def log_tail(self) -> str:
+        """
+        Возвращает окончание файла лога.
+
+        :return:
+        """
+        if not self.log_file or not os.path.exists(self.log_file):
+            return ''
+        with open(self.log_file, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(size - self.tail_size, 0))
+            data = f.read()
+
+        if size > self.tail_size:
+            # Пропускаем продолжение символа utf-8, обрезанного по границе блока
+            data = data.lstrip(bytes(range(0x80, 0xc0)))
+        try:
+            return data.decode('utf-8-sig').strip()
+        except UnicodeDecodeError:
+            return data.decode('cp1251').strip()
+
+    def _current_log_size(self) -> int:
+        if not self.log_file:
+            return 0
+        try:
+            return os.path.getsize(self.log_file)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _tree_cpu_time(pid: int) -> float:
+        return sum(p.cpu_time or 0 for p in process_tree(scan_processes(), pid))